@@ -0,0 +1,24 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from island import run_islands
+
+# 島の数を増やしたときの処理速度（島ごとの個体数は同じにして、評価回数/秒を比べる）
+# 島どうしは移住のときだけ待ち合わせるので、コア数までは島の数にほぼ比例して速くなるはず
+ISLAND_COUNTS = [1, 2, 4, 8]
+POP_PER_ISLAND = 100
+NGEN = 40
+
+
+if __name__ == "__main__":
+    print(f"cpu count: {os.cpu_count()}")
+    print(f"{'islands':>8}{'time [s]':>10}{'evals/s':>12}{'best':>10}")
+    for n_islands in ISLAND_COUNTS:
+        start = time.perf_counter()
+        halloffame, logbook = run_islands(n_islands, POP_PER_ISLAND, NGEN, seed=0, verbose=False)
+        elapsed = time.perf_counter() - start
+        nevals = sum(entry["nevals"] for entry in logbook)
+        print(f"{n_islands:>8}{elapsed:>10.2f}{nevals / elapsed:>12.0f}{halloffame[0].fitness.values[0]:>10.2f}")
@@ -0,0 +1,52 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+from boundary import extract_boundary
+from segmentation import KMEANS_BACKENDS, DBSCAN_BACKENDS, cluster_kmeans, cluster_dbscan
+
+# 境界線のクラスタリングの方法ごとの時間とメモリのピーク
+# フロア画像を2倍ずつ拡大して（図面の解像度が上がったときを想定）境界線の点を増やす
+# 時間は tracemalloc なしの実行で測り、メモリのピークは別の実行で測る（memory=True）
+IMAGE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "high_res_screenshot.jpg")
+SCALES = [1, 2, 4]
+NUM_SHOPS = 9
+EPS = 10
+MIN_SAMPLES = 10
+# sklearn の DBSCAN を測る点の数の上限（近傍の組を全て持つのでメモリの都合）
+MAX_SKLEARN_DBSCAN_POINTS = 200_000
+
+
+def main():
+    image = cv2.imread(IMAGE_PATH)
+    if image is None:
+        raise ValueError(f"画像を読み込めません: {IMAGE_PATH}")
+    names = list(KMEANS_BACKENDS) + list(DBSCAN_BACKENDS)
+    print("クラスタリングの時間 [s] / メモリのピーク [MB]")
+    print(f"{'scale':>5} {'points':>8} " + " ".join(f"{name:>15}" for name in names))
+    # 最初の呼び出しの import の時間を含めないように一度動かしておく
+    _, points, _ = extract_boundary(image, ordered=False)
+    for method in KMEANS_BACKENDS:
+        cluster_kmeans(points, NUM_SHOPS, method=method, verbose=False)
+    for method in DBSCAN_BACKENDS:
+        cluster_dbscan(points, EPS, MIN_SAMPLES, method=method, verbose=False)
+
+    for scale in SCALES:
+        scaled = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_NEAREST)
+        _, points, _ = extract_boundary(scaled, ordered=False)
+        reports = [cluster_kmeans(points, NUM_SHOPS, method=method, verbose=False, memory=True)[2]
+                   for method in KMEANS_BACKENDS]
+        for method in DBSCAN_BACKENDS:
+            if method == "dbscan" and len(points) > MAX_SKLEARN_DBSCAN_POINTS:
+                reports.append(None)
+                continue
+            reports.append(cluster_dbscan(points, EPS, MIN_SAMPLES, method=method, verbose=False, memory=True)[1])
+        cells = [f"{'-':>15}" if report is None else
+                 f"{report['seconds']:>7.3f}/{report['peak_mb']:>7.1f}" for report in reports]
+        print(f"{scale:>5} {len(points):>8} " + " ".join(cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spatial_index import SPATIAL_INDEXES, make_index
+from layout_fitness import THRESHOLD_DISTANCE, eval_shop_indexed, eval_shop_batch
+
+# 空間インデックスと総当たりの比較
+# 50x50に10店舗と同じ密度になるように、店舗数に合わせてフロアを広げる
+SHOP_COUNTS = [10, 100, 1000, 10000]
+REPEATS = 3
+# 一括評価（距離行列をそのまま作る）を測る店舗数の上限（メモリの都合）
+MAX_DENSE_SHOPS = 2000
+
+
+def random_layout(rng, n):
+    side = 50 * np.sqrt(n / 10)
+    width = rng.integers(5, 11, n)
+    height = rng.integers(5, 11, n)
+    x = rng.uniform(0, side - width)
+    y = rng.uniform(0, side - height)
+    codes = rng.integers(0, 7, n)
+    return np.column_stack([x, y, width, height]).astype(np.float64), codes, side
+
+
+def best_time(func):
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    names = list(SPATIAL_INDEXES)
+    print("近接と重なりの組の計算時間 [ms]")
+    print(f"{'shops':>6} {'floor':>7} " + " ".join(f"{name:>9}" for name in names))
+    layouts = {}
+    for n in SHOP_COUNTS:
+        coords, codes, side = random_layout(rng, n)
+        layouts[n] = (coords, codes)
+        row = []
+        for name in names:
+            index = make_index(name)
+            elapsed = best_time(lambda: (index.near_pairs(coords[:, :2], THRESHOLD_DISTANCE),
+                                         index.overlap_pairs(coords)))
+            row.append(elapsed * 1000)
+        print(f"{n:>6} {side:>7.0f} " + " ".join(f"{t:>9.2f}" for t in row))
+
+    print()
+    print("1個体の評価時間 [ms]（dense: eval_shop_batch, 他: eval_shop_indexed）")
+    print(f"{'shops':>6} {'dense':>9} " + " ".join(f"{name:>9}" for name in names))
+    for n in SHOP_COUNTS:
+        coords, codes = layouts[n]
+        if n <= MAX_DENSE_SHOPS:
+            dense = f"{best_time(lambda: eval_shop_batch(coords[None], codes[None])) * 1000:>9.2f}"
+        else:
+            dense = f"{'-':>9}"
+        row = [best_time(lambda: eval_shop_indexed(coords, codes, make_index(name))) * 1000 for name in names]
+        print(f"{n:>6} {dense} " + " ".join(f"{t:>9.2f}" for t in row))
+
+
+if __name__ == "__main__":
+    main()
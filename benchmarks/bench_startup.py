@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 起動時間の計測（新しいプロセスで読み込みだけを行い、中央値を比べる）
+REPEATS = 5
+COMMANDS = [
+    ("python（何もしない）", ["-c", "pass"]),
+    ("cli --help", ["-m", "ga_generativeshop", "--help"]),
+    ("import ga_generativeshop.cli", ["-c", "import ga_generativeshop.cli"]),
+    ("import ga_main", ["-c", "import ga_main"]),
+    ("import ga_floor", ["-c", "import ga_floor"]),
+    ("import ga_shop", ["-c", "import ga_shop"]),
+    ("import ga_and_clustering", ["-c", "import ga_and_clustering"]),
+    ("import deap", ["-c", "import deap.algorithms"]),
+    ("import matplotlib.pyplot", ["-c", "import matplotlib.pyplot"]),
+]
+
+
+def median_time(args):
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=ROOT, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       env=dict(os.environ, MPLBACKEND="Agg"))
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2]
+
+
+if __name__ == "__main__":
+    print(f"{'command':<32}{'median [ms]':>12}")
+    for name, args in COMMANDS:
+        try:
+            print(f"{name:<32}{median_time(args) * 1000:>12.1f}")
+        except subprocess.CalledProcessError:
+            print(f"{name:<32}{'failed':>12}")
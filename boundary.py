@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+
+# フロア画像から境界線（指定色の領域の輪郭）を取り出し、結果をディスクにキャッシュする
+# キャッシュのキーは画像ファイルの内容のハッシュと、色・許容誤差・線の太さ
+# 同じ画像を何度も使うときは、画像のデコードと輪郭の検出をせずにキャッシュを memmap で読み込む
+# 境界線のピクセルは重複のない2次元の座標（行, 列）で持ち、どの輪郭の線かを表す番号を付ける
+
+# 境界線の色（BGR）、色の範囲の許容誤差、輪郭を描く線の太さ
+TARGET_COLOR_BGR = (183, 66, 67)
+THRESHOLD = 10
+THICKNESS = 2
+# キャッシュを置くディレクトリ（環境変数 GA_BOUNDARY_CACHE で変更できる）
+CACHE_DIR = os.environ.get("GA_BOUNDARY_CACHE",
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), ".boundary_cache"))
+# キャッシュの形式を変えたら上げる（古いキャッシュは使わなくなる）
+CACHE_VERSION = 2
+# 画像ファイルのハッシュを計算するときに一度に読む大きさ（バイト）
+HASH_CHUNK_SIZE = 1 << 20
+# 輪郭に沿って並べるときに一度に計算する（ピクセル数 x 線分の数）の上限
+MAX_CHUNK_ELEMENTS = 4_000_000
+
+
+def file_hash(path):
+    """
+    ファイルの内容の SHA-1
+    """
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(image_path, target_color_bgr=TARGET_COLOR_BGR, threshold=THRESHOLD, thickness=THICKNESS,
+              ordered=True):
+    """
+    キャッシュのキー（画像の内容のハッシュと、境界線を取り出すパラメータから決まる）
+    """
+    params = {"color": [int(value) for value in target_color_bgr], "threshold": int(threshold),
+              "thickness": int(thickness), "ordered": bool(ordered), "version": CACHE_VERSION}
+    text = file_hash(image_path) + json.dumps(params, sort_keys=True)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def point_dtype(shape):
+    """
+    画像の大きさ (高さ, 幅, ...) の座標を入れられる最も小さい整数型（int16 か int32）
+    """
+    return np.int16 if max(shape[:2]) <= np.iinfo(np.int16).max else np.int32
+
+
+def _order_along_contour(rows, cols, contour):
+    # 各ピクセルの、輪郭（閉じた折れ線）の最も近い線分の上での位置を、輪郭の始点からの長さで返す
+    vertices = contour.reshape(-1, 2).astype(np.float64)  # (x, y) = (列, 行)
+    starts = vertices
+    vectors = np.roll(vertices, -1, axis=0) - starts
+    lengths = np.hypot(vectors[:, 0], vectors[:, 1])
+    offsets = np.concatenate([[0.0], np.cumsum(lengths)[:-1]])
+    squared = np.maximum(lengths ** 2, 1e-12)
+    position = np.empty(len(rows))
+    step = max(1, MAX_CHUNK_ELEMENTS // len(vertices))
+    for begin in range(0, len(rows), step):
+        px = cols[begin:begin + step, None] - starts[None, :, 0]
+        py = rows[begin:begin + step, None] - starts[None, :, 1]
+        t = np.clip((px * vectors[:, 0] + py * vectors[:, 1]) / squared, 0.0, 1.0)
+        distance = (px - t * vectors[:, 0]) ** 2 + (py - t * vectors[:, 1]) ** 2
+        nearest = distance.argmin(axis=1)
+        position[begin:begin + step] = offsets[nearest] + t[np.arange(len(nearest)), nearest] * lengths[nearest]
+    return position
+
+
+def extract_boundary(image, target_color_bgr=TARGET_COLOR_BGR, threshold=THRESHOLD, thickness=THICKNESS,
+                     ordered=True):
+    """
+    BGR の画像から境界線を取り出し、(輪郭のリスト, 境界線のピクセル座標, 輪郭の番号) を返す
+    境界線のピクセル座標は重複のない (行, 列) の配列 (n, 2)（point_dtype の整数型）
+    輪郭の番号 (n,) は、そのピクセルを描いた輪郭の contours での位置（重なるところは後の輪郭）
+    ordered が True なら、輪郭の番号ごとに輪郭に沿った順に並べる（False なら行・列の順）
+    """
+    import cv2
+
+    # 指定色の周辺の範囲のマスクを作成
+    target_color_bgr = np.array(target_color_bgr)
+    mask = cv2.inRange(image, target_color_bgr - threshold, target_color_bgr + threshold)
+    return boundary_from_mask(mask, thickness, ordered)
+
+
+def boundary_from_mask(mask, thickness=THICKNESS, ordered=True):
+    """
+    マスク（0 以外の画素が対象の領域）の境界線を extract_boundary と同じ形で返す
+    """
+    import cv2
+
+    mask = np.asarray(mask)
+    if mask.dtype != np.uint8:
+        mask = (mask != 0).astype(np.uint8) * 255
+
+    # マスクから輪郭を検出
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    # 輪郭ごとに番号+1 の値で線を描く（3チャンネルの画像に描いて np.where するのと同じピクセルになる）
+    label_image = np.zeros(mask.shape[:2], dtype=np.int32)
+    for index in range(len(contours)):
+        cv2.drawContours(label_image, contours, index, index + 1, thickness)
+    rows, cols = np.nonzero(label_image)
+    contour_ids = label_image[rows, cols] - 1
+
+    if ordered and len(rows):
+        # 輪郭の番号ごとに、輪郭に沿った位置で並べる
+        position = np.empty(len(rows))
+        for index, contour in enumerate(contours):
+            members = np.nonzero(contour_ids == index)[0]
+            if len(members):
+                position[members] = _order_along_contour(rows[members], cols[members], contour)
+        order = np.lexsort((position, contour_ids))
+        rows, cols, contour_ids = rows[order], cols[order], contour_ids[order]
+
+    boundary_points = np.column_stack([rows, cols]).astype(point_dtype(mask.shape))
+    return list(contours), boundary_points, contour_ids.astype(np.int32)
+
+
+def _cache_paths(cache_dir, key):
+    return {name: os.path.join(cache_dir, f"{key}.{name}.npy")
+            for name in ("contours", "offsets", "contour_ids", "points")}
+
+
+def _save_array(path, array):
+    # 一時ファイルに書いてから置き換える（途中で止まっても壊れたキャッシュを残さない）
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _split_contours(contour_points, offsets):
+    # 全ての輪郭の点をつなげた配列を、OpenCV の形式 (n, 1, 2) の輪郭のリストに戻す（コピーはしない）
+    return [contour_points[start:end].reshape(-1, 1, 2) for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+def load_boundary(image_path, target_color_bgr=TARGET_COLOR_BGR, threshold=THRESHOLD, thickness=THICKNESS,
+                  ordered=True, cache_dir=CACHE_DIR):
+    """
+    画像ファイルの境界線を (輪郭のリスト, 境界線のピクセル座標, 輪郭の番号) で返す（extract_boundary と同じ結果）
+    キャッシュがあれば memmap（読み取り専用）で読み込み、なければ画像から取り出してキャッシュに保存する
+    cache_dir に None を指定するとキャッシュを使わない
+    """
+    if not os.path.exists(image_path):
+        raise ValueError(f"画像が見つかりません: {image_path}")
+    paths = None
+    if cache_dir is not None:
+        paths = _cache_paths(cache_dir, cache_key(image_path, target_color_bgr, threshold, thickness, ordered))
+        if all(os.path.exists(path) for path in paths.values()):
+            return _load_cache(paths)
+
+    import cv2
+    image = cv2.imread(image_path)
+    if image is None:
+        raise ValueError(f"画像を読み込めません: {image_path}")
+    contours, boundary_points, contour_ids = extract_boundary(image, target_color_bgr, threshold, thickness,
+                                                              ordered)
+    if paths is None:
+        return contours, boundary_points, contour_ids
+
+    # 輪郭は全ての点をつなげた配列と、輪郭ごとの開始位置にして保存する
+    os.makedirs(cache_dir, exist_ok=True)
+    lengths = [len(contour) for contour in contours]
+    offsets = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)])
+    contour_points = (np.concatenate([contour.reshape(-1, 2) for contour in contours]) if contours
+                      else np.zeros((0, 2), dtype=np.int32))
+    _save_array(paths["contours"], contour_points.astype(np.int32))
+    _save_array(paths["offsets"], offsets)
+    _save_array(paths["contour_ids"], contour_ids)
+    # 最後に境界線の座標を保存する（全て揃っていればキャッシュとして使う）
+    _save_array(paths["points"], boundary_points)
+    return _load_cache(paths)
+
+
+def _load_cache(paths):
+    offsets = np.load(paths["offsets"])
+    contours = _split_contours(np.load(paths["contours"], mmap_mode="r"), offsets)
+    return contours, np.load(paths["points"], mmap_mode="r"), np.load(paths["contour_ids"], mmap_mode="r")
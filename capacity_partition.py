@@ -0,0 +1,157 @@
+import time
+import numpy as np
+from nearest_site import nearest_sites
+
+# 店舗のキャパシティに比例した広さになるようにフロアのピクセルを分ける（キャパシティ付きのパワー図）
+# 各店舗はサイト（代表点）と重みを持ち、ピクセルはパワー距離 |p - s|^2 - w が最も小さい店舗に入る
+# 1回の反復で
+#   1. 重みを、各店舗のピクセル数が目標（キャパシティの比で分けた数）に近づくように更新し
+#   2. サイトを、その店舗のピクセルの重心に動かす（重み付きの Lloyd 法）
+# 広さの誤差とサイトの移動が小さくなったら止める
+# 広さは渡した点の数で数える（境界線のピクセルなら店舗ごとの通路に面した長さ、領域のピクセルなら面積）
+
+# 広さの誤差の許容値（目標に対する比）とサイトの移動の許容値（ピクセル）
+TOLERANCE = 0.01
+MOVE_TOLERANCE = 0.5
+# 反復回数の上限と、1回の反復で重みを更新する回数の上限
+MAX_ITERATIONS = 100
+WEIGHT_STEPS = 20
+# 重みを変える大きさを、誤差の向きが同じなら大きく、逆になったら小さくする割合
+STEP_GROWTH = 1.2
+STEP_SHRINK = 0.5
+# partition_mask で最初に分けるときのピクセル数の上限（多ければ等間隔に間引く）
+MAX_SAMPLE_POINTS = 20_000
+
+
+def target_counts(capacities, n_points):
+    """
+    キャパシティの比で n_points 点を分けたときの各店舗の点の数（合計が n_points の整数）
+    """
+    capacities = np.asarray(capacities, dtype=np.float64)
+    exact = capacities / capacities.sum() * n_points
+    counts = np.floor(exact).astype(np.int64)
+    # 端数の大きい店舗から1点ずつ足す
+    counts[np.argsort(counts - exact, kind="stable")[:n_points - counts.sum()]] += 1
+    return counts
+
+
+def initial_sites(points, capacities):
+    """
+    最初のサイト：点を渡された順に並べ、キャパシティの比で区切った区間の中央の点
+    （境界線の点は輪郭に沿った順なので、最初から隣り合う区間に分かれる）
+    """
+    shares = np.asarray(capacities, dtype=np.float64) / np.sum(capacities)
+    middle = (np.cumsum(shares) - shares / 2) * len(points)
+    return np.asarray(points, dtype=np.float64)[np.minimum(middle.astype(np.int64), len(points) - 1)]
+
+
+def _counts(labels, k):
+    return np.bincount(labels, minlength=k)
+
+
+def capacity_partition(points, capacities, sites=None, weights=None, tolerance=TOLERANCE,
+                       move_tolerance=MOVE_TOLERANCE, max_iterations=MAX_ITERATIONS, verbose=True):
+    """
+    点 (n, 2) をキャパシティ (k,) に比例した数ずつ店舗に分け、(ラベル (n,), サイト (k, 2), 重み (k,), 計測結果) を返す
+    sites と weights を渡すとそこから始める（省略時は initial_sites と全て0）
+    計測結果は {"iterations", "seconds", "max_error"（目標に対する広さの誤差の比の最大値）, "converged"}
+    """
+    start = time.perf_counter()
+    points = np.asarray(points, dtype=np.float64)
+    capacities = np.asarray(capacities, dtype=np.float64)
+    k = len(capacities)
+    if k == 0 or np.any(capacities <= 0):
+        raise ValueError("キャパシティは1つ以上の正の値にしてください")
+    if len(points) < k:
+        raise ValueError(f"点の数 {len(points)} が店舗の数 {k} より少ないです")
+    targets = target_counts(capacities, len(points))
+    sites = initial_sites(points, capacities) if sites is None else np.array(sites, dtype=np.float64)
+    weights = np.zeros(k) if weights is None else np.array(weights, dtype=np.float64)
+
+    # 重みを変える大きさは店舗ごとに持ち、誤差の向きが続けば大きく、逆になれば小さくする
+    # 最初は店舗の大きさ（点の数が目標どおりのときの平均の2乗距離の目安）の1割（重みを渡したときはさらに1割）
+    step = np.full(k, 0.1 * ((points - points.mean(axis=0)) ** 2).sum(axis=1).mean() / k)
+    if np.any(weights != 0):
+        step *= 0.1
+    previous = np.zeros(k)
+    labels = nearest_sites(points, sites, weights)
+    converged = False
+    iteration = 0
+    movement = np.inf
+    for iteration in range(1, max_iterations + 1):
+        # 1. 重みの更新：点の数が目標より少ない店舗は重みを上げ（広げ）、多い店舗は下げる
+        for _ in range(WEIGHT_STEPS):
+            error = (targets - _counts(labels, k)) / targets
+            if np.abs(error).max() <= tolerance:
+                break
+            direction = np.sign(error)
+            step = np.where(direction * previous > 0, step * STEP_GROWTH,
+                            np.where(direction * previous < 0, step * STEP_SHRINK, step))
+            previous = direction
+            weights += direction * step
+            weights -= weights.max()
+            labels = nearest_sites(points, sites, weights)
+
+        # 広さが目標どおりで、前の反復でサイトがほとんど動かなかったら止める
+        if movement <= move_tolerance and np.abs((targets - _counts(labels, k)) / targets).max() <= tolerance:
+            converged = True
+            break
+
+        # 2. サイトを店舗の点の重心に動かす（点のない店舗はそのまま）
+        counts = _counts(labels, k)
+        sums = np.column_stack([np.bincount(labels, weights=points[:, axis], minlength=k) for axis in range(2)])
+        moved = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], sites)
+        movement = np.sqrt(((moved - sites) ** 2).sum(axis=1)).max()
+        sites = moved
+        labels = nearest_sites(points, sites, weights)
+
+    counts = _counts(labels, k)
+    report = {"iterations": iteration, "seconds": time.perf_counter() - start,
+              "max_error": float(np.abs((targets - counts) / targets).max()), "converged": converged}
+    if verbose:
+        print(format_report(report))
+    return labels, sites, weights, report
+
+
+def format_report(report):
+    """
+    計測結果を1行の文字列にする
+    """
+    state = "収束" if report["converged"] else "反復回数の上限で停止"
+    return (f"キャパシティ分割: {report['iterations']} 回, {report['seconds']:.3f} 秒, "
+            f"広さの誤差 最大 {report['max_error'] * 100:.1f}%（{state}）")
+
+
+def partition_mask(mask, capacities, sites=None, weights=None, max_sample_points=MAX_SAMPLE_POINTS, verbose=True,
+                   **options):
+    """
+    マスク（True のピクセルがフロアの領域）をキャパシティに比例した面積の店舗に分け、
+    (ラベル画像 (高さ, 幅)（領域の外は -1）, サイト, 重み, 計測結果) を返す
+    ピクセルが max_sample_points より多いときは、まず等間隔に間引いたピクセルで分け、
+    そのサイトと重みから全てのピクセルで続ける（計測結果の回数と時間は両方の合計）
+    """
+    start = time.perf_counter()
+    rows, cols = np.nonzero(mask)
+    points = np.column_stack([rows, cols])
+    iterations = 0
+    stride = int(np.ceil(np.sqrt(len(points) / max_sample_points)))
+    if stride > 1:
+        sample = points[(rows % stride == 0) & (cols % stride == 0)]
+        if len(sample) >= len(capacities):
+            # 間引いた点ではサイトの移動の許容値も間隔に合わせて広げる
+            # パワー距離は座標の2乗の単位なので、間引いた点で求めた重みを全てのピクセルでもそのまま使える
+            sample_options = dict(options, move_tolerance=options.get("move_tolerance", MOVE_TOLERANCE) * stride)
+            _, sites, weights, report = capacity_partition(sample, capacities, sites, weights, verbose=False,
+                                                           **sample_options)
+            iterations = report["iterations"]
+            # サイトは間引いた間隔より細かくは決まらないので、全てのピクセルではその間隔の移動で止める
+            options.setdefault("move_tolerance", float(stride))
+    labels, sites, weights, report = capacity_partition(points, capacities, sites, weights, verbose=False,
+                                                        **options)
+    report["iterations"] += iterations
+    report["seconds"] = time.perf_counter() - start
+    if verbose:
+        print(format_report(report))
+    image = np.full(np.shape(mask)[:2], -1, dtype=np.int32)
+    image[rows, cols] = labels
+    return image, sites, weights, report
@@ -0,0 +1,231 @@
+import json
+import os
+import random
+import tempfile
+import numpy as np
+from population import ArrayPopulation
+from profiler import end_generation
+
+# 何世代ごとにチェックポイントを書き出すか
+CHECKPOINT_EVERY = 10
+
+
+def _random_state():
+    # random モジュールと numpy の乱数の状態を配列にする
+    version, internal, gauss_next = random.getstate()
+    _, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+    return {
+        "py_random_version": np.array(version),
+        "py_random_state": np.array(internal, dtype=np.uint64),
+        "py_random_gauss": np.array(np.nan if gauss_next is None else gauss_next),
+        "np_random_keys": keys,
+        "np_random_extra": np.array([pos, has_gauss]),
+        "np_random_gauss": np.array(cached_gaussian),
+    }
+
+
+def _restore_random_state(data):
+    gauss_next = float(data["py_random_gauss"])
+    random.setstate((int(data["py_random_version"]), tuple(int(value) for value in data["py_random_state"]),
+                     None if np.isnan(gauss_next) else gauss_next))
+    pos, has_gauss = (int(value) for value in data["np_random_extra"])
+    np.random.set_state(("MT19937", data["np_random_keys"], pos, has_gauss, float(data["np_random_gauss"])))
+
+
+def _json_array(value):
+    # JSON にできる値をバイト列の配列にする（npz に入れるため）
+    text = json.dumps(value, ensure_ascii=False, default=lambda item: item.tolist())
+    return np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+
+
+def _from_json_array(array):
+    return json.loads(array.tobytes().decode("utf-8"))
+
+
+def sequence_codec(icls, vocabulary, length):
+    """
+    ga_floor / ga_and_clustering の個体（店舗名の並び）を配列にする encode と、元に戻す decode を返す
+    店舗名は vocabulary の位置（int16）にし、長さ length になるまで -1 で埋める
+    """
+    codes = {name: code for code, name in enumerate(vocabulary)}
+
+    def encode(individual):
+        array = np.full(length, -1, dtype=np.int16)
+        array[:len(individual)] = [codes[name] for name in individual]
+        return {"sequence": array}
+
+    def decode(genes):
+        return icls(vocabulary[code] for code in genes["sequence"].tolist() if code >= 0)
+
+    return encode, decode
+
+
+class Checkpointer:
+    """
+    GAの途中の状態（集団、評価値、乱数の状態、世代数、殿堂入り個体、logbook）を npz ファイルに保存・復元する
+    DEAP の個体のリストは encode / decode で配列との間を変換し、ArrayPopulation はそのまま保存する
+    書き込みは一時ファイルに書いてから置き換えるので、途中で止まっても前のチェックポイントは壊れない
+    rng（numpy の Generator）を渡すと、その状態も保存・復元する
+    """
+
+    def __init__(self, path, every=CHECKPOINT_EVERY, encode=None, decode=None, weight=1.0, rng=None):
+        self.path = path
+        self.every = every
+        self.encode = encode
+        self.decode = decode
+        self.weight = weight
+        self.rng = rng
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _to_arrays(self, population):
+        if isinstance(population, ArrayPopulation):
+            return population
+        return ArrayPopulation.from_individuals(population, self.encode, self.weight)
+
+    def _from_arrays(self, population):
+        if self.decode is None:
+            return population
+        return population.to_individuals(self.decode)
+
+    def save(self, gen, population, halloffame=None, logbook=None, force=False):
+        """
+        every 世代ごと（force が True なら必ず）にチェックポイントを書き出し、書き出したかどうかを返す
+        """
+        if not force and gen % self.every:
+            return False
+        arrays = _random_state()
+        arrays["gen"] = np.array(gen)
+        population = self._to_arrays(population)
+        arrays["weight"] = np.array(population.weight)
+        arrays["fitness"] = population.fitness
+        for name, array in population.genes.items():
+            arrays["gene_" + name] = array
+        if halloffame is not None and len(halloffame):
+            hof = self._to_arrays(list(halloffame))
+            arrays["hof_fitness"] = hof.fitness
+            for name, array in hof.genes.items():
+                arrays["hof_gene_" + name] = array
+        if logbook is not None:
+            arrays["logbook"] = _json_array(list(logbook))
+        if self.rng is not None:
+            arrays["rng_state"] = _json_array(self.rng.bit_generator.state)
+
+        # 同じディレクトリの一時ファイルに書いてから置き換える
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return True
+
+    def load(self, halloffame=None, logbook=None):
+        """
+        チェックポイントを読み込んで乱数の状態を復元し、(世代数, 集団) を返す
+        halloffame と logbook を渡すと、保存されていた内容に置き換える
+        """
+        with np.load(self.path) as data:
+            data = dict(data)
+        _restore_random_state(data)
+        if self.rng is not None and "rng_state" in data:
+            self.rng.bit_generator.state = _from_json_array(data["rng_state"])
+
+        weight = float(data["weight"])
+        genes = {name[len("gene_"):]: array for name, array in data.items() if name.startswith("gene_")}
+        population = self._from_arrays(ArrayPopulation(genes, data["fitness"], weight))
+
+        if halloffame is not None:
+            halloffame.clear()
+            if "hof_fitness" in data:
+                hof_genes = {name[len("hof_gene_"):]: array for name, array in data.items()
+                             if name.startswith("hof_gene_")}
+                # 良い順に並んでいるので、悪いものから入れ直す
+                for ind in reversed(self._from_arrays(ArrayPopulation(hof_genes, data["hof_fitness"], weight))):
+                    halloffame.insert(ind)
+        if logbook is not None and "logbook" in data:
+            logbook[:] = _from_json_array(data["logbook"])
+        return int(data["gen"]), population
+
+
+def ea_simple(population, toolbox, cxpb, mutpb, ngen, stats=None, halloffame=None, verbose=__debug__,
+              checkpoint=None, resume=False, termination=None, stats_logger=None):
+    """
+    algorithms.eaSimple と同じ世代ループに、チェックポイントの保存と再開を加えたもの
+    checkpoint（Checkpointer）を渡すと checkpoint.every 世代ごとと最後の世代で状態を保存する
+    resume が True でチェックポイントがあれば、その世代の続きから同じ乱数の流れで進化させる
+    termination（termination.Termination）を渡すと、その条件を満たした世代で止める
+    stats_logger（stats_logger.StatsLogger）を渡すと、世代ごとの統計をファイルに書き出す
+    """
+    from deap import algorithms, tools
+
+    logbook = tools.Logbook()
+    logbook.header = ['gen', 'nevals'] + (stats.fields if stats else [])
+
+    stopped = False
+    if resume and checkpoint is not None and checkpoint.exists():
+        start_gen, restored = checkpoint.load(halloffame, logbook)
+        population[:] = restored
+        if verbose:
+            print(f"resumed from {checkpoint.path} at generation {start_gen}")
+    else:
+        start_gen = 0
+        # 評価値のない個体を評価
+        invalid_ind = [ind for ind in population if not ind.fitness.valid]
+        fitnesses = toolbox.map(toolbox.evaluate, invalid_ind)
+        for ind, fit in zip(invalid_ind, fitnesses):
+            ind.fitness.values = fit
+
+        if halloffame is not None:
+            halloffame.update(population)
+
+        record = stats.compile(population) if stats else {}
+        logbook.record(gen=0, nevals=len(invalid_ind), **record)
+        if verbose:
+            print(logbook.stream)
+        end_generation(0)
+        if stats_logger is not None:
+            stats_logger.record(0, len(invalid_ind), population)
+        if termination is not None:
+            stopped = termination.update(0, len(invalid_ind), population) is not None
+        if checkpoint is not None:
+            checkpoint.save(0, population, halloffame, logbook, force=ngen == 0 or stopped)
+
+    for gen in range(start_gen + 1, ngen + 1):
+        if stopped:
+            break
+        # 選択、交叉・突然変異
+        offspring = toolbox.select(population, len(population))
+        offspring = algorithms.varAnd(offspring, toolbox, cxpb, mutpb)
+
+        # 評価値のない個体を評価
+        invalid_ind = [ind for ind in offspring if not ind.fitness.valid]
+        fitnesses = toolbox.map(toolbox.evaluate, invalid_ind)
+        for ind, fit in zip(invalid_ind, fitnesses):
+            ind.fitness.values = fit
+
+        if halloffame is not None:
+            halloffame.update(offspring)
+
+        population[:] = offspring
+
+        record = stats.compile(population) if stats else {}
+        logbook.record(gen=gen, nevals=len(invalid_ind), **record)
+        if verbose:
+            print(logbook.stream)
+        end_generation(gen)
+        if stats_logger is not None:
+            stats_logger.record(gen, len(invalid_ind), population)
+        if termination is not None:
+            stopped = termination.update(gen, len(invalid_ind), population) is not None
+        if checkpoint is not None:
+            checkpoint.save(gen, population, halloffame, logbook, force=gen == ngen or stopped)
+
+    return population, logbook
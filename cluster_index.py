@@ -0,0 +1,67 @@
+import numpy as np
+
+# クラスタリングの結果（点ごとのラベル）を、ラベルの順に並べた点の番号と各ラベルの開始位置にしておく
+# ラベルは一度決めたら変わらないので、クラスタの点や重心を使うたびに labels == id で探さずに済む
+
+
+def entry_distances(points, centroids, entries):
+    """
+    入口の点の番号 entries (pop, k)（列 j がクラスタ j の入口）と各クラスタの重心との距離の合計 (pop,)
+    集団全体の入口の座標を一度に取り出し、まとめて距離を計算する
+    """
+    entries = np.asarray(entries, dtype=np.int64)
+    positions = np.asarray(points)[entries].astype(np.float64)  # (pop, k, d)
+    return np.linalg.norm(positions - centroids[None, :entries.shape[1]], axis=2).sum(axis=1)
+
+
+class ClusterIndex:
+    """
+    points (n, d) の各点のラベル labels (n,)（0〜n_clusters-1、負の値はどのクラスタにも入れない）から作る
+    order: ラベルの順に並べた点の番号、offsets: ラベル k の点は order[offsets[k]:offsets[k + 1]]
+    centroids: 各クラスタの重心 (n_clusters, d)（centroids を渡したときはその値、例えば KMeans の cluster_centers_）
+    """
+
+    def __init__(self, points, labels, n_clusters=None, centroids=None):
+        points = np.asarray(points)
+        labels = np.asarray(labels, dtype=np.int64)
+        if n_clusters is None:
+            n_clusters = int(labels.max()) + 1 if len(labels) else 0
+        self.points = points
+        self.n_clusters = n_clusters
+        valid = np.nonzero(labels >= 0)[0]
+        self.order = valid[np.argsort(labels[valid], kind="stable")]
+        self.counts = np.bincount(labels[valid], minlength=n_clusters)
+        self.offsets = np.concatenate([[0], np.cumsum(self.counts)])
+        self.labels = labels
+        if centroids is None:
+            # 点のないクラスタの重心は nan
+            sums = np.zeros((n_clusters, points.shape[1]))
+            np.add.at(sums, labels[valid], points[valid])
+            with np.errstate(invalid="ignore", divide="ignore"):
+                centroids = sums / self.counts[:, None]
+        self.centroids = np.asarray(centroids, dtype=np.float64)
+
+    def members(self, label):
+        """
+        ラベル label の点の番号
+        """
+        return self.order[self.offsets[label]:self.offsets[label + 1]]
+
+    def nearest_to_centroids(self):
+        """
+        各クラスタで重心に最も近い点の番号 (n_clusters,) を返す（点のないクラスタは -1）
+        """
+        sorted_labels = self.labels[self.order]
+        distances = np.linalg.norm(self.points[self.order] - self.centroids[sorted_labels], axis=1)
+        # ラベルごとに距離の小さい順に並べ、各ラベルの先頭を取る（同じ距離なら番号の小さい点）
+        ranked = np.lexsort((self.order, distances, sorted_labels))
+        nearest = np.full(self.n_clusters, -1, dtype=np.int64)
+        nonempty = self.counts > 0
+        nearest[nonempty] = self.order[ranked[self.offsets[:-1][nonempty]]]
+        return nearest
+
+    def entry_distances(self, entries):
+        """
+        入口の点の番号 entries (pop, n_clusters) と各クラスタの重心との距離の合計 (pop,)（entry_distances と同じ）
+        """
+        return entry_distances(self.points, self.centroids, entries)
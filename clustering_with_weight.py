@@ -1,7 +1,8 @@
-import cv2
+import os
 import numpy as np
-from scipy.spatial import Voronoi
-from PIL import Image, ImageDraw, ImageFont
+from capacity_partition import partition_mask
+from render import paint_regions, draw_labels, save_result, GlyphCache
+from floor_grid import load_shop_area, load_plan_image
 
 # フロア1の店舗とキャパシティの設定
 floor_1_shops = ['雑貨', '雑貨', '雑貨', '雑貨', '雑貨', '書店', '雑貨', '食事', '雑貨']
@@ -19,78 +20,40 @@ shop_types = {
 }
 
 # 画像の読み込み
-image_path = "./high_res_screenshot.jpg"  # アップロードした画像のパス
-image = cv2.imread(image_path)
+image_path = os.environ.get("GA_PLAN", "./high_res_screenshot.jpg")  # フロアの画像か、エディタで保存した図面（dbfiles/*.db）のパス
+output_path = os.environ.get("GA_OUTPUT", "./clustering_with_weight_result.png")  # 結果の画像を保存するパス（GA_SHOW=1 なら画面にも表示）
+image = load_plan_image(image_path)
 
-# BGR色空間で指定された色範囲を定義
-target_color_bgr = np.array([183,66,67])  # BGR形式で指定
-threshold = 10  # 色の範囲の許容誤差
+# 店舗エリアのマスク（画像なら店舗エリアの色のピクセル、図面のデータベースなら店舗エリアのセル）
+shop_area = load_shop_area(image_path)
 
-# 指定色の周辺の範囲を定義
-lower_bound = target_color_bgr - threshold
-upper_bound = target_color_bgr + threshold
-
-# マスクを作成
-mask = cv2.inRange(image, lower_bound, upper_bound)
-
-# マスクから輪郭を検出
-contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-# 黒色の背景に輪郭を描画（デバッグ用）
-boundary_image = np.zeros_like(image)
-cv2.drawContours(boundary_image, contours, -1, (255, 255, 255), 2)
-
-# 境界線のピクセル座標を取得
-boundary_points = np.column_stack(np.where(boundary_image > 0))
-
-# フロア1の店舗の仮想的な重心をキャパシティに基づき拡張して生成
-expanded_centroids = []
-for shop in floor_1_shops:
-    centroid = boundary_points[np.random.choice(len(boundary_points))]  # 任意のポイントを取得
-    capacity_factor = shop_types[shop] / max(shop_types.values())  # キャパシティに基づく重み
-    expansion_offset = np.random.normal(scale=50 * capacity_factor, size=centroid.shape)  # 偏移
-    expanded_centroids.append(centroid + expansion_offset)
-
-expanded_centroids = np.array(expanded_centroids)
-
-# Voronoi領域の計算
-vor = Voronoi(expanded_centroids)
+# フロア1の店舗ごとに、店舗エリアをキャパシティに比例した面積ずつ分ける（パワー図と重み付きの Lloyd 法）
+# 反復回数・時間・面積の誤差を表示する
+capacities = [shop_types[shop] for shop in floor_1_shops]
+region_labels, shop_sites, _, _ = partition_mask(shop_area, capacities)
 
 # 描画用に各クラスタに対して色をランダムに割り当て
 colors = np.random.randint(0, 255, size=(len(floor_1_shops), 3))
 
 # # 各店舗の入口を決定し、重心から最も近い点を赤い点で描画
 # store_entries = []
-# for i, centroid in enumerate(expanded_centroids):
+# for i, centroid in enumerate(shop_sites):
 #     cluster_points = boundary_points[np.linalg.norm(boundary_points - centroid, axis=1) < 100]  # 近隣の点を取得
 #     if len(cluster_points) > 0:
 #         closest_point = cluster_points[np.argmin(np.linalg.norm(cluster_points - centroid, axis=1))]
 #         store_entries.append(closest_point)
 #         cv2.circle(image, (closest_point[1], closest_point[0]), 5, (0, 0, 255), -1)  # 赤で入口描画
 
-# Voronoi領域に基づき、boundary_pointsを色分けして描画
-for i, point in enumerate(boundary_points):
-    distances = np.linalg.norm(expanded_centroids - point, axis=1)
-    closest_cluster = np.argmin(distances)
-    cv2.circle(image, (point[1], point[0]), 1, colors[closest_cluster].tolist(), -1)
-
-# OpenCVの画像をPillowに変換
-image_pil = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-draw = ImageDraw.Draw(image_pil)
+# 店舗ごとの領域を色分けして描画（ラベル画像のピクセルをその店舗の色で塗る）
+paint_regions(image, region_labels, colors)
 
 # 日本語フォントの読み込み（必要に応じてパスを変更してください）
 font_path = "/Users/cdl/Downloads/Noto_Sans_JP/NotoSansJP-VariableFont_wght.ttf"  # Mac用の例
-font = ImageFont.truetype(font_path, 20)
+glyphs = GlyphCache(font_path)
 
 # 各店舗の種類のラベルを描画
-for i, (centroid, shop) in enumerate(zip(expanded_centroids, floor_1_shops)):
-    position = (int(centroid[1]), int(centroid[0]))  # ラベル位置（y, x）
-    draw.text(position, shop, font=font, fill=(0, 0, 0))
-
-# Pillow画像をOpenCV形式に戻す
-image_with_labels = cv2.cvtColor(np.array(image_pil), cv2.COLOR_RGB2BGR)
+label_positions = [(int(site[1]), int(site[0])) for site in shop_sites]  # ラベル位置（各店舗の領域の重心）
+image_with_labels = draw_labels(image, label_positions, floor_1_shops, glyphs, background=None)
 
-# 結果を表示
-cv2.imshow("Floor 1 Store Layout with Entrances and Labels", image_with_labels)
-cv2.waitKey(0)
-cv2.destroyAllWindows()
+# 結果を保存
+save_result(output_path, image_with_labels, "Floor 1 Store Layout with Entrances and Labels")
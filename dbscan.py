@@ -1,37 +1,26 @@
-import cv2
+import os
 import numpy as np
-from sklearn.cluster import DBSCAN
+from floor_grid import load_plan_boundary, load_plan_image
+from segmentation import cluster_dbscan
+from render import paint_points, draw_markers, save_result
 
 # 画像を読み込む
-image_path = "./high_res_screenshot.jpg"  # アップロードした画像のパス
-image = cv2.imread(image_path)
+image_path = os.environ.get("GA_PLAN", "./high_res_screenshot.jpg")  # フロアの画像か、エディタで保存した図面（dbfiles/*.db）のパス
+output_path = os.environ.get("GA_OUTPUT", "./dbscan_result.png")  # 結果の画像を保存するパス（GA_SHOW=1 なら画面にも表示）
+image = load_plan_image(image_path)
 
 # BGR色空間で指定された色範囲を定義
 target_color_bgr = np.array([183,66,67])  # BGR形式で指定
 threshold = 10  # 色の範囲の許容誤差
 
-# 指定色の周辺の範囲を定義
-lower_bound = target_color_bgr - threshold
-upper_bound = target_color_bgr + threshold
-
-# マスクを作成
-mask = cv2.inRange(image, lower_bound, upper_bound)
-
-# マスクから輪郭を検出
-contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-# 黒色の背景に輪郭を描画（デバッグ用）
-boundary_image = np.zeros_like(image)
-cv2.drawContours(boundary_image, contours, -1, (255, 255, 255), 2)
-
-# 境界線のピクセル座標を取得
-boundary_points = np.column_stack(np.where(boundary_image > 0))
+# 境界線の輪郭とピクセル座標を取得（画像なら boundary.py で画像ごとにキャッシュ、図面のデータベースなら道のセルから作る）
+contours, boundary_points, _ = load_plan_boundary(image_path, target_color_bgr, threshold)
 
 # DBSCANクラスタリングを使ってboundary_pointsをクラスタリング
+# （環境変数 GA_DBSCAN_BACKEND で grid / dbscan を選択、時間を表示）
 eps = 10  # クラスタリングの半径
 min_samples = 10  # クラスタに必要な最小サンプル数
-dbscan = DBSCAN(eps=eps, min_samples=min_samples)
-labels = dbscan.fit_predict(boundary_points)
+labels, _ = cluster_dbscan(boundary_points, eps, min_samples)
 
 # クラスタごとに色を割り当てる
 unique_labels = np.unique(labels)
@@ -54,17 +43,10 @@ for shop_id in unique_labels:
     closest_point_idx = np.argmin(distances)
     store_entries.append(cluster_points[closest_point_idx])
 
-# 結果を画像に描画
-for shop_id, shop_entry in enumerate(store_entries):
-    # 各クラスタに対してその店に対応する色で描画
-    cluster_points = boundary_points[labels == unique_labels[shop_id]]
-    for point in cluster_points:
-        cv2.circle(image, (point[1], point[0]), 1, colors[shop_id].tolist(), -1)
-
-    # 店の入口（重心に最も近い点）を赤で描画
-    cv2.circle(image, (shop_entry[1], shop_entry[0]), 5, (0, 0, 255), -1)
+# 結果を画像に描画（ノイズ以外の各クラスタをそのクラスタの色で、店の入口（重心に最も近い点）を赤で）
+clustered = labels != -1
+paint_points(image, boundary_points[clustered], np.searchsorted(unique_labels, labels[clustered]), colors)
+draw_markers(image, store_entries)
 
-# 結果を表示
-cv2.imshow("Optimized Store Layout", image)
-cv2.waitKey(0)
-cv2.destroyAllWindows()
+# 結果を保存
+save_result(output_path, image)
@@ -0,0 +1,95 @@
+import hashlib
+import os
+from collections import OrderedDict
+import numpy as np
+from layout_fitness import shop_arrays
+
+# レイアウトの座標を丸める桁数（これより細かい違いは同じ個体とみなす）
+LAYOUT_KEY_DECIMALS = 6
+
+
+def layout_key(shop, decimals=LAYOUT_KEY_DECIMALS):
+    """
+    ga_main の個体（リスト表現または配列表現）のキー
+    座標を丸めて整数にし、店舗種類コードと合わせたバイト列のハッシュを返す
+    """
+    coords, codes = shop_arrays(shop)
+    quantized = np.round(np.asarray(coords, dtype=np.float64) * 10 ** decimals).astype(np.int64)
+    digest = hashlib.blake2b(quantized.tobytes(), digest_size=16)
+    digest.update(np.asarray(codes, dtype=np.int16).tobytes())
+    return digest.digest()
+
+
+def sequence_key(individual):
+    """
+    ga_floor / ga_shop / test2 の個体（店舗名や入口の番号の並び）のキー
+    """
+    return tuple(individual)
+
+
+class CachedMap:
+    """
+    評価値をキャッシュする toolbox.map
+    個体の内容から作ったキーで評価値を覚えておき、同じ内容の個体は評価せずに値を返す
+    同じ map の呼び出しの中で重複している個体も一度だけ評価する
+    キャッシュは最近使ったものから maxsize 個まで残す（LRU）
+    評価は inner_map（batch_map や EvaluationBackend.map）に任せるので、並列化と組み合わせられる
+    """
+
+    def __init__(self, inner_map, key, maxsize=100_000, verbose=False):
+        self.inner_map = inner_map
+        self.key = key
+        self.maxsize = maxsize
+        self.verbose = verbose
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.history = []  # map の呼び出し（世代）ごとの集計
+
+    def __call__(self, func, iterable):
+        individuals = list(iterable)
+        hits = misses = evictions = 0
+        keys = [(func, self.key(ind)) for ind in individuals]
+
+        # キャッシュにない個体だけを、重複を除いて評価する
+        pending = {}
+        for ind, key in zip(individuals, keys):
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                hits += 1
+            elif key in pending:
+                hits += 1
+            else:
+                pending[key] = ind
+                misses += 1
+        fitnesses = self.inner_map(func, list(pending.values()))
+        new_values = dict(zip(pending.keys(), fitnesses))
+
+        results = [new_values[key] if key in new_values else self.entries[key] for key in keys]
+
+        for key, value in new_values.items():
+            self.entries[key] = value
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                evictions += 1
+
+        self.hits += hits
+        self.misses += misses
+        self.evictions += evictions
+        stats = {"hits": hits, "misses": misses, "evictions": evictions, "size": len(self.entries)}
+        self.history.append(stats)
+        if self.verbose:
+            print(f"fitness cache: hits={hits} misses={misses} evictions={evictions} size={len(self.entries)}")
+        return results
+
+
+def cached_map(inner_map, key, maxsize=None, verbose=True):
+    """
+    環境変数 GA_FITNESS_CACHE（キャッシュする個体数）が設定されていればキャッシュ付きの map を返す
+    設定されていなければ inner_map をそのまま返す
+    """
+    maxsize = maxsize or int(os.environ.get("GA_FITNESS_CACHE", 0))
+    if maxsize <= 0:
+        return inner_map
+    return CachedMap(inner_map, key, maxsize=maxsize, verbose=verbose)
@@ -0,0 +1,235 @@
+import itertools
+import numpy as np
+from floor_fitness import PREFERRED_SCORE, OTHER_SCORE, OVERFLOW_PENALTY, COUNT_PENALTY
+from population import ArrayPopulation
+from profiler import section, end_generation
+
+# フロア割り当てを「フロアごと・店舗の種類ごとの店舗数の行列」(フロア数, 種類数) で表す
+# 店舗名の並び（ga_floor の個体）と違い、同じフロアの中の並べ替えは同じ個体になる
+# 並びの個体では i 番目の店舗が i % フロア数 のフロアに入るので各フロアの店舗数がほぼ同じになるが、
+# 店舗数の行列にはその制約はない（そのため、最適解の評価値は並びの個体の評価値の上限になる）
+
+# DP の到達できない状態の値
+UNREACHABLE = -(1 << 40)
+
+
+def _floor_values(tables):
+    # 店舗をフロアに置いたときの点数 (フロア数, 種類数)
+    preferred = tables.preferred[None, :] == np.arange(tables.num_floors)[:, None]
+    return np.where(preferred, PREFERRED_SCORE, OTHER_SCORE).astype(np.int64)
+
+
+def _max_fit(available, size, max_count):
+    # 残りのキャパシティ available に置ける店舗数（キャパシティ0の店舗は最大数までいくつでも置ける）
+    return max_count if size == 0 else min(max_count, available // size)
+
+
+def individual_to_counts(individual, tables):
+    """
+    店舗名の並びの個体（ga_floor の個体）の店舗数の行列 (フロア数, 種類数) を返す
+    """
+    n_floors = tables.num_floors
+    counts = np.zeros((n_floors, len(tables.names)), dtype=np.int64)
+    for position, name in enumerate(individual):
+        counts[position % n_floors, tables.codes[name]] += 1
+    return counts
+
+
+def counts_to_floors(counts, tables):
+    """
+    店舗数の行列をフロアごとの店舗名のリストにする
+    """
+    return [[name for name, count in zip(tables.names, row) for _ in range(int(count))] for row in counts]
+
+
+def eval_counts_batch(counts, tables):
+    """
+    店舗数の行列の集団 (pop, フロア数, 種類数) の評価値 (pop,) を返す
+    各フロアでは店舗の種類の順に置けるだけ置き、置けなかった店舗にはペナルティを与える
+    （ga_floor.evaluate で同じフロアの店舗が種類の順に並んでいるときと同じ評価）
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    pop, n_floors, n_types = counts.shape
+    values = _floor_values(tables)
+    usage = np.zeros((pop, n_floors), dtype=np.int64)
+    score = np.zeros(pop, dtype=np.int64)
+    for t in range(n_types):
+        size = tables.capacity[t]
+        fits = counts[:, :, t]
+        if size > 0:
+            # キャパシティ0の店舗は全て置ける
+            fits = np.minimum(fits, (tables.floor_capacities - usage) // size)
+        usage += fits * size
+        score += (fits * values[:, t]).sum(axis=1) - OVERFLOW_PENALTY * (counts[:, :, t] - fits).sum(axis=1)
+    totals = counts.sum(axis=1)
+    score -= COUNT_PENALTY * (np.maximum(tables.min_count - totals, 0)
+                              + np.maximum(totals - tables.max_count, 0)).sum(axis=1)
+    return score
+
+
+def solve_counts(tables):
+    """
+    店舗数の行列で表したフロア割り当ての最適解を動的計画法で求め、(店舗数の行列, 評価値) を返す
+    状態は各フロアの使用済みキャパシティ、店舗の種類を1つずつ加えていく
+    種類ごとにフロアを1つずつ見て、その種類の店舗数の合計も状態に持つ（最大数と最小数の制約のため）
+    最小数までの店舗には不足のペナルティがなくなる分の点数を加えるので、評価値は eval_counts_batch と同じになる
+    """
+    caps = tables.floor_capacities
+    if np.any(tables.capacity < 0):
+        raise ValueError("店舗のキャパシティは0以上にしてください")
+    n_floors, n_types = len(caps), len(tables.names)
+    values = _floor_values(tables)
+    shape = tuple(int(cap) + 1 for cap in caps)
+
+    best = np.full(shape, UNREACHABLE, dtype=np.int64)
+    best[(0,) * n_floors] = 0
+    history = [best]
+    for t in range(n_types):
+        size = int(tables.capacity[t])
+        max_count = int(tables.max_count[t])
+        # table[k, 使用済みキャパシティ...]: この種類を k 店舗置いたときの最大値
+        table = np.full((max_count + 1,) + shape, UNREACHABLE, dtype=np.int64)
+        table[0] = best
+        for floor in range(n_floors):
+            updated = table.copy()
+            for x in range(1, _max_fit(int(caps[floor]), size, max_count) + 1):
+                target = [slice(x, None)] + [slice(None)] * n_floors
+                source = [slice(None, -x)] + [slice(None)] * n_floors
+                target[1 + floor] = slice(x * size, None)
+                source[1 + floor] = slice(None, shape[floor] - x * size)
+                np.maximum(updated[tuple(target)], table[tuple(source)] + x * values[floor, t],
+                           out=updated[tuple(target)])
+            table = updated
+        bonus = COUNT_PENALTY * np.minimum(np.arange(max_count + 1), tables.min_count[t])
+        best = (table + bonus.reshape((-1,) + (1,) * n_floors)).max(axis=0)
+        history.append(best)
+
+    # 最も良い状態から逆にたどって、種類ごとのフロアの店舗数を求める
+    state = np.unravel_index(int(best.argmax()), shape)
+    score = int(best[state]) - COUNT_PENALTY * int(tables.min_count.sum())
+    counts = np.zeros((n_floors, n_types), dtype=np.int64)
+    for t in reversed(range(n_types)):
+        size = int(tables.capacity[t])
+        target = history[t + 1][state]
+        ranges = [range(_max_fit(state[f], size, int(tables.max_count[t])) + 1) for f in range(n_floors)]
+        for x in itertools.product(*ranges):
+            if sum(x) > tables.max_count[t]:
+                continue
+            previous = tuple(state[f] - x[f] * size for f in range(n_floors))
+            value = (history[t][previous] + int((np.array(x) * values[:, t]).sum())
+                     + COUNT_PENALTY * min(sum(x), int(tables.min_count[t])))
+            if history[t][previous] > UNREACHABLE and value == target:
+                counts[:, t] = x
+                state = previous
+                break
+    return counts, score
+
+
+def random_counts(rng, pop_size, tables):
+    """
+    ランダムな店舗数の行列の集団 (pop, フロア数, 種類数) を作る
+    種類ごとの店舗数の合計は最小数〜最大数から選び、フロアにランダムに分ける
+    """
+    n_floors = tables.num_floors
+    totals = rng.integers(tables.min_count, tables.max_count + 1, size=(pop_size, len(tables.names)))
+    counts = rng.multinomial(totals, np.full(n_floors, 1 / n_floors))  # (pop, 種類数, フロア数)
+    return counts.transpose(0, 2, 1).astype(np.int64)
+
+
+def cx_counts_batch(counts, rng, cxpb):
+    """
+    隣り合う個体を組にし、確率 cxpb で店舗の種類ごとの列を半々の確率で入れ替える（一様交叉）
+    種類ごとの店舗数の合計は変わらない。counts はその場で書き換え、交叉した個体のマスクを返す
+    """
+    pop, _, n_types = counts.shape
+    n_pairs = pop // 2
+    changed = np.zeros(pop, dtype=bool)
+    mate = rng.random(n_pairs) < cxpb
+    swap = mate[:, None] & (rng.random((n_pairs, n_types)) < 0.5)
+    first = np.arange(0, 2 * n_pairs, 2)
+    second = first + 1
+    a, b = counts[first], counts[second]
+    mask = swap[:, None, :]
+    counts[first] = np.where(mask, b, a)
+    counts[second] = np.where(mask, a, b)
+    changed[first] = mate
+    changed[second] = mate
+    return changed
+
+
+def mut_counts_batch(counts, rng, mutpb, indpb, tables):
+    """
+    確率 mutpb で個体を選び、その中の店舗の種類ごとに確率 indpb で変異させる
+    半分は1店舗を別のフロアへ移し、残りは1つのフロアの店舗数を1増減する（合計は最大数以下、0以上）
+    counts はその場で書き換え、変異した個体のマスクを返す
+    """
+    pop, n_floors, n_types = counts.shape
+    mutate = rng.random(pop) < mutpb
+    rows, types = np.nonzero(mutate[:, None] & (rng.random((pop, n_types)) < indpb))
+    source = rng.integers(0, n_floors, len(rows))
+    target = rng.integers(0, n_floors, len(rows))
+    move = rng.random(len(rows)) < 0.5
+    delta = np.where(rng.random(len(rows)) < 0.5, -1, 1)
+    totals = counts[rows, :, types].sum(axis=1)
+
+    # 移動：移す元のフロアに店舗があるときだけ
+    moving = move & (counts[rows, source, types] > 0)
+    counts[rows[moving], source[moving], types[moving]] -= 1
+    counts[rows[moving], target[moving], types[moving]] += 1
+    # 増減：フロアの店舗数が負にならず、合計が最大数を超えないときだけ
+    adding = ~move & (counts[rows, source, types] + delta >= 0) & (totals + delta <= tables.max_count[types])
+    counts[rows[adding], source[adding], types[adding]] += delta[adding]
+    return mutate
+
+
+def ea_counts(tables, pop_size, ngen, rng, cxpb=0.5, mutpb=0.2, indpb=0.2, tournsize=3, elitism=0,
+              verbose=False, termination=None, stats_logger=None):
+    """
+    店舗数の行列を遺伝子にしたGA（layout_variation.ea_simple_batch と同じく集団を配列のまま進化させる）
+    termination と stats_logger は ea_simple_batch と同じ
+    最後の集団（population.ArrayPopulation、遺伝子は "counts"）と世代ごとの統計（logbook）を返す
+    """
+    def evaluate(counts):
+        return eval_counts_batch(counts, tables)
+
+    population = ArrayPopulation({"counts": random_counts(rng, pop_size, tables)})
+    logbook = []
+
+    def record(gen, nevals):
+        fitness = population.fitness
+        entry = {"gen": gen, "nevals": nevals, "avg": float(fitness.mean()), "std": float(fitness.std()),
+                 "min": float(fitness.min()), "max": float(fitness.max())}
+        logbook.append(entry)
+        if verbose:
+            print("\t".join(str(value) for value in entry.values()))
+
+    def end(gen, nevals):
+        record(gen, nevals)
+        end_generation(gen)
+        if stats_logger is not None:
+            stats_logger.record(gen, nevals, population)
+        return termination is not None and termination.update(gen, nevals, population) is not None
+
+    if verbose:
+        print("gen\tnevals\tavg\tstd\tmin\tmax")
+    with section("evaluate"):
+        nevals = population.evaluate(evaluate)
+    stopped = end(0, nevals)
+    for gen in range(1, ngen + 1):
+        if stopped:
+            break
+        with section("select"):
+            population = population.select_tournament(len(population), tournsize, rng, elitism)
+        # 交叉と突然変異（先頭のエリートはそのまま残す）、変化した個体だけ評価し直す
+        counts = population["counts"][elitism:]
+        with section("mate"):
+            crossed = cx_counts_batch(counts, rng, cxpb)
+        with section("mutate"):
+            mutated = mut_counts_batch(counts, rng, mutpb, indpb, tables)
+        invalid = np.zeros(len(population), dtype=bool)
+        invalid[elitism:] = crossed | mutated
+        population.invalidate(invalid)
+        with section("evaluate"):
+            nevals = population.evaluate(evaluate)
+        stopped = end(gen, nevals)
+    return population, logbook
@@ -0,0 +1,108 @@
+import itertools
+import numpy as np
+
+# 評価のパラメータ（ga_floor.evaluate と同じ値）
+PREFERRED_SCORE = 5   # 優先フロアに置けた店舗
+OTHER_SCORE = 1       # 優先フロア以外に置けた店舗
+OVERFLOW_PENALTY = 10  # キャパシティを超えて置けなかった店舗
+COUNT_PENALTY = 10    # 店舗数の制約から1店舗外れるごとのペナルティ
+
+
+class FloorTables:
+    """
+    フロア割り当ての評価に使う表
+    店舗の種類を整数コード（shop_types の順番）にし、コードで引ける配列にする
+    capacity: 店舗が占めるキャパシティ / preferred: 優先フロア（0始まり）
+    min_count, max_count: 店舗数の制約 / floor_capacities: フロアごとのキャパシティ
+    """
+
+    def __init__(self, shop_types, shop_constraints, preferred_floor, floor_capacities):
+        self.names = list(shop_types)
+        self.codes = {name: code for code, name in enumerate(self.names)}
+        self.capacity = np.array([shop_types[name] for name in self.names], dtype=np.int64)
+        self.preferred = np.array([preferred_floor[name] - 1 for name in self.names], dtype=np.int64)
+        self.min_count = np.array([shop_constraints[name][0] for name in self.names], dtype=np.int64)
+        self.max_count = np.array([shop_constraints[name][1] for name in self.names], dtype=np.int64)
+        self.floor_capacities = np.array(floor_capacities, dtype=np.int64)
+
+    @property
+    def num_floors(self):
+        return len(self.floor_capacities)
+
+    def encode(self, individuals):
+        """
+        店舗名の並びの個体のリストを、-1 で埋めたコードの行列 (pop, 最大の長さ) と長さ (pop,) にする
+        """
+        lengths = np.array([len(ind) for ind in individuals], dtype=np.int64)
+        # 全ての個体の店舗名を一度に番号にして、長さのマスクの位置に並べる
+        flat = np.fromiter(map(self.codes.__getitem__, itertools.chain.from_iterable(individuals)),
+                           dtype=np.int16, count=int(lengths.sum()))
+        codes = np.full((len(individuals), lengths.max(initial=0)), -1, dtype=np.int16)
+        codes[np.arange(codes.shape[1])[None, :] < lengths[:, None]] = flat
+        return codes, lengths
+
+
+def eval_floor_batch(codes, lengths, tables):
+    """
+    集団全体のフロア割り当ての評価関数
+    codes (pop, L): 店舗種類コード（長さより後ろは無視する）、lengths (pop,): 個体の長さ
+    ga_floor.evaluate と同じく、i 番目の店舗は i % フロア数 のフロアに並び順に置き、
+    キャパシティを超える店舗は置かずにペナルティを与える（置けなかった店舗の分は使わない）
+    各個体の評価値 (pop,) を返す
+    """
+    codes = np.asarray(codes)
+    lengths = np.asarray(lengths)
+    pop, length = codes.shape
+    n_floors = tables.num_floors
+    slots = -(-length // n_floors)
+
+    # (枠, pop, フロア) に並べ替える（枠ごとの計算が連続したメモリになるように、枠を先頭にする）
+    # 足りない分と長さより後ろは無効（-1）
+    padded = np.full((pop, slots * n_floors), -1, dtype=np.int32)
+    padded[:, :length] = codes
+    padded[np.arange(slots * n_floors)[None, :] >= lengths[:, None]] = -1
+    padded = np.ascontiguousarray(padded.reshape(pop, slots, n_floors).transpose(1, 0, 2))
+    valid = padded >= 0
+    # 無効な枠はキャパシティ0の店舗として扱う（表の最後に追加した番号）
+    n_types = len(tables.names)
+    safe = np.where(valid, padded, n_types)
+    capacity = np.append(tables.capacity, 0).astype(np.int32)[safe]
+    floor_capacities = tables.floor_capacities.astype(np.int32)
+
+    # 最初にキャパシティを超えるまでは、全ての店舗が置けるので累積和で済む
+    cumulative = np.cumsum(capacity, axis=0, dtype=np.int32)
+    over = cumulative > floor_capacities
+    start = int(np.where(over.any(axis=0), over.argmax(axis=0), slots).min()) if pop else slots
+    placed = valid.copy()
+    usage = cumulative[start - 1] if start > 0 else np.zeros((pop, n_floors), dtype=np.int32)
+    # それより後ろの枠は、置けなかった店舗の分を除きながら順に判定する（集団とフロアはまとめて計算）
+    for slot in range(start, slots):
+        fits = valid[slot] & (usage + capacity[slot] <= floor_capacities)
+        usage += capacity[slot] * fits
+        placed[slot] = fits
+
+    # 置けた店舗は優先フロアかどうかの点数を表で引き、置けなかった店舗にはペナルティを与える
+    preferred = np.append(tables.preferred, -1)[:, None] == np.arange(n_floors)[None, :]
+    placed_points = np.where(preferred, PREFERRED_SCORE, OTHER_SCORE).astype(np.int32)
+    placed_points[n_types] = 0
+    points = placed_points.ravel()[safe * n_floors + np.arange(n_floors, dtype=np.int32)]
+    points = np.where(placed, points, np.where(valid, -OVERFLOW_PENALTY, 0))
+    score = points.sum(axis=(0, 2), dtype=np.int64)
+
+    # 店舗の種類ごとの数（個体ごとに bincount）
+    offsets = (np.arange(pop, dtype=np.int64) * (n_types + 1))[None, :, None]
+    counts = np.bincount((safe + offsets).ravel(), minlength=pop * (n_types + 1)).reshape(pop, n_types + 1)
+    counts = counts[:, :n_types]
+    score -= COUNT_PENALTY * (np.maximum(tables.min_count - counts, 0)
+                              + np.maximum(counts - tables.max_count, 0)).sum(axis=1)
+    return score
+
+
+def eval_floor_population(population, tables):
+    """
+    DEAP の個体のリストをまとめて評価し、評価値のタプルのリストを返す（batch_map 用）
+    """
+    if not population:
+        return []
+    codes, lengths = tables.encode(population)
+    return [(int(score),) for score in eval_floor_batch(codes, lengths, tables)]
@@ -0,0 +1,165 @@
+import os
+import sqlite3
+import numpy as np
+from boundary import THICKNESS, TARGET_COLOR_BGR, THRESHOLD, boundary_from_mask, load_boundary
+
+# エディタ（GUI/polygon_grid_gui.py）で保存したフロアの図面（dbfiles/*.db）をそのまま配列として読み込む
+# 画面のキャプチャと JPEG の保存・色のしきい値での境界線の検出をせずに、セルの種類から境界線を作る
+# セルの種類は番号（カテゴリコード）の配列 (行, 列) で持つ（1セル = GUI の grid_size ピクセル四方）
+
+# GUI のキャンバスの大きさとセルの大きさ（ピクセル）
+CANVAS_SIZE = 400
+GRID_SIZE = 20
+# 画像にするときの1セルのピクセル数（キャプチャを2倍にした high_res_screenshot.jpg と同じ縮尺）
+CELL_PIXELS = 2 * GRID_SIZE
+
+# セルの種類の番号
+OUTSIDE = 0    # 建物の外形（ポリゴン）の外
+EMPTY = 1      # 外形の中で塗っていないセル（白）
+ROAD = 2       # 道（青）
+ESCALATOR = 3  # エスカレータ（緑）
+SHOP_AREA = 4  # 店舗エリア（黄）
+CUTOUT = 5     # 切り欠きエリア（灰）
+CATEGORY_NAMES = ("outside", "empty", "road", "escalator", "shop_area", "cutout")
+# GUI で塗る色とセルの種類の番号
+COLOR_CODES = {"white": EMPTY, "blue": ROAD, "green": ESCALATOR, "yellow": SHOP_AREA, "gray": CUTOUT}
+# フロアの画像で店舗エリア（黄）とみなす色（BGR、キャプチャの JPEG での値）と許容誤差
+SHOP_AREA_COLOR_BGR = (84, 255, 255)
+SHOP_AREA_THRESHOLD = 40
+# 画像にするときの色（BGR、Tk の色名と同じ値、外形の外はキャンバスの背景の grey）
+CATEGORY_COLORS_BGR = np.array([
+    [190, 190, 190],
+    [255, 255, 255],
+    [255, 0, 0],
+    [0, 255, 0],
+    [0, 255, 255],
+    [190, 190, 190],
+], dtype=np.uint8)
+
+
+def read_db(db_path):
+    """
+    図面のデータベースの (セルの色のリスト [(x, y, 色), ...], 外形の頂点のリスト [(x, y), ...]) を返す
+    セルの色は保存された順（同じセルに複数の色があれば、GUI で読み込んだときと同じく後の色になる）
+    """
+    if not os.path.exists(db_path):
+        raise ValueError(f"データベースが見つかりません: {db_path}")
+    try:
+        with sqlite3.connect(db_path) as conn:
+            cells = conn.execute("SELECT x, y, color FROM cell_colors ORDER BY rowid").fetchall()
+            polygon = conn.execute("SELECT x, y FROM polygons ORDER BY vertex_index").fetchall()
+    except sqlite3.Error as e:
+        raise ValueError(f"図面のデータベースを読み込めません: {db_path}（{e}）")
+    return cells, polygon
+
+
+def points_in_polygon(x, y, polygon):
+    """
+    各点 (x, y) が多角形の中にあるかどうか（GUI の point_in_polygon と同じ判定をまとめて行う）
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    inside = np.zeros(np.broadcast(x, y).shape, dtype=bool)
+    if len(polygon) == 0:
+        return inside
+    vertices = np.asarray(polygon, dtype=np.float64)
+    for (p1x, p1y), (p2x, p2y) in zip(vertices, np.roll(vertices, -1, axis=0)):
+        if p1y == p2y:
+            # 水平な辺とは交わらない
+            continue
+        crossing = (y > min(p1y, p2y)) & (y <= max(p1y, p2y)) & (x <= max(p1x, p2x))
+        if p1x != p2x:
+            crossing &= x <= (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
+        inside ^= crossing
+    return inside
+
+
+def load_grid(db_path, grid_size=GRID_SIZE, canvas_size=CANVAS_SIZE):
+    """
+    図面のデータベースを、セルの種類の番号の配列 (行, 列)（uint8）にして返す
+    外形の中のセル（中心が外形の中）は EMPTY、塗ったセルはその色の種類、それ以外は OUTSIDE
+    """
+    cells, polygon = read_db(db_path)
+    count = canvas_size // grid_size
+    centers = np.arange(count) * grid_size + grid_size // 2
+    center_x, center_y = np.meshgrid(centers, centers)
+    codes = np.where(points_in_polygon(center_x, center_y, polygon), EMPTY, OUTSIDE).astype(np.uint8)
+    for x, y, color in cells:
+        if color not in COLOR_CODES:
+            raise ValueError(f"不明なセルの色です: {color}（{db_path} の ({x}, {y})）")
+        row, col = y // grid_size, x // grid_size
+        if 0 <= row < count and 0 <= col < count:
+            codes[row, col] = COLOR_CODES[color]
+    return codes
+
+
+def to_raster(codes, cell_pixels=CELL_PIXELS):
+    """
+    セルの配列を1セル cell_pixels ピクセル四方に拡大した配列にする
+    """
+    return np.repeat(np.repeat(codes, cell_pixels, axis=0), cell_pixels, axis=1)
+
+
+def render(codes, cell_pixels=CELL_PIXELS):
+    """
+    セルの配列を種類ごとの色で塗った BGR の画像にする（描画の下地に使う）
+    """
+    return CATEGORY_COLORS_BGR[to_raster(codes, cell_pixels)]
+
+
+def grid_boundary(codes, category=ROAD, cell_pixels=CELL_PIXELS, thickness=THICKNESS, ordered=True):
+    """
+    種類 category のセルの領域の境界線を、画像にしたときのピクセル座標で返す
+    （boundary.extract_boundary と同じ (輪郭のリスト, 境界線のピクセル座標, 輪郭の番号)）
+    """
+    return boundary_from_mask(to_raster(np.asarray(codes) == category, cell_pixels), thickness, ordered)
+
+
+def is_grid_path(path):
+    """
+    図面のデータベース（.db）のパスなら True（それ以外はフロアの画像として扱う）
+    """
+    return str(path).lower().endswith(".db")
+
+
+def load_plan_boundary(path, target_color_bgr=TARGET_COLOR_BGR, threshold=THRESHOLD, cell_pixels=CELL_PIXELS):
+    """
+    フロアの境界線を (輪郭のリスト, 境界線のピクセル座標, 輪郭の番号) で返す
+    path が図面のデータベースなら道のセルの境界線、画像なら boundary.load_boundary（指定色の境界線）
+    """
+    if is_grid_path(path):
+        return grid_boundary(load_grid(path), ROAD, cell_pixels)
+    return load_boundary(path, target_color_bgr, threshold)
+
+
+def load_plan_image(path, cell_pixels=CELL_PIXELS):
+    """
+    描画の下地にする BGR の画像（図面のデータベースならセルの種類ごとに塗った画像）
+    """
+    if is_grid_path(path):
+        return render(load_grid(path), cell_pixels)
+    import cv2
+
+    image = cv2.imread(path)
+    if image is None:
+        raise ValueError(f"画像を読み込めません: {path}")
+    return image
+
+
+def load_shop_area(path, color_bgr=SHOP_AREA_COLOR_BGR, threshold=SHOP_AREA_THRESHOLD, cell_pixels=CELL_PIXELS):
+    """
+    店舗を置く領域のマスク (高さ, 幅)（True が店舗エリア、load_plan_image の画像と同じ大きさ）
+    path が図面のデータベースなら店舗エリアのセル、画像なら指定色（店舗エリアの黄）のピクセル
+    """
+    if is_grid_path(path):
+        mask = to_raster(load_grid(path) == SHOP_AREA, cell_pixels)
+    else:
+        import cv2
+
+        image = load_plan_image(path)
+        color = np.asarray(color_bgr, dtype=np.int64)
+        mask = cv2.inRange(image, np.clip(color - threshold, 0, 255).astype(np.uint8),
+                           np.clip(color + threshold, 0, 255).astype(np.uint8)) > 0
+    if not mask.any():
+        raise ValueError(f"店舗エリアが見つかりません: {path}")
+    return mask
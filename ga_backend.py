@@ -0,0 +1,172 @@
+import functools
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+
+# 実行方法の種類
+BACKENDS = ("serial", "thread", "process")
+
+# 自動で決めるチャンクの目安（1タスクあたりの評価時間[秒]）
+TARGET_TASK_SECONDS = 0.05
+# チャンクサイズを決めるために最初に直列で評価する個体数
+PROBE_SIZE = 8
+
+# 共有メモリに置いた読み取り専用の配列（名前 -> 配列）
+_shared_arrays = {}
+# 共有メモリのハンドル（配列の参照先が解放されないように保持する）
+_shared_blocks = {}
+
+
+def _unwrap(func):
+    # toolbox.register は関数を functools.partial で包むので中身を取り出す
+    if isinstance(func, functools.partial) and not func.args:
+        return func.func, func.keywords
+    return func, {}
+
+
+def batch_map(func, iterable):
+    """
+    toolbox.map の代わりに登録する map
+    評価関数に batch 属性（集団をまとめて評価する関数）があれば、個体をすべて一度に渡す
+    batch 属性がなければ通常の map と同じ
+    """
+    target, keywords = _unwrap(func)
+    batch = getattr(target, "batch", None)
+    if batch is None:
+        return map(func, iterable)
+    return batch(list(iterable), **keywords)
+
+
+def get_shared(name):
+    """
+    共有メモリに置いた読み取り専用の配列を取得する（親プロセスでもワーカーでも同じように使える）
+    """
+    return _shared_arrays[name]
+
+
+def _attach_shared(specs):
+    # ワーカープロセスの初期化：親が作った共有メモリを配列として参照する
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name, track=False)
+        array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        array.flags.writeable = False
+        _shared_blocks[name] = block
+        _shared_arrays[name] = array
+
+
+def _eval_chunk(func, chunk):
+    # ワーカーで1チャンク分を評価する
+    return list(batch_map(func, chunk))
+
+
+class EvaluationBackend:
+    """
+    評価の実行方法を切り替えるクラス
+    kind: "serial"（直列）, "thread"（スレッドプール）, "process"（プロセスプール）
+    shared: ワーカーに渡す読み取り専用の配列 {名前: 配列}（共有メモリに一度だけ置く）
+    chunksize: 1タスクあたりの個体数（None なら評価時間を測って自動で決める）
+    toolbox.register("map", backend.map) で登録する
+    どの実行方法でも個体の順番どおりに評価値を返すので、同じシードなら結果は直列と同じになる
+    評価関数に stateful 属性（個体に途中結果を書き込む）があれば、"process" でも親プロセスで評価する
+    （ワーカーで書き込んだ途中結果は親の個体に戻らず、個体を渡すたびに途中結果も送ることになるため）
+    """
+
+    def __init__(self, kind="serial", workers=None, chunksize=None, shared=None):
+        if kind not in BACKENDS:
+            raise ValueError(f"kind は {BACKENDS} のいずれかを指定してください: {kind}")
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self._costs = {}  # 評価関数ごとの1個体あたりの評価時間
+        self._blocks = []
+        self._names = []
+        specs = self._share(shared or {})
+
+        if kind == "thread":
+            self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        elif kind == "process":
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_attach_shared,
+                                                initargs=(specs,))
+        else:
+            self.executor = None
+
+    def _share(self, arrays):
+        # 配列を共有メモリにコピーし、親プロセスからも get_shared で参照できるようにする
+        specs = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+            shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+            shared[...] = array
+            shared.flags.writeable = False
+            self._blocks.append(block)
+            self._names.append(name)
+            _shared_arrays[name] = shared
+            specs[name] = (block.name, array.shape, array.dtype.str)
+        return specs
+
+    def _auto_chunksize(self, func, n_items):
+        # 1タスクが TARGET_TASK_SECONDS 程度になるように、ただし全ワーカーに仕事が行き渡るように決める
+        cost = self._costs.get(func)
+        per_worker = math.ceil(n_items / self.workers)
+        if not cost:
+            return per_worker
+        return max(1, min(per_worker, int(TARGET_TASK_SECONDS / cost)))
+
+    @staticmethod
+    def _stateful(func):
+        return getattr(_unwrap(func)[0], "stateful", False)
+
+    def map(self, func, iterable):
+        items = list(iterable)
+        if self.executor is None or len(items) <= 1 or (self.kind == "process" and self._stateful(func)):
+            return list(batch_map(func, items))
+
+        results = []
+        if self.chunksize is None and func not in self._costs:
+            # 最初の数個体を直列で評価して1個体あたりの時間を測る
+            probe = items[:PROBE_SIZE]
+            start = time.perf_counter()
+            results = list(batch_map(func, probe))
+            self._costs[func] = (time.perf_counter() - start) / len(probe)
+            items = items[len(probe):]
+
+        chunksize = self.chunksize or self._auto_chunksize(func, len(items))
+        chunks = [items[i:i + chunksize] for i in range(0, len(items), chunksize)]
+        for chunk_results in self.executor.map(_eval_chunk, [func] * len(chunks), chunks):
+            results.extend(chunk_results)
+        return results
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        for name in self._names:
+            _shared_arrays.pop(name, None)
+        for block in self._blocks:
+            try:
+                block.close()
+            except BufferError:
+                pass  # 配列がまだ参照されている場合は解放をガベージコレクションに任せる
+            block.unlink()
+        self._blocks = []
+        self._names = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def make_backend(kind=None, workers=None, chunksize=None, shared=None):
+    """
+    環境変数 GA_BACKEND（serial / thread / process）と GA_WORKERS から実行方法を作る
+    引数で指定した値が優先される
+    """
+    kind = kind or os.environ.get("GA_BACKEND", "serial")
+    workers = workers or int(os.environ.get("GA_WORKERS", 0)) or None
+    return EvaluationBackend(kind, workers=workers, chunksize=chunksize, shared=shared)
@@ -1,6 +1,13 @@
 import random
 from deap import base, creator, tools, algorithms
 import numpy as np
+from fitness_cache import cached_map, sequence_key
+from population import sel_tournament, clone_individual
+from profiler import instrument, end_generation
+from ga_backend import make_backend
+from floor_fitness import FloorTables, eval_floor_population
+from floor_counts import ea_counts, solve_counts, counts_to_floors
+from checkpoint import CHECKPOINT_EVERY, Checkpointer, sequence_codec
 
 # 各フロアのキャパシティ
 floor_capacities = [30, 30, 30]  # 1階, 2階, 3階のキャパシティ
@@ -90,6 +97,18 @@ def evaluate(individual):
 
     return total_score,
 
+# 店舗の種類を整数コードにした評価用の表
+FLOOR_TABLES = FloorTables(shop_types, shop_constraints, preferred_floor, floor_capacities)
+
+def evaluate_population(population):
+    """
+    集団をまとめて評価する関数（evaluate と同じ評価を配列で計算する）
+    """
+    return eval_floor_population(population, FLOOR_TABLES)
+
+# toolbox.map（batch_map や評価の backend）から集団ごとに呼ばれる
+evaluate.batch = evaluate_population
+
 # 遺伝子表現を設定
 creator.create("FitnessMax", base.Fitness, weights=(1.0,))
 creator.create("Individual", list, fitness=creator.FitnessMax)
@@ -101,23 +120,110 @@ toolbox.register("population", tools.initRepeat, list, toolbox.individual)
 toolbox.register("evaluate", evaluate)
 toolbox.register("mate", tools.cxTwoPoint)
 toolbox.register("mutate", tools.mutShuffleIndexes, indpb=0.2)
-toolbox.register("select", tools.selTournament, tournsize=3)
+# トーナメントは評価値の配列上でまとめて行い、複製は deepcopy せずに要素だけコピーする
+toolbox.register("select", sel_tournament, tournsize=3)
+toolbox.register("clone", clone_individual)
+
+# 個体の長さの上限（チェックポイントでは店舗名を番号にし、この長さまで埋めて保存する）
+MAX_SHOPS = sum(max_count for _, max_count in shop_constraints.values())
+
+def configure(capacities=None, types=None, constraints=None, preferred=None):
+    """
+    フロアのキャパシティ、店舗の種類、店舗数の制約、優先フロアを変更する（指定しなかったものはそのまま）
+    評価の表（FLOOR_TABLES）、フロア数、個体の長さの上限も合わせて作り直す（sweep.py などで条件を変えて実行するため）
+    """
+    global floor_capacities, shop_types, shop_constraints, preferred_floor, NUM_FLOORS, FLOOR_TABLES, MAX_SHOPS
+    if capacities is not None:
+        floor_capacities = list(capacities)
+    if types is not None:
+        shop_types = dict(types)
+    if constraints is not None:
+        shop_constraints = {shop: tuple(bounds) for shop, bounds in constraints.items()}
+    if preferred is not None:
+        preferred_floor = dict(preferred)
+    NUM_FLOORS = len(floor_capacities)
+    FLOOR_TABLES = FloorTables(shop_types, shop_constraints, preferred_floor, floor_capacities)
+    MAX_SHOPS = sum(max_count for _, max_count in shop_constraints.values())
+
+def run(pop_size=POP_SIZE, gens=GENS, checkpoint_path=None, checkpoint_every=CHECKPOINT_EVERY,
+        resume=False, termination=None, stats_logger=None):
+    """
+    GAを実行し、最適な個体とフロアごとの店舗の割り当てを返す
+    checkpoint_path を指定すると途中の状態を保存し、resume が True ならその続きから再開する
+    termination（termination.Termination）を渡すと、その条件を満たした世代で止め、それまでで最も良い個体を返す
+    stats_logger（stats_logger.StatsLogger）を渡すと、世代ごとの統計をファイルに書き出す
+    """
+    # 評価の実行方法（環境変数 GA_BACKEND で serial / thread / process を選択）
+    with make_backend() as backend:
+        # 環境変数 GA_FITNESS_CACHE を設定すると、同じ内容の個体の評価を省く
+        toolbox.register("map", cached_map(backend.map, sequence_key))
+        # プロファイラで計測中なら、選択・複製・交叉・突然変異・評価の時間を計測する
+        instrument(toolbox)
+
+        # checkpoint_path を指定すると checkpoint_every 世代ごとに途中の状態（集団と乱数の状態）を保存する
+        checkpoint = None
+        if checkpoint_path is not None:
+            encode, decode = sequence_codec(creator.Individual, list(shop_types), MAX_SHOPS)
+            checkpoint = Checkpointer(checkpoint_path, checkpoint_every, encode, decode)
+
+        start_gen = 0
+        if resume and checkpoint is not None and checkpoint.exists():
+            # 保存した世代の続きから再開する
+            start_gen, population = checkpoint.load()
+        else:
+            population = toolbox.population(n=pop_size)
+        for gen in range(start_gen, gens):
+            offspring = algorithms.varAnd(population, toolbox, cxpb=0.5, mutpb=0.2)
+            fits = toolbox.map(toolbox.evaluate, offspring)
+            for fit, ind in zip(fits, offspring):
+                ind.fitness.values = fit
+            population = toolbox.select(offspring, k=len(population))
+            end_generation(gen + 1)
+            if stats_logger is not None:
+                stats_logger.record(gen + 1, len(offspring), population)
+            stopped = termination is not None and termination.update(gen + 1, len(offspring), population) is not None
+            if checkpoint is not None:
+                checkpoint.save(gen + 1, population, force=gen + 1 == gens or stopped)
+            if stopped:
+                break
+
+    # 最適な配置の取得
+    best_individual = tools.selBest(population, k=1)[0] if termination is None else termination.best
+    floor_assignments = [best_individual[i::NUM_FLOORS] for i in range(NUM_FLOORS)]
+    return best_individual, floor_assignments
+
+
+def run_counts(pop_size=POP_SIZE, gens=GENS, termination=None, stats_logger=None):
+    """
+    店舗数の行列（フロアごと・種類ごとの店舗数）を遺伝子にしたGAを実行する（floor_counts.ea_counts）
+    同じフロアの中の並べ替えを区別しないので、並びの個体より探索空間が小さい
+    (評価値, フロアごとの店舗の割り当て) を返す
+    """
+    rng = np.random.default_rng(random.getrandbits(64))
+    population, _ = ea_counts(FLOOR_TABLES, pop_size, gens, rng, termination=termination,
+                              stats_logger=stats_logger)
+    if termination is not None:
+        population = termination.best
+    best = population.best()
+    return int(population.fitness[best]), counts_to_floors(population["counts"][best], FLOOR_TABLES)
+
+
+def solve():
+    """
+    店舗数の行列で表したフロア割り当ての最適解を求める（floor_counts.solve_counts）
+    並びの個体は各フロアの店舗数がほぼ同じになるので、この評価値は GA の評価値の上限になる
+    (評価値, フロアごとの店舗の割り当て) を返す
+    """
+    counts, score = solve_counts(FLOOR_TABLES)
+    return score, counts_to_floors(counts, FLOOR_TABLES)
+
 
 # GAの実行
-population = toolbox.population(n=POP_SIZE)
-for gen in range(GENS):
-    offspring = algorithms.varAnd(population, toolbox, cxpb=0.5, mutpb=0.2)
-    fits = map(toolbox.evaluate, offspring)
-    for fit, ind in zip(fits, offspring):
-        ind.fitness.values = fit
-    population = toolbox.select(offspring, k=len(population))
-
-# 最適な配置の取得
-best_individual = tools.selBest(population, k=1)[0]
-print(f"Generation {gen}, Best fitness: {best_individual.fitness.values[0]}")
-print(f"Best individual: {best_individual}")
-
-# 結果を表示
-floor_assignments = [best_individual[i::NUM_FLOORS] for i in range(NUM_FLOORS)]
-for floor, shops in enumerate(floor_assignments):
-    print(f"Floor {floor + 1}: {shops}")
+if __name__ == "__main__":
+    best_individual, floor_assignments = run()
+    print(f"Generation {GENS - 1}, Best fitness: {best_individual.fitness.values[0]}")
+    print(f"Best individual: {best_individual}")
+
+    # 結果を表示
+    for floor, shops in enumerate(floor_assignments):
+        print(f"Floor {floor + 1}: {shops}")
@@ -0,0 +1,2 @@
+# コマンドラインから各段階（レイアウト、フロア割り当て、入口、フロア分割）を実行するためのパッケージ
+# 使い方: python -m ga_generativeshop run layout|floors|entrances|partition
@@ -0,0 +1,4 @@
+from ga_generativeshop.cli import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import argparse
+import json
+import os
+import sys
+
+# 重いライブラリ（deap, cv2, sklearn, matplotlib など）は、実行する段階のモジュールを読み込むときに初めて読み込む
+# ここでは標準ライブラリだけを使う
+
+# リポジトリ直下のスクリプト（ga_main.py など）を読み込めるようにする
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+STAGES = ("layout", "floors", "entrances", "partition")
+
+
+def _seed(seed):
+    # 乱数のシードを設定する（指定がなければ何もしない）
+    if seed is None:
+        return
+    import random
+    import numpy as np
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def _write_json(path, data):
+    with open(path, 'w') as json_file:
+        json.dump(data, json_file, ensure_ascii=False, indent=4)
+
+
+def _checkpoint_options(args):
+    # チェックポイントの指定（layout / floors / partition）
+    if args.checkpoint is None:
+        return {}
+    options = {"checkpoint_path": args.checkpoint, "resume": args.resume}
+    if args.checkpoint_every is not None:
+        options["checkpoint_every"] = args.checkpoint_every
+    return options
+
+
+def _termination(args):
+    # 途中で止める条件（どれかを指定したときだけ）
+    if all(value is None for value in (args.stall, args.max_seconds, args.max_evals, args.target)):
+        return None
+    from termination import Termination
+    return Termination(stall_gens=args.stall, epsilon=args.epsilon, max_seconds=args.max_seconds,
+                       max_evals=args.max_evals, target=args.target)
+
+
+def _stats_logger(args):
+    # 世代ごとの統計の書き出し先（指定したときだけ）
+    if args.stats is None:
+        return None
+    from stats_logger import StatsLogger
+    return StatsLogger(args.stats)
+
+
+def run_layout(args):
+    # ショップの配置（ga_main）
+    import ga_main
+
+    best_ind = ga_main.run(pop_size=args.pop or 300, ngen=args.gens or 60,
+                           json_path=os.path.join(args.out, "best_individual.json"), verbose=args.verbose,
+                           islands=args.islands, migration_interval=args.migration_interval,
+                           migrants=args.migrants, topology=args.topology, termination=_termination(args),
+                           stats_logger=args.stats_logger, **_checkpoint_options(args))
+    outputs = [os.path.join(args.out, "best_individual.json")]
+    if not args.no_image:
+        ga_main.plot_layout(best_ind, path=os.path.join(args.out, "layout.png"))
+        outputs.append(os.path.join(args.out, "layout.png"))
+    return outputs
+
+
+def run_floors(args):
+    # フロアへの店舗の割り当て（ga_floor）
+    import ga_floor
+
+    if args.floor_mode == "sequence":
+        best_individual, floor_assignments = ga_floor.run(pop_size=args.pop or ga_floor.POP_SIZE,
+                                                          gens=args.gens or ga_floor.GENS,
+                                                          termination=_termination(args),
+                                                          stats_logger=args.stats_logger,
+                                                          **_checkpoint_options(args))
+        fitness = best_individual.fitness.values[0]
+    elif args.floor_mode == "counts":
+        fitness, floor_assignments = ga_floor.run_counts(pop_size=args.pop or ga_floor.POP_SIZE,
+                                                         gens=args.gens or ga_floor.GENS,
+                                                         termination=_termination(args),
+                                                         stats_logger=args.stats_logger)
+    else:
+        fitness, floor_assignments = ga_floor.solve()
+    path = os.path.join(args.out, "floors.json")
+    _write_json(path, {
+        "fitness": fitness,
+        "floors": [{"floor": floor + 1, "shops": shops} for floor, shops in enumerate(floor_assignments)]
+    })
+    return [path]
+
+
+def run_entrances(args):
+    # 入口の位置（ga_shop）
+    import ga_shop
+
+    image_path = None if args.no_image else os.path.join(args.out, "entrances.png")
+    best_entries = ga_shop.run(image_path=args.image or ga_shop.image_path, pop_size=args.pop or ga_shop.POP_SIZE,
+                               gens=args.gens or ga_shop.GENS, out_path=image_path, show=False,
+                               termination=_termination(args), stats_logger=args.stats_logger)
+    path = os.path.join(args.out, "entrances.json")
+    _write_json(path, {"entrances": [[int(value) for value in entry[:2]] for entry in best_entries]})
+    return [path] + ([image_path] if image_path else [])
+
+
+def run_partition(args):
+    # フロア割り当てと各フロアの分割（ga_and_clustering）
+    import ga_and_clustering
+
+    best_individual, floor_assignments = ga_and_clustering.run_floor_ga(
+        pop_size=args.pop or ga_and_clustering.POP_SIZE, gens=args.gens or ga_and_clustering.GENS,
+        termination=_termination(args), stats_logger=args.stats_logger,
+        **_checkpoint_options(args))
+    path = os.path.join(args.out, "floors.json")
+    _write_json(path, {
+        "fitness": best_individual.fitness.values[0],
+        "floors": [{"floor": floor + 1, "shops": shops} for floor, shops in enumerate(floor_assignments)]
+    })
+    outputs = [path]
+    if not args.no_image:
+        outputs += ga_and_clustering.draw_floor_partitions(
+            floor_assignments, image_path=args.image or ga_and_clustering.image_path, out_dir=args.out, show=False)
+    return outputs
+
+
+RUNNERS = {
+    "layout": run_layout,
+    "floors": run_floors,
+    "entrances": run_entrances,
+    "partition": run_partition,
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m ga_generativeshop",
+                                     description="ショッピングモールのレイアウト生成（画面表示なしで実行し、結果をファイルに保存）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="段階を1つ実行する")
+    run_parser.add_argument("stage", choices=STAGES, help="実行する段階")
+    run_parser.add_argument("--out", default=".", help="結果を保存するディレクトリ")
+    run_parser.add_argument("--seed", type=int, default=None, help="乱数のシード")
+    run_parser.add_argument("--pop", type=int, default=None, help="個体数（省略時は各スクリプトの既定値）")
+    run_parser.add_argument("--gens", type=int, default=None, help="世代数（省略時は各スクリプトの既定値）")
+    run_parser.add_argument("--image", default=None, help="フロア画像か図面のデータベース（dbfiles/*.db）のパス（entrances / partition）")
+    run_parser.add_argument("--no-image", action="store_true", help="結果の画像を保存しない")
+    run_parser.add_argument("--floor-mode", choices=("sequence", "counts", "exact"), default="sequence",
+                            help="floors の解き方（sequence: 店舗名の並びのGA、counts: 店舗数の行列のGA、exact: 最適解）")
+    run_parser.add_argument("--checkpoint", default=None,
+                            help="途中の状態を保存するファイル（.npz、layout / floors / partition）")
+    run_parser.add_argument("--checkpoint-every", type=int, default=None, help="何世代ごとに保存するか")
+    run_parser.add_argument("--resume", action="store_true", help="--checkpoint のファイルから再開する")
+    run_parser.add_argument("--stall", type=int, default=None,
+                            help="この世代数の間、最も良い評価値が --epsilon より良くならなければ止める")
+    run_parser.add_argument("--epsilon", type=float, default=0.0, help="改善とみなす評価値の差")
+    run_parser.add_argument("--max-seconds", type=float, default=None, help="経過時間（秒）の上限")
+    run_parser.add_argument("--max-evals", type=int, default=None, help="評価回数の上限")
+    run_parser.add_argument("--target", type=float, default=None, help="この評価値に達したら止める")
+    run_parser.add_argument("--islands", type=int, default=1,
+                            help="島モデルの島の数（layout、2以上で島ごとに別のプロセスで進化させる）")
+    run_parser.add_argument("--migration-interval", type=int, default=5, help="何世代ごとに移住させるか")
+    run_parser.add_argument("--migrants", type=int, default=5, help="1回の移住で送る個体数")
+    run_parser.add_argument("--topology", choices=("ring", "random"), default="ring", help="移住の形")
+    run_parser.add_argument("--stats", default=None,
+                            help="世代ごとの統計を書き出すファイル（.jsonl なら JSON Lines、.csv なら CSV）")
+    run_parser.add_argument("--profile", default=None,
+                            help="世代ごとの時間と呼び出し回数を書き出す JSON Lines ファイル")
+    run_parser.add_argument("--trace", default=None, help="Chrome のトレース（JSON）を書き出すファイル")
+    run_parser.add_argument("--verbose", action="store_true", help="進捗をコンソールに出力する")
+
+    sweep_parser = subparsers.add_parser("sweep", help="条件を変えて何度も実行し、結果を追記する（sweep.py）")
+    sweep_parser.add_argument("spec", help="シナリオの定義ファイル（JSON）")
+    sweep_parser.add_argument("--out", default="sweep_results", help="結果を追記するディレクトリ")
+    sweep_parser.add_argument("--workers", type=int, default=None, help="プロセスの数（省略時はCPUの数）")
+    sweep_parser.add_argument("--seed", type=int, default=0, help="シナリオごとのシードを決める元のシード")
+    return parser
+
+
+def sweep(args):
+    # シナリオの一括実行（終わったシナリオは飛ばす）
+    from sweep import load_spec, run_sweep
+
+    run_sweep(load_spec(args.spec), args.out, workers=args.workers, base_seed=args.seed)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "sweep":
+        sweep(args)
+        return
+    # 画面がなくても描画できるようにする
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    os.makedirs(args.out, exist_ok=True)
+    _seed(args.seed)
+    args.stats_logger = _stats_logger(args)
+    if args.profile is None and args.trace is None:
+        outputs = RUNNERS[args.stage](args)
+    else:
+        # 評価関数の項ごと、GAの段階ごとの時間を計測する
+        from profiler import Profiler
+        with Profiler(jsonl_path=args.profile, trace_path=args.trace):
+            outputs = RUNNERS[args.stage](args)
+        outputs += [path for path in (args.profile, args.trace) if path is not None]
+    if args.stats_logger is not None:
+        args.stats_logger.close()
+        outputs.append(args.stats)
+    for path in outputs:
+        print(path)
@@ -1,15 +1,31 @@
+import functools
+import os
 import random
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.font_manager as fm
-from deap import base, creator, tools, algorithms
-from scipy.spatial import distance_matrix
+from deap import base, creator, tools
 import json
-
-jp_font = fm.FontProperties(fname='/Users/cdl/Downloads/Noto_Sans_JP/NotoSansJP-VariableFont_wght.ttf')  # フォントパス
-
-# 店舗の種類を設定
-store_types = ["飲食店", "洋服店", "本屋", "電化製品店", "おもちゃ屋", "映画館", "ゲームセンター"]
+from layout_fitness import store_types, shop_arrays, eval_shop_population, eval_shop_incremental, eval_shop_spatial
+from fitness_cache import cached_map, layout_key
+from ga_backend import batch_map, make_backend
+from layout_array import LayoutArray, random_layout, eval_layout, cx_layout, mut_layout
+from layout_variation import random_layouts, ea_simple_batch
+from population import ArrayPopulation, sel_tournament, clone_individual
+from checkpoint import CHECKPOINT_EVERY, Checkpointer, ea_simple
+from island import MIGRATION_INTERVAL, MIGRANTS, TOPOLOGY, run_islands
+from profiler import section, instrument
+
+# 店舗の数
+NUM_SHOPS = 10
+# この店舗数以上なら差分評価（変更された店舗の行と列だけ再計算）を使う
+INCREMENTAL_MIN_SHOPS = 100
+# この店舗数以上なら空間インデックスで近くの店舗の組だけを調べる（benchmarks/bench_spatial_index.py 参照）
+SPATIAL_INDEX_MIN_SHOPS = 1000
+SPATIAL_INDEX = "kdtree"  # brute / sweep / grid / kdtree
+# True にすると集団を配列のまま進化させる（交叉・突然変異・選択を集団全体でまとめて行う）
+BATCH_LOOP = False
+
+# 日本語フォントのパス（環境変数 JP_FONT_PATH で変更できる）
+JP_FONT_PATH = os.environ.get("JP_FONT_PATH", '/Users/cdl/Downloads/Noto_Sans_JP/NotoSansJP-VariableFont_wght.ttf')
 
 # 個体遺伝子の作成
 def create_shop():
@@ -40,6 +56,7 @@ def eval_circulation(shop):
     coords = np.array([(store[0], store[1]) for store in shop])
 
     # 店舗間の距離行列を計算
+    from scipy.spatial import distance_matrix
     dist_matrix = distance_matrix(coords, coords)
 
     # 隣接行列を作成（しきい値以下の距離の店舗はつながっているとみなす）
@@ -144,21 +161,27 @@ def eval_shop(shop):
     total_distance = 0
     total_area = 0
     overlap_penalty = 0
-    for i in range((len(shop))):
-        shop1 = shop[i]
-        total_area += shop1[2] * shop1[3]
-        for j in range(i+1, len(shop)):
-            shop2 = shop[j]
-            distance = np.sqrt((shop1[0] - shop2[0])**2 + (shop1[1] - shop2[1])**2)
-            total_distance += distance
-            if shop1[0] < shop2[0] + shop2[2] and shop1[0] + shop1[2] > shop2[0] and shop1[1] < shop2[1] + shop2[3] and shop1[1] + shop1[3] > shop2[1]:
-                overlap_penalty += 100
-
-    deadend_penalty = eval_circulation(shop)
-    category_bonus = eval_category(shop)
+    with section("fitness.pairs"):
+        for i in range((len(shop))):
+            shop1 = shop[i]
+            total_area += shop1[2] * shop1[3]
+            for j in range(i+1, len(shop)):
+                shop2 = shop[j]
+                distance = np.sqrt((shop1[0] - shop2[0])**2 + (shop1[1] - shop2[1])**2)
+                total_distance += distance
+                if shop1[0] < shop2[0] + shop2[2] and shop1[0] + shop1[2] > shop2[0] and shop1[1] < shop2[1] + shop2[3] and shop1[1] + shop1[3] > shop2[1]:
+                    overlap_penalty += 100
+
+    with section("fitness.circulation"):
+        deadend_penalty = eval_circulation(shop)
+    with section("fitness.category"):
+        category_bonus = eval_category(shop)
     return total_distance + total_area + category_bonus - overlap_penalty*2 - deadend_penalty,
     # return total_distance - overlap_penalty,
 
+# 集団をまとめて評価する関数（toolbox.map に batch_map を登録すると eaSimple から一括で呼ばれる）
+eval_shop.batch = eval_shop_population
+
 # 交叉関数の作成
 def cx_shop(shop1, shop2):
     """
@@ -200,35 +223,79 @@ creator.create("Individual", list, fitness=creator.FitnessMax)
 # ベースクラスのセットアップ
 toolbox = base.Toolbox()
 
-# 個体を生成（属性がn個のリスト）
-toolbox.register("individual", tools.initRepeat, creator.Individual, create_shop, n=10)
+# 評価は未評価の個体をまとめて一括で行う
+toolbox.register("map", batch_map)
 
-# 集団を生成（個体を複数集めたもの）
-toolbox.register("population", tools.initRepeat, list, toolbox.individual)
-
-# 交叉、突然変異、選択関数の登録
-toolbox.register("evaluate", eval_shop)
+# 交叉、突然変異、選択関数の登録（個体の生成と評価関数は set_num_shops で店舗数に合わせて登録する）
 toolbox.register("mate", cx_shop)
 toolbox.register("mutate", mut_shop, mu=0, sigma=1, indpb=0.2)
 
 # 選択関数の定義　（tournsize: 何個体で勝負するか）
-toolbox.register("select", tools.selTournament, tournsize=3)
+# トーナメントは評価値の配列上でまとめて行い、複製は deepcopy せずに要素だけコピーする
+toolbox.register("select", sel_tournament, tournsize=3)
+toolbox.register("clone", clone_individual)
 
-# 遺伝的アルゴリズムの実行
-if __name__ == "__main__":
-    # 初期集団の生成
-    population = toolbox.population(n=300)
+# 配列で表現した個体を使う場合のセットアップ（大規模な集団向け）
+# 座標は float32、店舗の種類は整数コードで持つ
+creator.create("LayoutIndividual", LayoutArray, fitness=creator.FitnessMax)
 
-    # 進化の実行(交叉確率0.5, 突然変異確率0.2, 進化計算の世代数40, verboseは進捗状況をコンソールに出力するか)
-    algorithms.eaSimple(population, toolbox, cxpb=0.5, mutpb=0.2, ngen=60, verbose=True)
+array_toolbox = base.Toolbox()
+array_toolbox.register("map", batch_map)
+array_toolbox.register("mate", cx_layout)
+array_toolbox.register("mutate", mut_layout, mu=0, sigma=1, indpb=0.2)
+array_toolbox.register("select", sel_tournament, tournsize=3)
 
-    # 最も優れている個体を選択
-    best_ind = tools.selBest(population, 1)[0]
-    print('Best individual is ', best_ind)
+def set_num_shops(n):
+    """
+    店舗の数を n にし、個体（属性がn個のリスト）の生成と評価関数を登録し直す
+    sweep.py などで店舗数を変えて実行するときに使う
+    """
+    global NUM_SHOPS
+    NUM_SHOPS = n
+    for box, individual, evaluate in ((toolbox, functools.partial(tools.initRepeat, creator.Individual, create_shop),
+                                       eval_shop),
+                                      (array_toolbox, functools.partial(random_layout, creator.LayoutIndividual),
+                                       eval_layout)):
+        box.register("individual", individual, n=n)
+        # 集団を生成（個体を複数集めたもの）
+        box.register("population", tools.initRepeat, list, box.individual)
+        if n >= SPATIAL_INDEX_MIN_SHOPS:
+            # 店舗数が非常に多いときは、距離行列を持たずに近くの店舗の組だけを調べる
+            box.register("evaluate", eval_shop_spatial, index=SPATIAL_INDEX)
+        elif n >= INCREMENTAL_MIN_SHOPS:
+            # 店舗数が多いときは、個体に途中結果をキャッシュして差分だけ評価する
+            box.register("evaluate", eval_shop_incremental)
+        else:
+            box.register("evaluate", evaluate)
+
+
+set_num_shops(NUM_SHOPS)
+
+
+def encode_shop(shop):
+    """
+    個体をチェックポイント用の配列 {"coords": (n, 4), "codes": (n,), "is_int": (n, 4)} にする
+    is_int は整数のままの値（初期値や範囲の制限で整数になった値）を区別して、再開後も同じ型に戻すため
+    """
+    coords, codes = shop_arrays(shop)
+    is_int = np.array([[isinstance(value, int) for value in store[:4]] for store in shop], dtype=bool).reshape(-1, 4)
+    return {"coords": coords, "codes": codes, "is_int": is_int}
 
-    # 最も優れている個体の評価値を表示
-    print('Best individual evaluation is ', eval_shop(best_ind))
 
+def decode_shop(genes):
+    """
+    チェックポイントの配列から個体（リスト表現）に戻す
+    """
+    return creator.Individual([int(value) if is_int else value for value, is_int in zip(coord, flags)]
+                              + [store_types[code]]
+                              for coord, flags, code in zip(genes["coords"].tolist(), genes["is_int"].tolist(),
+                                                            genes["codes"].tolist()))
+
+
+def save_best_individual(best_ind, path='best_individual.json'):
+    """
+    最も優れている個体をJSONファイルに保存
+    """
     # 個体データをわかりやすく整形
     best_individual_data = {
         "shops": [
@@ -244,12 +311,24 @@ if __name__ == "__main__":
     }
 
     # JSONファイルに保存
-    with open('best_individual.json', 'w') as json_file:
+    with open(path, 'w') as json_file:
         json.dump(best_individual_data, json_file, ensure_ascii=False, indent=4)
 
-    print("Best individual data has been saved to best_individual.json")
 
-    # 最も優れている個体のショップの配置を表示
+def plot_layout(best_ind, path=None):
+    """
+    ショップの配置を描画
+    path を指定すると画像ファイルに保存し、指定しなければ画面に表示する
+    """
+    # matplotlib は描画するときだけ読み込む（import を軽くするため）
+    import matplotlib
+    if path is not None:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import matplotlib.font_manager as fm
+
+    jp_font = fm.FontProperties(fname=JP_FONT_PATH) if os.path.exists(JP_FONT_PATH) else None  # フォントパス
+
     fig, ax = plt.subplots()
     for i in range(len(best_ind)):
         shop = best_ind[i]
@@ -257,11 +336,93 @@ if __name__ == "__main__":
         # 店舗の中心位置を計算 (x + width / 2, y + height / 2)
         center_x = shop[0] + shop[2] / 2
         center_y = shop[1] + shop[3] / 2
-        
+
         # 店舗の種類をラベルとして表示
         ax.text(center_x, center_y, shop[4], ha='center', va='center', fontsize=8, color='blue', fontproperties=jp_font)
 
     plt.xlim(0, 50)
     plt.ylim(0, 50)
     plt.gca().set_aspect('equal', adjustable='box')
-    plt.show()
\ No newline at end of file
+    if path is None:
+        plt.show()
+    else:
+        fig.savefig(path)
+        plt.close(fig)
+
+
+def run(pop_size=300, ngen=60, json_path='best_individual.json', verbose=True,
+        checkpoint_path=None, checkpoint_every=CHECKPOINT_EVERY, resume=False,
+        islands=1, migration_interval=MIGRATION_INTERVAL, migrants=MIGRANTS, topology=TOPOLOGY, termination=None,
+        stats_logger=None):
+    """
+    遺伝的アルゴリズムを実行し、最も優れている個体を返す
+    json_path を指定すると最も優れている個体をJSONファイルに保存する
+    checkpoint_path を指定すると checkpoint_every 世代ごとに途中の状態を保存し、
+    resume が True ならそのチェックポイントの続きから再開する
+    islands が2以上なら、集団を islands 個の島に分けて別々のプロセスで進化させる（島モデル）
+    termination（termination.Termination）を渡すと、その条件を満たした世代で止め、それまでで最も良い個体を返す
+    stats_logger（stats_logger.StatsLogger）を渡すと、世代ごとの統計をファイルに書き出す
+    """
+    if islands > 1:
+        if checkpoint_path is not None or termination is not None or stats_logger is not None:
+            raise ValueError("島モデルではチェックポイント、途中終了の条件、統計の書き出しを使えません")
+        # 各島の個体数は pop_size を島の数で割ったもの（全体の個体数は同じ）
+        halloffame, logbook = run_islands(islands, pop_size // islands, ngen, cxpb=0.5, mutpb=0.2,
+                                          migration_interval=migration_interval, migrants=migrants,
+                                          topology=topology, verbose=verbose)
+        best_ind = halloffame[0]
+    elif BATCH_LOOP:
+        # 初期集団を配列で生成し、配列のまま進化させる
+        # random.seed で再現できるように random モジュールから作る
+        rng = np.random.default_rng(random.getrandbits(64))
+        checkpoint = None
+        if checkpoint_path is not None:
+            checkpoint = Checkpointer(checkpoint_path, checkpoint_every, rng=rng)
+        coords, codes = random_layouts(rng, pop_size, NUM_SHOPS)
+        population = ArrayPopulation({"coords": coords, "codes": codes})
+        population, logbook = ea_simple_batch(population, ngen=ngen, cxpb=0.5, mutpb=0.2, rng=rng, verbose=verbose,
+                                              checkpoint=checkpoint, resume=resume, termination=termination,
+                                              stats_logger=stats_logger)
+        if termination is not None:
+            # 途中で止めたときも、それまでで最も良い個体を返す
+            population = termination.best
+        best = population.best()
+        best_ind = LayoutArray(population["coords"][best], population["codes"][best]).to_shops()
+    else:
+        # 初期集団の生成
+        population = toolbox.population(n=pop_size)
+        checkpoint = None
+        if checkpoint_path is not None:
+            checkpoint = Checkpointer(checkpoint_path, checkpoint_every, encode_shop, decode_shop)
+
+        # 評価の実行方法（環境変数 GA_BACKEND で serial / thread / process を選択）
+        with make_backend() as backend:
+            # 環境変数 GA_FITNESS_CACHE を設定すると、同じ内容の個体の評価を省く
+            toolbox.register("map", cached_map(backend.map, layout_key))
+            # プロファイラで計測中なら、選択・複製・交叉・突然変異・評価の時間を計測する
+            instrument(toolbox)
+
+            # 進化の実行(交叉確率0.5, 突然変異確率0.2, 進化計算の世代数40, verboseは進捗状況をコンソールに出力するか)
+            # algorithms.eaSimple と同じ世代ループ（チェックポイントを指定すると途中の状態を保存する）
+            ea_simple(population, toolbox, cxpb=0.5, mutpb=0.2, ngen=ngen, verbose=verbose,
+                      checkpoint=checkpoint, resume=resume, termination=termination, stats_logger=stats_logger)
+
+        # 最も優れている個体を選択（途中終了の条件を渡したときは、これまでで最も良い個体）
+        best_ind = tools.selBest(population, 1)[0] if termination is None else termination.best
+
+    if json_path is not None:
+        save_best_individual(best_ind, json_path)
+    return best_ind
+
+
+# 遺伝的アルゴリズムの実行
+if __name__ == "__main__":
+    best_ind = run()
+    print('Best individual is ', best_ind)
+
+    # 最も優れている個体の評価値を表示
+    print('Best individual evaluation is ', eval_shop(best_ind))
+    print("Best individual data has been saved to best_individual.json")
+
+    # 最も優れている個体のショップの配置を表示
+    plot_layout(best_ind)
@@ -1,39 +1,23 @@
-import cv2
+import os
 import numpy as np
 import random
 from deap import base, creator, tools, algorithms
+from fitness_cache import cached_map, sequence_key
+from population import sel_tournament, clone_individual
+from profiler import instrument, end_generation
+from ga_backend import make_backend, get_shared
+from floor_grid import load_plan_boundary, load_plan_image
+from render import paint_points, draw_markers, save_result
 
 # 画像を読み込む
-image_path = "./high_res_screenshot.jpg"  # アップロードした画像のパス
-image = cv2.imread(image_path)
+image_path = os.environ.get("GA_PLAN", "./high_res_screenshot.jpg")  # フロアの画像か、エディタで保存した図面（dbfiles/*.db）のパス
+output_path = os.environ.get("GA_OUTPUT", "./ga_shop_result.png")  # 結果の画像を保存するパス（GA_SHOW=1 なら画面にも表示）
 
 # BGR色空間で指定された色範囲を定義
 # 黄色と青の境界線の色を指定
 target_color_bgr = np.array([183,66,67])  # BGR形式で指定
 threshold = 10  # 色の範囲の許容誤差
 
-# 指定色の周辺の範囲を定義
-lower_bound = target_color_bgr - threshold
-upper_bound = target_color_bgr + threshold
-
-# マスクを作成
-mask = cv2.inRange(image, lower_bound, upper_bound)
-
-# マスクから輪郭を検出
-contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-# 黒色の背景に輪郭を描画（デバッグ用）
-boundary_image = np.zeros_like(image)
-cv2.drawContours(boundary_image, contours, -1, (255, 255, 255), 2)
-# 境界線のピクセル座標を取得
-boundary_points = np.column_stack(np.where(boundary_image > 0))
-# print(f"Number of boundary points: {len(boundary_points)}")
-# cv2.imshow("Black Image with Contours", boundary_image)
-
-# # ESCキーを押すまで画像を表示
-# cv2.waitKey(0)
-# cv2.destroyAllWindows()
-
 # GAの設定
 NUM_ENTRIES = 10  # 入口の数
 POP_SIZE = 50     # 個体数
@@ -41,9 +25,12 @@ GENS = 100        # 世代数
 
 # 評価関数（入口から通路までの距離が短いほど良い）
 def evaluate(individual):
+    # boundary_points は共有メモリに置いたものを参照する（プロセスごとにコピーしない）
+    boundary_points = get_shared("boundary_points")
     distance_sum = 0
     for entry in individual:
-        x, y, _ = boundary_points[entry]
+        # 座標は int16 のこともあるので、桁あふれしないように Python の整数にしてから計算する
+        x, y = (int(value) for value in boundary_points[entry])
         distance_sum += np.sqrt((x - y) ** 2)  # 簡易な距離計算
     return distance_sum,
 
@@ -52,33 +39,70 @@ creator.create("FitnessMin", base.Fitness, weights=(-1.0,))
 creator.create("Individual", list, fitness=creator.FitnessMin)
 
 toolbox = base.Toolbox()
-toolbox.register("attr_int", random.randint, 0, len(boundary_points) - 1)
-toolbox.register("individual", tools.initRepeat, creator.Individual, toolbox.attr_int, n=NUM_ENTRIES)
-toolbox.register("population", tools.initRepeat, list, toolbox.individual)
-
 toolbox.register("evaluate", evaluate)
 toolbox.register("mate", tools.cxTwoPoint)
-toolbox.register("mutate", tools.mutUniformInt, low=0, up=len(boundary_points) - 1, indpb=0.2)
-toolbox.register("select", tools.selTournament, tournsize=3)
-
-# GAの実行
-population = toolbox.population(n=POP_SIZE)
-for gen in range(GENS):
-    offspring = algorithms.varAnd(population, toolbox, cxpb=0.5, mutpb=0.2)
-    fits = map(toolbox.evaluate, offspring)
-    for fit, ind in zip(fits, offspring):
-        ind.fitness.values = fit
-    population = toolbox.select(offspring, k=len(population))
-
-# 最適な配置の取得
-best_individual = tools.selBest(population, k=1)[0]
-best_entries = [boundary_points[entry] for entry in best_individual]
-
-# 結果を画像に描画
-cv2.drawContours(image, contours, -1, (0, 0, 0), 2)
-for entry in best_entries:
-    cv2.circle(image, (entry[1], entry[0]), 5, (0, 0, 255), -1)  # 赤色で入口を描画
-cv2.imshow("Optimized Entrance Layout", image)
-cv2.waitKey(0)
-cv2.destroyAllWindows()
-
+# トーナメントは評価値の配列上でまとめて行い、複製は deepcopy せずに要素だけコピーする
+toolbox.register("select", sel_tournament, tournsize=3)
+toolbox.register("clone", clone_individual)
+
+
+def run(image_path=image_path, pop_size=POP_SIZE, gens=GENS, out_path=None, show=None, termination=None,
+        stats_logger=None):
+    """
+    入口の位置をGAで最適化し、選ばれた入口の座標を返す
+    out_path を指定すると結果の画像を保存し、show が True（省略時は環境変数 GA_SHOW=1 のとき）なら画面にも表示する
+    termination（termination.Termination）を渡すと、その条件を満たした世代で止め、それまでで最も良い個体を使う
+    stats_logger（stats_logger.StatsLogger）を渡すと、世代ごとの統計をファイルに書き出す
+    """
+    # 境界線の輪郭とピクセル座標を取得（画像なら boundary.py で画像ごとにキャッシュ、図面のデータベースなら道のセルから作る）
+    _, boundary_points, _ = load_plan_boundary(image_path, target_color_bgr, threshold)
+    # print(f"Number of boundary points: {len(boundary_points)}")
+    # cv2.imshow("Black Image with Contours", boundary_image)
+
+    # # ESCキーを押すまで画像を表示
+    # cv2.waitKey(0)
+    # cv2.destroyAllWindows()
+
+    toolbox.register("attr_int", random.randint, 0, len(boundary_points) - 1)
+    toolbox.register("individual", tools.initRepeat, creator.Individual, toolbox.attr_int, n=NUM_ENTRIES)
+    toolbox.register("population", tools.initRepeat, list, toolbox.individual)
+    toolbox.register("mutate", tools.mutUniformInt, low=0, up=len(boundary_points) - 1, indpb=0.2)
+
+    # 評価の実行方法（環境変数 GA_BACKEND で serial / thread / process を選択）
+    # boundary_points は共有メモリに一度だけ置き、ワーカーはそれを参照する
+    with make_backend(shared={"boundary_points": boundary_points}) as backend:
+        # 環境変数 GA_FITNESS_CACHE を設定すると、同じ内容の個体の評価を省く
+        toolbox.register("map", cached_map(backend.map, sequence_key))
+        # プロファイラで計測中なら、選択・複製・交叉・突然変異・評価の時間を計測する
+        instrument(toolbox)
+
+        # GAの実行
+        population = toolbox.population(n=pop_size)
+        for gen in range(gens):
+            offspring = algorithms.varAnd(population, toolbox, cxpb=0.5, mutpb=0.2)
+            fits = toolbox.map(toolbox.evaluate, offspring)
+            for fit, ind in zip(fits, offspring):
+                ind.fitness.values = fit
+            population = toolbox.select(offspring, k=len(population))
+            end_generation(gen + 1)
+            if stats_logger is not None:
+                stats_logger.record(gen + 1, len(offspring), population)
+            if termination is not None and termination.update(gen + 1, len(offspring), population):
+                break
+
+    # 最適な配置の取得
+    best_individual = tools.selBest(population, k=1)[0] if termination is None else termination.best
+    best_entries = [boundary_points[entry] for entry in best_individual]
+
+    # 結果を画像に描画（境界線を黒で、入口を赤で、画像は保存するときだけ読み込む）
+    if out_path is None:
+        return best_entries
+    image = load_plan_image(image_path)
+    paint_points(image, boundary_points, np.zeros(len(boundary_points), dtype=np.int64), [(0, 0, 0)])
+    draw_markers(image, best_entries)
+    save_result(out_path, image, "Optimized Entrance Layout", show)
+    return best_entries
+
+
+if __name__ == "__main__":
+    run(out_path=output_path)
@@ -0,0 +1,136 @@
+import multiprocessing
+import queue
+import random
+import numpy as np
+
+# 島モデルの既定値
+NUM_ISLANDS = 4             # 島（部分集団）の数
+MIGRATION_INTERVAL = 5      # 何世代ごとに移住させるか
+MIGRANTS = 5                # 1回の移住で送る個体数
+TOPOLOGY = "ring"           # ring: 隣の島へ / random: 移住ごとにランダムな島へ
+TOPOLOGIES = ("ring", "random")
+
+
+def migration_targets(n_islands, epoch, topology=TOPOLOGY, seed=0):
+    """
+    移住先の島の番号のリストを返す（targets[i] が島 i から送る先）
+    random でも全ての島が同じ seed と epoch から同じ並びを作るので、各島はちょうど1回ずつ受け取る
+    """
+    if topology == "ring":
+        return [(i + 1) % n_islands for i in range(n_islands)]
+    if topology == "random":
+        return np.random.default_rng([seed, epoch]).permutation(n_islands).tolist()
+    raise ValueError(f"未対応の移住の形です: {topology}（{', '.join(TOPOLOGIES)} から選択）")
+
+
+def _evaluate(toolbox, individuals):
+    # 評価値のない個体をまとめて評価し、評価した個体数を返す
+    invalid_ind = [ind for ind in individuals if not ind.fitness.valid]
+    fitnesses = toolbox.map(toolbox.evaluate, invalid_ind)
+    for ind, fit in zip(invalid_ind, fitnesses):
+        ind.fitness.values = fit
+    return len(invalid_ind)
+
+
+def _record(island, gen, nevals, population):
+    fitness = np.array([ind.fitness.values[0] for ind in population])
+    return {"island": island, "gen": gen, "nevals": nevals, "avg": float(fitness.mean()),
+            "std": float(fitness.std()), "min": float(fitness.min()), "max": float(fitness.max())}
+
+
+def _island_worker(island, n_islands, inboxes, results, pop_size, ngen, cxpb, mutpb,
+                   migration_interval, migrants, topology, seed, hof_size):
+    """
+    1つの島を進化させるワーカー（島ごとに別のプロセスで動く）
+    migration_interval 世代ごとに上位 migrants 個体を移住先の受信箱に送り、自分の受信箱から受け取った個体で最も悪い個体を置き換える
+    島どうしが待ち合わせるのは移住のときだけ
+    """
+    # ga_main の toolbox（生成、評価、交叉、突然変異、選択）をそのまま使う
+    from deap import algorithms, tools
+    import ga_main
+
+    toolbox = ga_main.toolbox
+    random.seed(seed * n_islands + island)
+    np.random.seed((seed * n_islands + island) % 2 ** 32)
+
+    halloffame = tools.HallOfFame(hof_size)
+    population = toolbox.population(n=pop_size)
+    nevals = _evaluate(toolbox, population)
+    halloffame.update(population)
+    logbook = [_record(island, 0, nevals, population)]
+
+    for gen in range(1, ngen + 1):
+        offspring = toolbox.select(population, len(population))
+        offspring = algorithms.varAnd(offspring, toolbox, cxpb, mutpb)
+        nevals = _evaluate(toolbox, offspring)
+        halloffame.update(offspring)
+        population[:] = offspring
+
+        if n_islands > 1 and gen % migration_interval == 0:
+            # 上位の個体を送り、届いた個体で最も悪い個体を置き換える
+            target = migration_targets(n_islands, gen // migration_interval, topology, seed)[island]
+            emigrants = [toolbox.clone(ind) for ind in tools.selBest(population, migrants)]
+            inboxes[target].put(emigrants)
+            immigrants = inboxes[island].get()
+            worst = sorted(range(len(population)), key=lambda i: population[i].fitness)[:len(immigrants)]
+            for i, ind in zip(worst, immigrants):
+                population[i] = ind
+
+        logbook.append(_record(island, gen, nevals, population))
+
+    results.put((island, list(halloffame), logbook))
+
+
+def run_islands(n_islands=NUM_ISLANDS, pop_size=75, ngen=60, cxpb=0.5, mutpb=0.2,
+                migration_interval=MIGRATION_INTERVAL, migrants=MIGRANTS, topology=TOPOLOGY, seed=None,
+                hof_size=1, verbose=True):
+    """
+    ga_main のレイアウトを島モデルのGAで最適化する
+    n_islands 個の部分集団（それぞれ pop_size 個体）を別々のプロセスで進化させ、
+    migration_interval 世代ごとに上位 migrants 個体を topology（ring / random）に従って移住させる
+    全ての島の殿堂入り個体をまとめた殿堂（tools.HallOfFame）と、島ごと世代ごとの統計（logbook）を返す
+    """
+    from deap import tools
+    # 親プロセスでも ga_main を読み込んでおく（creator のクラスを作り直さずに、届いた個体を受け取れるように）
+    import ga_main
+
+    if topology not in TOPOLOGIES:
+        raise ValueError(f"未対応の移住の形です: {topology}（{', '.join(TOPOLOGIES)} から選択）")
+    if seed is None:
+        seed = random.getrandbits(32)
+
+    inboxes = [multiprocessing.Queue() for _ in range(n_islands)]
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_island_worker,
+                                       args=(island, n_islands, inboxes, results, pop_size, ngen, cxpb, mutpb,
+                                             migration_interval, migrants, topology, seed, hof_size))
+               for island in range(n_islands)]
+    for worker in workers:
+        worker.start()
+    # 結果はプロセスの終了を待つ前に受け取る（キューが詰まって止まらないように）
+    island_results = []
+    while len(island_results) < n_islands:
+        try:
+            island_results.append(results.get(timeout=1.0))
+        except queue.Empty:
+            # 異常終了した島があれば、他の島は移住の待ち合わせで止まったままになるので全て止める
+            failed = [island for island, worker in enumerate(workers) if worker.exitcode not in (None, 0)]
+            if failed:
+                for worker in workers:
+                    worker.terminate()
+                raise RuntimeError(f"島 {failed} のプロセスが異常終了しました")
+    for worker in workers:
+        worker.join()
+    island_results.sort(key=lambda result: result[0])
+
+    halloffame = tools.HallOfFame(hof_size)
+    logbook = []
+    for island, island_hof, island_logbook in island_results:
+        halloffame.update(island_hof)
+        logbook.extend(island_logbook)
+    logbook.sort(key=lambda entry: (entry["gen"], entry["island"]))
+    if verbose:
+        print("gen\tisland\tnevals\tavg\tmax")
+        for entry in logbook:
+            print(f"{entry['gen']}\t{entry['island']}\t{entry['nevals']}\t{entry['avg']:.3f}\t{entry['max']:.3f}")
+    return halloffame, logbook
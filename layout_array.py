@@ -0,0 +1,174 @@
+import copy
+import json
+import random
+import numpy as np
+from layout_fitness import store_types, store_type_codes, eval_shop_batch
+
+# 配列表現の型（座標は float32、店舗種類コードは int16）
+COORD_DTYPE = np.float32
+CODE_DTYPE = np.int16
+
+
+class LayoutArray:
+    """
+    配列で表現したショップの個体
+    coords: (n_shops, 4) = [x座標, y座標, 幅, 高さ]
+    codes: (n_shops,) = 店舗種類コード（layout_fitness.store_types の位置）
+    Pythonのリストの個体と比べて、コピーや評価が安く、メモリも小さい
+    """
+
+    def __init__(self, coords, codes):
+        self.coords = np.ascontiguousarray(coords, dtype=COORD_DTYPE).reshape(-1, 4)
+        self.codes = np.ascontiguousarray(codes, dtype=CODE_DTYPE).reshape(-1)
+        if len(self.coords) != len(self.codes):
+            raise ValueError("coords と codes の店舗数が一致しません")
+
+    @classmethod
+    def from_shops(cls, shops):
+        """
+        リスト表現 [[x, y, 幅, 高さ, 店舗の種類], ...] から作成
+        """
+        coords = [store[:4] for store in shops]
+        codes = [store_type_codes[store[4]] for store in shops]
+        return cls(coords, codes)
+
+    def to_shops(self):
+        """
+        リスト表現 [[x, y, 幅, 高さ, 店舗の種類], ...] に変換
+        """
+        return [store[:4] + [store_types[code]] for store, code in zip(self.coords.tolist(), self.codes.tolist())]
+
+    @classmethod
+    def from_json_dict(cls, data):
+        """
+        best_individual.json の形式 {"shops": [...]} から作成
+        """
+        shops = data["shops"]
+        coords = [[shop["x_coordinate"], shop["y_coordinate"], shop["width"], shop["height"]] for shop in shops]
+        codes = [store_type_codes[shop["store_type"]] for shop in shops]
+        return cls(coords, codes)
+
+    def to_json_dict(self):
+        """
+        best_individual.json の形式 {"shops": [...]} に変換
+        """
+        return {
+            "shops": [
+                {
+                    "x_coordinate": x,
+                    "y_coordinate": y,
+                    "width": width,
+                    "height": height,
+                    "store_type": store_type
+                }
+                for x, y, width, height, store_type in self.to_shops()
+            ]
+        }
+
+    @classmethod
+    def load_json(cls, path):
+        with open(path) as json_file:
+            return cls.from_json_dict(json.load(json_file))
+
+    def save_json(self, path):
+        with open(path, 'w') as json_file:
+            json.dump(self.to_json_dict(), json_file, ensure_ascii=False, indent=4)
+
+    def key(self):
+        """
+        個体の内容から作るハッシュ可能なキー（同じ配置なら同じキーになる）
+        """
+        return self.coords.tobytes() + self.codes.tobytes()
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        # リスト表現と同じ形で1店舗分を返す（表示や既存の関数との互換用）
+        return self.coords[index].tolist() + [store_types[self.codes[index]]]
+
+    def __eq__(self, other):
+        if not isinstance(other, LayoutArray):
+            return NotImplemented
+        return np.array_equal(self.coords, other.coords) and np.array_equal(self.codes, other.codes)
+
+    def __deepcopy__(self, memo):
+        # 配列をそのままコピーする（リストの deepcopy より大幅に安い）
+        clone = self.__class__.__new__(self.__class__)
+        for name, value in self.__dict__.items():
+            if isinstance(value, np.ndarray):
+                clone.__dict__[name] = value.copy()
+            else:
+                clone.__dict__[name] = copy.deepcopy(value, memo)
+        return clone
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.to_shops()})"
+
+
+def random_layout(icls, n):
+    """
+    ランダムな配列表現の個体を作成（ga_main.create_shop と同じ範囲）
+    """
+    width = np.array([random.randint(5, 10) for _ in range(n)])
+    height = np.array([random.randint(5, 10) for _ in range(n)])
+    x = np.array([random.randint(0, 50 - w) for w in width])
+    y = np.array([random.randint(0, 50 - h) for h in height])
+    codes = [store_type_codes[random.choice(store_types)] for _ in range(n)]
+    return icls(np.column_stack([x, y, width, height]), codes)
+
+
+def stack_layouts(population):
+    """
+    集団を一括評価用の配列 coords (pop, n_shops, 4), codes (pop, n_shops) にまとめる
+    """
+    coords = np.stack([ind.coords for ind in population])
+    codes = np.stack([ind.codes for ind in population])
+    return coords, codes
+
+
+def eval_layout(layout):
+    """
+    配列表現の個体の評価関数（ga_main.eval_shop と同じ評価）
+    """
+    return float(eval_shop_batch(layout.coords[None], layout.codes[None])[0]),
+
+
+def eval_layout_population(population):
+    """
+    配列表現の個体のリストをまとめて評価する
+    """
+    if not population:
+        return []
+    fitnesses = eval_shop_batch(*stack_layouts(population))
+    return [(fitness,) for fitness in fitnesses.tolist()]
+
+
+eval_layout.batch = eval_layout_population
+
+
+def cx_layout(layout1, layout2):
+    """
+    配列表現の交叉関数（ga_main.cx_shop と同じく交叉点以降を入れ替える）
+    """
+    cxpoint = random.randint(1, len(layout1) - 1)
+    coords = layout1.coords[cxpoint:].copy()
+    codes = layout1.codes[cxpoint:].copy()
+    layout1.coords[cxpoint:], layout1.codes[cxpoint:] = layout2.coords[cxpoint:], layout2.codes[cxpoint:]
+    layout2.coords[cxpoint:], layout2.codes[cxpoint:] = coords, codes
+    return layout1, layout2
+
+
+def mut_layout(layout, mu, sigma, indpb, area=50):
+    """
+    配列表現の突然変異関数（ga_main.mut_shop と同じ乱数の使い方）
+    """
+    coords = layout.coords
+    for i in range(len(layout)):
+        if random.random() < indpb:
+            coords[i] += [random.gauss(mu, sigma) for _ in range(4)]
+            # 幅と高さが5以上10以下になるように制限
+            coords[i, 2:] = np.clip(coords[i, 2:], 5, 10)
+            # 座標がエリア外に出ないように制限
+            coords[i, :2] = np.clip(coords[i, :2], 0, area - coords[i, 2:])
+    return layout,
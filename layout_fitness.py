@@ -0,0 +1,302 @@
+import numpy as np
+from spatial_index import make_index
+from profiler import section
+
+# 店舗の種類を設定（リスト内の位置がそのまま店舗種類コードになる）
+store_types = ["飲食店", "洋服店", "本屋", "電化製品店", "おもちゃ屋", "映画館", "ゲームセンター"]
+store_type_codes = {store_type: code for code, store_type in enumerate(store_types)}
+
+RESTAURANT = store_type_codes["飲食店"]
+CLOTHING = store_type_codes["洋服店"]
+
+# 評価関数のパラメータ（ga_main.eval_shop と同じ値）
+THRESHOLD_DISTANCE = 30  # 店舗間がつながると見なす距離のしきい値
+PENALTY_PER_DEADEND = 100  # デッドエンド1つにつき課されるペナルティ
+NEAR_DISTANCE = 10  # 同じ種類の店舗が近いと見なす距離
+OVERLAP_PENALTY = 100  # 重なり1組あたりのペナルティ
+
+# 一括評価で一度に確保する距離行列の要素数の上限（float64で約64MB）
+MAX_CHUNK_ELEMENTS = 8_000_000
+
+
+def population_to_arrays(population):
+    """
+    集団を配列に変換
+    座標 (pop, n_shops, 4) = [x座標, y座標, 幅, 高さ] と店舗種類コード (pop, n_shops) を返す
+    """
+    coords = np.array([[store[:4] for store in shop] for shop in population], dtype=np.float64)
+    codes = np.array([[store_type_codes[store[4]] for store in shop] for shop in population], dtype=np.int16)
+    return coords.reshape(len(population), -1, 4), codes.reshape(len(population), -1)
+
+
+def _eval_chunk(coords, codes):
+    x, y, width, height = coords[..., 0], coords[..., 1], coords[..., 2], coords[..., 3]
+    n = coords.shape[1]
+    upper = np.triu(np.ones((n, n), dtype=bool), k=1)  # i < j のペア
+
+    with section("fitness.pairs"):
+        # 店舗間の距離行列（個体ごと）
+        dx = x[:, :, None] - x[:, None, :]
+        dy = y[:, :, None] - y[:, None, :]
+        dist = np.sqrt(dx ** 2 + dy ** 2)
+
+        # 距離の総和と面積の総和
+        total_distance = np.where(upper, dist, 0).sum(axis=(1, 2))
+        total_area = (width * height).sum(axis=1)
+
+        # 重なっている店舗の組
+        right = x + width
+        top = y + height
+        overlap = ((x[:, :, None] < right[:, None, :]) & (right[:, :, None] > x[:, None, :])
+                   & (y[:, :, None] < top[:, None, :]) & (top[:, :, None] > y[:, None, :]))
+        overlap_penalty = OVERLAP_PENALTY * (overlap & upper).sum(axis=(1, 2))
+
+    with section("fitness.circulation"):
+        # 回遊性：自分自身を含めて接続数が1以下の店舗をデッドエンドとみなす
+        connections_per_store = (dist < THRESHOLD_DISTANCE).sum(axis=2)
+        deadend_penalty = PENALTY_PER_DEADEND * (connections_per_store <= 1).sum(axis=1)
+
+    with section("fitness.category"):
+        # カテゴリ評価（eval_category と同じく、近くの店舗は種類を問わず自分自身も数える）
+        is_restaurant = codes == RESTAURANT
+        is_clothing = codes == CLOTHING
+        center = is_restaurant & (20 < x) & (x < 30) & (20 < y) & (y < 30)
+        near_count = (dist < NEAR_DISTANCE).sum(axis=2)
+        category_bonus = (100 * center.sum(axis=1)
+                          + 10 * np.where(is_restaurant | is_clothing, near_count, 0).sum(axis=1))
+        # その他の店は店舗が2つ以上あれば1店舗ごとにペナルティ
+        if n > 1:
+            category_bonus -= 100 * (~(is_restaurant | is_clothing)).sum(axis=1)
+
+    return total_distance + total_area + category_bonus - overlap_penalty * 2 - deadend_penalty
+
+
+def eval_shop_batch(coords, codes):
+    """
+    集団全体の評価関数
+    coords (pop, n_shops, 4) と codes (pop, n_shops) を受け取り、各個体の評価値 (pop,) を返す
+    ga_main.eval_shop と同じ評価をNumPyでまとめて計算する
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    codes = np.asarray(codes)
+    pop, n = coords.shape[:2]
+    # 距離行列が大きくなりすぎないように集団を分割して計算
+    chunk = max(1, MAX_CHUNK_ELEMENTS // max(1, n * n))
+    fitnesses = np.empty(pop, dtype=np.float64)
+    for start in range(0, pop, chunk):
+        stop = start + chunk
+        fitnesses[start:stop] = _eval_chunk(coords[start:stop], codes[start:stop])
+    return fitnesses
+
+
+def eval_shop_population(population):
+    """
+    個体のリストをまとめて評価し、DEAPの評価値タプルのリストを返す
+    """
+    if not population:
+        return []
+    fitnesses = eval_shop_batch(*population_to_arrays(population))
+    return [(fitness,) for fitness in fitnesses.tolist()]
+
+
+def shop_arrays(shop):
+    # 1個体分の座標と店舗種類コード（リスト表現と配列表現のどちらにも対応）
+    if hasattr(shop, "coords"):
+        return shop.coords, shop.codes
+    coords = np.array([store[:4] for store in shop], dtype=np.float64).reshape(-1, 4)
+    codes = np.array([store_type_codes[store[4]] for store in shop], dtype=np.int16)
+    return coords, codes
+
+
+def _pair_rows(coords, rows):
+    # rows で指定した店舗と全店舗との距離と重なりを計算（自分自身との重なりは数えない）
+    x, y, width, height = coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3]
+    right = x + width
+    top = y + height
+    dist = np.sqrt((x[rows, None] - x[None, :]) ** 2 + (y[rows, None] - y[None, :]) ** 2)
+    overlap = ((x[rows, None] < right[None, :]) & (right[rows, None] > x[None, :])
+               & (y[rows, None] < top[None, :]) & (top[rows, None] > y[None, :]))
+    overlap[np.arange(len(rows)), rows] = False
+    return dist, overlap
+
+
+class PairwiseTerms:
+    """
+    1個体分の評価の途中結果（距離行列、重なり行列と店舗ごとの集計値）を保持するキャッシュ
+    変更された店舗の行と列だけを再計算するので、k店舗が変わったときの評価は O(k・n) で済む
+    """
+
+    def __init__(self, coords, codes):
+        self.coords = np.array(coords, dtype=np.float64)
+        self.codes = np.array(codes)
+        rows = np.arange(len(self.codes))
+        self.dist, self.overlap = _pair_rows(self.coords, rows)
+        self.dist_sum = self.dist.sum(axis=1)  # 店舗ごとの距離の和
+        self.overlap_count = self.overlap.sum(axis=1)  # 店舗ごとの重なっている店舗数
+        self.adjacent_count = (self.dist < THRESHOLD_DISTANCE).sum(axis=1)  # 自分自身を含む接続数
+        self.near_count = (self.dist < NEAR_DISTANCE).sum(axis=1)  # 自分自身を含む近くの店舗数
+        self._shared = False
+
+    def changed_rows(self, coords, codes):
+        """
+        キャッシュした配置と比べて変更された店舗の番号を返す
+        """
+        return np.flatnonzero((coords != self.coords).any(axis=1) | (codes != self.codes))
+
+    def update(self, coords, codes):
+        """
+        新しい配置に合わせて、変更された店舗の行と列だけを再計算する
+        """
+        coords = np.asarray(coords, dtype=np.float64)
+        codes = np.asarray(codes)
+        if coords.shape != self.coords.shape:
+            self.__init__(coords, codes)
+            return
+        rows = self.changed_rows(coords, codes)
+        if len(rows) == 0:
+            return
+        if 2 * len(rows) > len(codes):
+            # 半分以上変わっていれば全体を計算し直した方が早い
+            self.__init__(coords, codes)
+            return
+        if self._shared:
+            # 複製と配列を共有しているので、書き換える前にコピーする
+            self.dist = self.dist.copy()
+            self.overlap = self.overlap.copy()
+            self.dist_sum = self.dist_sum.copy()
+            self.overlap_count = self.overlap_count.copy()
+            self.adjacent_count = self.adjacent_count.copy()
+            self.near_count = self.near_count.copy()
+            self._shared = False
+
+        self.coords = coords.copy()
+        self.codes = codes.copy()
+        old_dist = self.dist[:, rows]
+        old_overlap = self.overlap[:, rows]
+        dist, overlap = _pair_rows(self.coords, rows)
+
+        # 変更されていない店舗は、変更された店舗の列の差分だけ集計値を更新
+        self.dist_sum += (dist.T - old_dist).sum(axis=1)
+        self.overlap_count += overlap.T.sum(axis=1) - old_overlap.sum(axis=1)
+        self.adjacent_count += ((dist.T < THRESHOLD_DISTANCE).sum(axis=1)
+                                - (old_dist < THRESHOLD_DISTANCE).sum(axis=1))
+        self.near_count += (dist.T < NEAR_DISTANCE).sum(axis=1) - (old_dist < NEAR_DISTANCE).sum(axis=1)
+
+        # 変更された店舗の行と列を書き換え、その店舗の集計値は行から計算し直す
+        self.dist[rows, :] = dist
+        self.dist[:, rows] = dist.T
+        self.overlap[rows, :] = overlap
+        self.overlap[:, rows] = overlap.T
+        self.dist_sum[rows] = dist.sum(axis=1)
+        self.overlap_count[rows] = overlap.sum(axis=1)
+        self.adjacent_count[rows] = (dist < THRESHOLD_DISTANCE).sum(axis=1)
+        self.near_count[rows] = (dist < NEAR_DISTANCE).sum(axis=1)
+
+    def fitness(self):
+        """
+        キャッシュした途中結果から評価値を計算する（ga_main.eval_shop と同じ評価）
+        """
+        x, y, width, height = self.coords[:, 0], self.coords[:, 1], self.coords[:, 2], self.coords[:, 3]
+        total_distance = self.dist_sum.sum() / 2
+        total_area = (width * height).sum()
+        overlap_penalty = OVERLAP_PENALTY * (self.overlap_count.sum() // 2)
+        deadend_penalty = PENALTY_PER_DEADEND * np.sum(self.adjacent_count <= 1)
+
+        is_restaurant = self.codes == RESTAURANT
+        is_clothing = self.codes == CLOTHING
+        center = is_restaurant & (20 < x) & (x < 30) & (20 < y) & (y < 30)
+        category_bonus = 100 * center.sum() + 10 * self.near_count[is_restaurant | is_clothing].sum()
+        if len(self.codes) > 1:
+            category_bonus -= 100 * np.sum(~(is_restaurant | is_clothing))
+
+        return float(total_distance + total_area + category_bonus - overlap_penalty * 2 - deadend_penalty)
+
+    def __deepcopy__(self, memo):
+        # 複製とは配列を共有し、どちらかが更新するときにコピーする
+        clone = self.__class__.__new__(self.__class__)
+        clone.__dict__.update(self.__dict__)
+        self._shared = clone._shared = True
+        return clone
+
+
+def eval_shop_incremental(shop):
+    """
+    差分評価の評価関数
+    個体に前回評価時の途中結果（shop.terms）を持たせ、変更された店舗の行と列だけを再計算する
+    交叉で入れ替わらなかった前半部分や、突然変異しなかった店舗同士の計算は再利用される
+    リスト表現の個体と配列表現（layout_array.LayoutArray）の個体の両方に使える
+    """
+    coords, codes = shop_arrays(shop)
+    terms = getattr(shop, "terms", None)
+    if terms is None:
+        shop.terms = PairwiseTerms(coords, codes)
+    else:
+        terms.update(coords, codes)
+    return shop.terms.fitness(),
+
+
+# 途中結果を個体に書き込むので、プロセスで並列に評価するときも親プロセスで評価する（ga_backend.EvaluationBackend）
+eval_shop_incremental.stateful = True
+
+
+# 距離の総和を計算するときに一度に扱う行数
+DISTANCE_BLOCK_ROWS = 1024
+
+
+def _total_distance(xy):
+    # 全ての組の距離の総和（全組が必要なので O(n²) だが、メモリは行のブロックごとに抑える）
+    total = 0.0
+    for start in range(0, len(xy), DISTANCE_BLOCK_ROWS):
+        block = xy[start:start + DISTANCE_BLOCK_ROWS]
+        dist = np.sqrt((block[:, None, 0] - xy[None, :, 0]) ** 2 + (block[:, None, 1] - xy[None, :, 1]) ** 2)
+        # 自分より後ろの店舗との距離だけを足す
+        later = np.arange(start, start + len(block))[:, None] < np.arange(len(xy))[None, :]
+        total += dist[later].sum()
+    return total
+
+
+def eval_shop_indexed(coords, codes, index):
+    """
+    空間インデックスを使った1個体の評価関数（ga_main.eval_shop と同じ評価）
+    重なり、回遊性（30以内の接続）、カテゴリ（10以内の店舗）は近くの組だけを調べる
+    index: spatial_index.make_index で作ったインデックス
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    codes = np.asarray(codes)
+    n = len(codes)
+    x, y, width, height = coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3]
+    xy = coords[:, :2]
+
+    with section("fitness.pairs"):
+        total_distance = _total_distance(xy)
+        total_area = (width * height).sum()
+
+        i, j = index.overlap_pairs(coords)
+        overlap_penalty = OVERLAP_PENALTY * len(i)
+
+    with section("fitness.circulation"):
+        # 接続数は自分自身を含めて数える
+        i, j, dist = index.near_pairs(xy, THRESHOLD_DISTANCE)
+        connections_per_store = 1 + np.bincount(i, minlength=n) + np.bincount(j, minlength=n)
+        deadend_penalty = PENALTY_PER_DEADEND * np.sum(connections_per_store <= 1)
+
+    with section("fitness.category"):
+        # 10未満の組は30未満の組の一部なので、同じ結果を絞り込んで使う
+        near = dist < NEAR_DISTANCE
+        near_count = 1 + np.bincount(i[near], minlength=n) + np.bincount(j[near], minlength=n)
+        is_restaurant = codes == RESTAURANT
+        is_clothing = codes == CLOTHING
+        center = is_restaurant & (20 < x) & (x < 30) & (20 < y) & (y < 30)
+        category_bonus = 100 * center.sum() + 10 * near_count[is_restaurant | is_clothing].sum()
+        if n > 1:
+            category_bonus -= 100 * np.sum(~(is_restaurant | is_clothing))
+
+    return float(total_distance + total_area + category_bonus - overlap_penalty * 2 - deadend_penalty)
+
+
+def eval_shop_spatial(shop, index="kdtree"):
+    """
+    空間インデックスを使う評価関数（店舗数が非常に多いとき向け）
+    index: 空間インデックスの名前（brute / sweep / grid / kdtree）
+    """
+    return eval_shop_indexed(*shop_arrays(shop), make_index(index)),
@@ -0,0 +1,149 @@
+import numpy as np
+from layout_fitness import store_types, eval_shop_batch
+from profiler import section, end_generation
+
+# 店舗の大きさとフロアの広さ（ga_main.create_shop / mut_shop と同じ値）
+MIN_SIZE = 5
+MAX_SIZE = 10
+AREA = 50
+
+
+def random_layouts(rng, pop_size, n_shops, area=AREA):
+    """
+    ランダムな集団を配列で作成（ga_main.create_shop と同じ範囲）
+    coords (pop, n_shops, 4) と codes (pop, n_shops) を返す
+    """
+    size = rng.integers(MIN_SIZE, MAX_SIZE + 1, size=(pop_size, n_shops, 2))
+    position = rng.integers(0, area - size + 1)
+    coords = np.concatenate([position, size], axis=2).astype(np.float64)
+    codes = rng.integers(0, len(store_types), size=(pop_size, n_shops)).astype(np.int16)
+    return coords, codes
+
+
+def cx_layout_batch(coords, codes, rng, cxpb):
+    """
+    集団全体の交叉（ga_main.cx_shop と同じく、交叉点以降を入れ替える）
+    隣り合う個体 (0, 1), (2, 3), ... を組にし、確率 cxpb で交叉する
+    交叉点は組ごとに 1 〜 n_shops-1 から一度にまとめて選ぶ
+    coords, codes はその場で書き換え、交叉した個体のマスクを返す
+    """
+    pop, n = codes.shape
+    n_pairs = pop // 2
+    changed = np.zeros(pop, dtype=bool)
+    if n_pairs == 0 or n < 2:
+        return changed
+    mate = rng.random(n_pairs) < cxpb
+    cxpoints = rng.integers(1, n, size=n_pairs)
+    # 入れ替える店舗のマスク (n_pairs, n_shops)
+    swap = mate[:, None] & (np.arange(n)[None, :] >= cxpoints[:, None])
+
+    first = np.arange(0, 2 * n_pairs, 2)
+    second = first + 1
+    for array in (coords, codes):
+        a = array[first]
+        b = array[second]
+        mask = swap.reshape(swap.shape + (1,) * (array.ndim - 2))
+        array[first] = np.where(mask, b, a)
+        array[second] = np.where(mask, a, b)
+    changed[first] = mate
+    changed[second] = mate
+    return changed
+
+
+def mut_layout_batch(coords, rng, mutpb, mu, sigma, indpb, area=AREA):
+    """
+    集団全体の突然変異（ga_main.mut_shop と同じガウス変異と範囲の制限）
+    確率 mutpb で個体を選び、その中の各店舗を確率 indpb で変異させる
+    ガウスノイズは一度の乱数生成でまとめて作る
+    coords はその場で書き換え、変異した個体のマスクを返す
+    """
+    pop, n = coords.shape[:2]
+    mutate = rng.random(pop) < mutpb
+    shops = mutate[:, None] & (rng.random((pop, n)) < indpb)
+    noise = rng.normal(mu, sigma, size=(int(shops.sum()), 4))
+
+    mutated = coords[shops] + noise
+    # 幅と高さが5以上10以下になるように制限
+    mutated[:, 2:] = np.clip(mutated[:, 2:], MIN_SIZE, MAX_SIZE)
+    # 座標がエリア外に出ないように制限
+    mutated[:, :2] = np.maximum(0, np.minimum(mutated[:, :2], area - mutated[:, 2:]))
+    coords[shops] = mutated
+    return mutate
+
+
+def var_and_batch(coords, codes, rng, cxpb, mutpb, mu=0, sigma=1, indpb=0.2, area=AREA):
+    """
+    DEAP の varAnd と同じ順番（交叉してから突然変異）で集団全体を変化させる
+    評価し直す必要のある個体のマスクを返す
+    """
+    with section("mate"):
+        crossed = cx_layout_batch(coords, codes, rng, cxpb)
+    with section("mutate"):
+        mutated = mut_layout_batch(coords, rng, mutpb, mu, sigma, indpb, area)
+    return crossed | mutated
+
+
+def ea_simple_batch(population, ngen, cxpb, mutpb, rng, evaluate=eval_shop_batch, tournsize=3,
+                    elitism=0, mu=0, sigma=1, indpb=0.2, area=AREA, verbose=False, checkpoint=None, resume=False,
+                    termination=None, stats_logger=None):
+    """
+    algorithms.eaSimple の代わりの世代ループ（集団を配列のまま進化させる）
+    population: genes に "coords" と "codes" を持つ population.ArrayPopulation
+    選択 → 複製（配列の取り出し）→ 交叉・突然変異 → 変化した個体だけ評価、を繰り返す
+    checkpoint（checkpoint.Checkpointer、rng を渡したもの）で途中の状態を保存し、resume で続きから再開する
+    termination（termination.Termination）を渡すと、その条件を満たした世代で止める
+    stats_logger（stats_logger.StatsLogger）を渡すと、世代ごとの統計をファイルに書き出す
+    最後の集団と、世代ごとの統計（logbook）を返す
+    """
+    logbook = []
+    start_gen = 0
+    stopped = False
+
+    def record(gen, nevals):
+        fitness = population.fitness
+        entry = {"gen": gen, "nevals": nevals, "avg": float(fitness.mean()), "std": float(fitness.std()),
+                 "min": float(fitness.min()), "max": float(fitness.max())}
+        logbook.append(entry)
+        if verbose:
+            print("\t".join(str(value) for value in entry.values()))
+
+    if verbose:
+        print("gen\tnevals\tavg\tstd\tmin\tmax")
+    if resume and checkpoint is not None and checkpoint.exists():
+        start_gen, population = checkpoint.load(logbook=logbook)
+    else:
+        with section("evaluate"):
+            nevals = population.evaluate(evaluate)
+        record(0, nevals)
+        end_generation(0)
+        if stats_logger is not None:
+            stats_logger.record(0, nevals, population)
+        if termination is not None:
+            stopped = termination.update(0, nevals, population) is not None
+        if checkpoint is not None:
+            checkpoint.save(0, population, logbook=logbook, force=ngen == 0 or stopped)
+
+    for gen in range(start_gen + 1, ngen + 1):
+        if stopped:
+            break
+        # 選択と複製（選ばれた番号で配列を取り出すだけで、deepcopy はしない）
+        with section("select"):
+            population = population.select_tournament(len(population), tournsize, rng, elitism)
+
+        # 交叉と突然変異（先頭のエリートはそのまま残す）、変化した個体だけ評価し直す
+        invalid = np.zeros(len(population), dtype=bool)
+        invalid[elitism:] = var_and_batch(population["coords"][elitism:], population["codes"][elitism:], rng,
+                                          cxpb, mutpb, mu, sigma, indpb, area)
+        population.invalidate(invalid)
+        with section("evaluate"):
+            nevals = population.evaluate(evaluate)
+        record(gen, nevals)
+        end_generation(gen)
+        if stats_logger is not None:
+            stats_logger.record(gen, nevals, population)
+        if termination is not None:
+            stopped = termination.update(gen, nevals, population) is not None
+        if checkpoint is not None:
+            checkpoint.save(gen, population, logbook=logbook, force=gen == ngen or stopped)
+
+    return population, logbook
@@ -0,0 +1,67 @@
+import numpy as np
+
+# 点を最も近いサイト（店舗の代表点）に割り当てる（ボロノイ分割のラベル付け）
+# 座標はどれも (行, 列) の順（boundary.load_boundary の境界線のピクセル座標と同じ）
+# weights を渡すと距離の2乗から重みを引いた値（パワー距離）で比べる（重みが大きいサイトほど領域が広い）
+
+# サイトがこの数以上なら cKDTree で探す（少ないときは全てのサイトとの距離をまとめて計算する方が速い）
+KDTREE_MIN_SITES = 32
+# まとめて計算するときに一度に作る（点の数 x サイトの数）の上限
+MAX_CHUNK_ELEMENTS = 4_000_000
+
+
+def _lifted(points, sites, weights):
+    # パワー距離 |p - s|^2 - w を、サイトに1次元足した空間のユークリッド距離にする
+    # |(p, 0) - (s, sqrt(W - w))|^2 = |p - s|^2 + W - w（W は重みの最大値）
+    height = np.sqrt(weights.max() - weights)
+    return (np.column_stack([points, np.zeros(len(points))]), np.column_stack([sites, height]))
+
+
+def nearest_sites(points, sites, weights=None, method=None):
+    """
+    各点に最も近いサイトの番号 (n,) を返す
+    points: (n, 2) の点、sites: (k, 2) のサイト、weights: (k,) のパワー距離の重み（省略時は全て0）
+    method: "kdtree"（cKDTree）か "broadcast"（まとめて計算）、省略時はサイトの数で選ぶ
+    """
+    points = np.asarray(points, dtype=np.float64)
+    sites = np.asarray(sites, dtype=np.float64)
+    if len(sites) == 0:
+        raise ValueError("サイトが1つもありません")
+    if method is None:
+        method = "kdtree" if len(sites) >= KDTREE_MIN_SITES else "broadcast"
+    if method not in ("kdtree", "broadcast"):
+        raise ValueError(f"不明な method です: {method}（kdtree / broadcast）")
+    weights = None if weights is None else np.asarray(weights, dtype=np.float64)
+
+    if method == "kdtree":
+        from scipy.spatial import cKDTree
+
+        if weights is not None:
+            points, sites = _lifted(points, sites, weights)
+        return cKDTree(sites).query(points)[1].astype(np.int64)
+
+    labels = np.empty(len(points), dtype=np.int64)
+    step = max(1, MAX_CHUNK_ELEMENTS // len(sites))
+    # |p - s|^2 = |p|^2 - 2 p・s + |s|^2 の |p|^2 は比べるときに要らない
+    offset = (sites ** 2).sum(axis=1)
+    if weights is not None:
+        offset = offset - weights
+    for start in range(0, len(points), step):
+        chunk = points[start:start + step]
+        labels[start:start + step] = (offset[None, :] - 2.0 * chunk @ sites.T).argmin(axis=1)
+    return labels
+
+
+def label_raster(shape, sites, weights=None, mask=None, method=None):
+    """
+    画像の全てのピクセル（mask を渡したときは mask が True のピクセルだけ）を最も近いサイトの番号にした
+    ラベル画像 (高さ, 幅) を返す（対象外のピクセルは -1）
+    """
+    height, width = shape[:2]
+    labels = np.full((height, width), -1, dtype=np.int32)
+    if mask is None:
+        rows, cols = np.divmod(np.arange(height * width), width)
+    else:
+        rows, cols = np.nonzero(mask)
+    labels[rows, cols] = nearest_sites(np.column_stack([rows, cols]), sites, weights, method)
+    return labels
@@ -0,0 +1,139 @@
+import copy
+import random
+import numpy as np
+
+
+def _default_rng(rng):
+    # 乱数生成器が渡されなければ random モジュールから作る（random.seed で再現できるようにする）
+    if rng is None:
+        return np.random.default_rng(random.getrandbits(64))
+    return rng
+
+
+def sel_tournament_indices(wfitness, k, tournsize, rng=None, elitism=0):
+    """
+    トーナメント選択をまとめて行い、選ばれた個体の番号を返す
+    wfitness: 重み付きの評価値（大きいほど良い）
+    elitism: 評価値の上位から無条件に残す個体数
+    """
+    rng = _default_rng(rng)
+    wfitness = np.asarray(wfitness)
+    elite = np.argsort(-wfitness, kind="stable")[:elitism]
+    contestants = rng.integers(0, len(wfitness), size=(k - len(elite), tournsize))
+    winners = contestants[np.arange(len(contestants)), np.argmax(wfitness[contestants], axis=1)]
+    return np.concatenate([elite, winners])
+
+
+def sel_tournament(individuals, k, tournsize, elitism=0, rng=None):
+    """
+    tools.selTournament の代わりに toolbox に登録できる選択関数
+    評価値を一度だけ配列にし、全てのトーナメントをまとめて行う
+    """
+    wfitness = np.array([ind.fitness.wvalues[0] for ind in individuals])
+    return [individuals[i] for i in sel_tournament_indices(wfitness, k, tournsize, rng, elitism)]
+
+
+def clone_individual(individual):
+    """
+    toolbox.clone（deepcopy）の代わりに登録できる複製関数
+    リストの個体は要素（入れ子のリストは1段だけ）をコピーし、評価値はそのまま引き継ぐ
+    それ以外の個体は deepcopy する
+    """
+    if not isinstance(individual, list):
+        return copy.deepcopy(individual)
+    clone = type(individual)(item[:] if isinstance(item, list) else item for item in individual)
+    for name, value in individual.__dict__.items():
+        if name == "fitness":
+            if value.valid:
+                clone.fitness.values = value.values
+        else:
+            clone.__dict__[name] = copy.deepcopy(value)
+    return clone
+
+
+class ArrayPopulation:
+    """
+    集団を配列のまま扱うコンテナ
+    genes: 遺伝子の配列 {名前: (pop, ...) の配列}（例: {"coords": ..., "codes": ...}）
+    fitness: 評価値 (pop,)（未評価の個体は nan）
+    weight: 1.0 なら評価値が大きいほど良い、-1.0 なら小さいほど良い
+    選択は評価値の配列上でまとめて行い、複製は選ばれた番号で配列を取り出すだけで済ませる
+    """
+
+    def __init__(self, genes, fitness=None, weight=1.0):
+        self.genes = {name: np.asarray(array) for name, array in genes.items()}
+        size = len(next(iter(self.genes.values())))
+        if fitness is None:
+            fitness = np.full(size, np.nan)
+        self.fitness = np.asarray(fitness, dtype=np.float64)
+        self.weight = weight
+
+    def __len__(self):
+        return len(self.fitness)
+
+    def __getitem__(self, name):
+        return self.genes[name]
+
+    @property
+    def valid(self):
+        return ~np.isnan(self.fitness)
+
+    def take(self, indices):
+        """
+        選ばれた番号の個体を取り出した新しい集団を返す（配列のコピー）
+        """
+        genes = {name: array[indices] for name, array in self.genes.items()}
+        return ArrayPopulation(genes, self.fitness[indices], self.weight)
+
+    def select_tournament(self, k, tournsize, rng=None, elitism=0):
+        """
+        トーナメント選択で k 個体を選び、取り出した集団を返す
+        """
+        indices = sel_tournament_indices(self.fitness * self.weight, k, tournsize, rng, elitism)
+        return self.take(indices)
+
+    def invalidate(self, mask):
+        """
+        遺伝子が変わった個体の評価値を消す
+        """
+        self.fitness[mask] = np.nan
+
+    def evaluate(self, func):
+        """
+        未評価の個体だけを func(**genes) でまとめて評価し、評価した個体数を返す
+        """
+        invalid = ~self.valid
+        count = int(invalid.sum())
+        if count:
+            self.fitness[invalid] = func(**{name: array[invalid] for name, array in self.genes.items()})
+        return count
+
+    def best(self):
+        """
+        最も良い個体の番号を返す
+        """
+        return int(np.nanargmax(self.fitness * self.weight))
+
+    @classmethod
+    def from_individuals(cls, population, encode, weight=1.0):
+        """
+        DEAP の個体のリストから作る
+        encode(個体) は {名前: 配列} を返す関数
+        """
+        encoded = [encode(ind) for ind in population]
+        genes = {name: np.stack([item[name] for item in encoded]) for name in encoded[0]}
+        fitness = [ind.fitness.values[0] if ind.fitness.valid else np.nan for ind in population]
+        return cls(genes, fitness, weight)
+
+    def to_individuals(self, decode):
+        """
+        DEAP の個体のリストに変換する
+        decode(遺伝子の辞書) は評価値のない個体を返す関数
+        """
+        individuals = []
+        for i in range(len(self)):
+            ind = decode({name: array[i] for name, array in self.genes.items()})
+            if not np.isnan(self.fitness[i]):
+                ind.fitness.values = (float(self.fitness[i]),)
+            individuals.append(ind)
+        return individuals
@@ -0,0 +1,189 @@
+import functools
+import json
+import os
+import threading
+import time
+
+# GAの各段階の名前（toolbox に登録された関数の名前）
+GA_PHASES = ("select", "clone", "mate", "mutate", "evaluate")
+# Chrome のトレースに残すイベント数の上限（メモリを使いすぎないように、超えた分は捨てる）
+MAX_TRACE_EVENTS = 1_000_000
+
+# 計測中のプロファイラ（計測していなければ None）
+_active = None
+
+
+class _NullSection:
+    # 計測していないときの何もしない区間
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SECTION = _NullSection()
+
+
+class _Section:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, self.start, time.perf_counter_ns())
+        return False
+
+
+def section(name):
+    """
+    with section("fitness.pairs"): ... の区間の時間と回数を計測する
+    計測していなければ何もしない（評価関数の中に置いたままにできる）
+    """
+    if _active is None:
+        return _NULL_SECTION
+    return _Section(_active, name)
+
+
+def timed(name, func):
+    """
+    呼び出しごとに name の時間を計測する関数を返す（計測していないときはそのまま func を呼ぶ）
+    func に一括評価用の batch 属性があれば、それも計測する
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler = _active
+        if profiler is None:
+            return func(*args, **kwargs)
+        start = time.perf_counter_ns()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.add(name, start, time.perf_counter_ns())
+
+    if hasattr(func, "batch"):
+        wrapper.batch = timed(name, func.batch)
+    wrapper.profiled = True
+    return wrapper
+
+
+def instrument(toolbox, phases=GA_PHASES):
+    """
+    計測中なら toolbox の各段階（選択、複製、交叉、突然変異、評価）を計測する関数に置き換える
+    評価は toolbox.map（一括評価や並列評価を含む）で計測するので、プロセスで評価するときも使える
+    """
+    if _active is None:
+        return
+    for phase in phases:
+        name = "map" if phase == "evaluate" else phase
+        func = getattr(toolbox, name, None)
+        if func is None or getattr(func, "profiled", False):
+            continue
+        toolbox.register(name, timed(phase, func))
+
+
+def end_generation(gen):
+    """
+    計測中なら1世代分の集計を書き出す（世代ループの最後に呼ぶ）
+    """
+    if _active is not None:
+        _active.end_generation(gen)
+
+
+class Profiler:
+    """
+    評価関数の項ごと、GAの段階ごとの時間と呼び出し回数を集計する
+    jsonl_path: 世代ごとの集計を1行ずつ書き出す JSON Lines ファイル
+    trace_path: Chrome のトレース（chrome://tracing や Perfetto で開ける JSON）を書き出すファイル
+    with Profiler(...): の間だけ有効になる
+    時刻は perf_counter_ns で取り、区間ごとに辞書を1回更新するだけなので、常に有効にしておける程度に軽い
+    """
+
+    def __init__(self, jsonl_path=None, trace_path=None):
+        self.jsonl_path = jsonl_path
+        self.trace_path = trace_path
+        self.totals = {}       # 名前 -> [呼び出し回数, 合計時間(ns)]
+        self.generation = {}   # 現在の世代の分
+        self.events = [] if trace_path else None
+        self.dropped_events = 0
+        self.origin = time.perf_counter_ns()
+        self._file = None
+        self._previous = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        global _active
+        self._previous = _active
+        _active = self
+        if self.jsonl_path is not None:
+            self._file = open(self.jsonl_path, "w")
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        _active = self._previous
+        self.close()
+        return False
+
+    def add(self, name, start, end):
+        """
+        区間 [start, end)（perf_counter_ns）を name の時間として加える
+        """
+        elapsed = end - start
+        with self._lock:
+            for counts in (self.totals, self.generation):
+                entry = counts.get(name)
+                if entry is None:
+                    counts[name] = [1, elapsed]
+                else:
+                    entry[0] += 1
+                    entry[1] += elapsed
+            if self.events is not None:
+                if len(self.events) < MAX_TRACE_EVENTS:
+                    self.events.append((name, start, elapsed, threading.get_ident()))
+                else:
+                    self.dropped_events += 1
+
+    @staticmethod
+    def _summary(counts):
+        return {name: {"calls": calls, "seconds": elapsed / 1e9} for name, (calls, elapsed) in sorted(counts.items())}
+
+    def end_generation(self, gen):
+        """
+        現在の世代の集計を JSON Lines に1行書き出し、世代の集計を空にする
+        """
+        with self._lock:
+            generation, self.generation = self.generation, {}
+        if self._file is not None:
+            self._file.write(json.dumps({"gen": gen, "stages": self._summary(generation)}) + "\n")
+
+    def summary(self):
+        """
+        これまでの合計 {名前: {"calls": 回数, "seconds": 秒}} を返す
+        """
+        return self._summary(self.totals)
+
+    def write_trace(self, path):
+        """
+        Chrome のトレース形式（完了イベント "X"、時刻はマイクロ秒）で書き出す
+        """
+        pid = os.getpid()
+        events = [{"name": name, "cat": name.split(".")[0], "ph": "X", "pid": pid, "tid": tid,
+                   "ts": (start - self.origin) / 1000, "dur": elapsed / 1000}
+                  for name, start, elapsed, tid in self.events]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms",
+                       "otherData": {"dropped_events": self.dropped_events}}, f)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.trace_path is not None and self.events is not None:
+            self.write_trace(self.trace_path)
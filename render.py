@@ -0,0 +1,166 @@
+import functools
+import os
+import numpy as np
+
+# ラベル付きの点（クラスタや Voronoi 領域の境界線のピクセル）、入口の印、店舗名を画像にまとめて描画する
+# 画像は OpenCV と同じ BGR の uint8 配列 (高さ, 幅, 3)、点の座標は (行, 列)
+# 点ごとに cv2.circle を呼ぶ代わりに、円の形（スタンプ）を全ての点に一度に書き込む
+
+# 日本語フォントの大きさ
+FONT_SIZE = 20
+# 環境変数 GA_SHOW=1 のときだけ、保存した結果の画像を画面にも表示する（閉じるまで待つ）
+SHOW = os.environ.get("GA_SHOW", "") == "1"
+
+
+@functools.lru_cache(maxsize=None)
+def _stamp(radius):
+    # cv2.circle（塗りつぶし）で描かれる円のピクセルの、中心からのずれ (k, 2) = (行, 列)
+    import cv2
+
+    size = 2 * radius + 3
+    canvas = np.zeros((size, size), dtype=np.uint8)
+    cv2.circle(canvas, (radius + 1, radius + 1), radius, 1, -1)
+    return np.argwhere(canvas > 0) - (radius + 1)
+
+
+def paint_points(image, points, labels, colors, radius=1):
+    """
+    点 (n, 2) をそれぞれのラベルの色（colors[labels]、BGR）で、半径 radius の塗りつぶした円として描く
+    点ごとに cv2.circle を呼んだときと同じ結果になる（重なるところは後の点の色）
+    image はその場で書き換え、同じ画像を返す
+    """
+    points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+    labels = np.asarray(labels, dtype=np.int64)
+    height, width = image.shape[:2]
+    stamp = _stamp(radius)
+
+    # 全ての点と円のずれの組のピクセル、はみ出したものは除く
+    rows = (points[:, None, 0] + stamp[None, :, 0]).ravel()
+    cols = (points[:, None, 1] + stamp[None, :, 1]).ravel()
+    owner = np.repeat(np.arange(len(points)), len(stamp))
+    inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+    pixels = rows[inside] * width + cols[inside]
+    owner = owner[inside]
+
+    # 同じピクセルに描く点のうち最後の点の色にする
+    last = np.full(height * width, -1, dtype=np.int64)
+    np.maximum.at(last, pixels, owner)
+    painted = np.nonzero(last >= 0)[0]
+    lut = np.asarray(colors, dtype=np.uint8).reshape(-1, 3)
+    image.reshape(-1, image.shape[2])[painted] = lut[labels[last[painted]]]
+    return image
+
+
+def paint_regions(image, label_image, colors, alpha=1.0):
+    """
+    ラベル画像 (高さ, 幅)（-1 は塗らない）のピクセルをそれぞれのラベルの色（colors[ラベル]、BGR）で塗る
+    alpha が1より小さければ元の画像と混ぜる（下地の図面を透かす）
+    image はその場で書き換え、同じ画像を返す
+    """
+    label_image = np.asarray(label_image)
+    painted = label_image >= 0
+    lut = np.asarray(colors, dtype=np.float32).reshape(-1, 3)
+    color = lut[label_image[painted]]
+    if alpha < 1.0:
+        color = image[painted] * (1.0 - alpha) + color * alpha
+    image[painted] = np.rint(color).astype(np.uint8)
+    return image
+
+
+def draw_markers(image, points, color=(0, 0, 255), radius=5):
+    """
+    点 (n, 2) に同じ色（BGR）の塗りつぶした円を描く（入口の印など）
+    """
+    points = np.asarray(points).reshape(-1, 2)
+    return paint_points(image, points, np.zeros(len(points), dtype=np.int64), [color], radius)
+
+
+@functools.lru_cache(maxsize=None)
+def load_font(font_path, size=FONT_SIZE):
+    """
+    フォントを読み込む（同じフォントは一度だけ読み込む、見つからなければ既定のフォントを使う）
+    """
+    from PIL import ImageFont
+
+    try:
+        return ImageFont.truetype(font_path, size)
+    except OSError:
+        return ImageFont.load_default(size)
+
+
+class GlyphCache:
+    """
+    文字列を描いたマスク（濃さ 0〜1 の配列）を、文字列ごとに一度だけ作って使い回す
+    """
+
+    def __init__(self, font_path, size=FONT_SIZE):
+        self.font = load_font(font_path, size)
+        self.glyphs = {}
+
+    def get(self, text):
+        """
+        文字列のマスク (高さ, 幅) と、描く位置から文字の左上までのずれ (行, 列) を返す
+        """
+        glyph = self.glyphs.get(text)
+        if glyph is None:
+            from PIL import Image, ImageDraw
+
+            left, top, right, bottom = self.font.getbbox(text)
+            canvas = Image.new("L", (max(1, right - left), max(1, bottom - top)), 0)
+            ImageDraw.Draw(canvas).text((-left, -top), text, fill=255, font=self.font)
+            glyph = (np.asarray(canvas, dtype=np.float32) / 255.0, (top, left))
+            self.glyphs[text] = glyph
+        return glyph
+
+
+def draw_labels(image, positions, texts, glyphs, color=(0, 0, 0), background=(255, 255, 255), padding=2):
+    """
+    各位置 (x, y)（PIL の draw.text と同じ左上の位置）に文字列を描く
+    background を指定すると、文字の周りに padding だけ広げた四角形で塗ってから描く（None なら塗らない）
+    """
+    height, width = image.shape[:2]
+    color = np.array(color, dtype=np.float32)
+    for (x, y), text in zip(positions, texts):
+        mask, (top, left) = glyphs.get(text)
+        row, col = int(y) + top, int(x) + left
+        if background is not None:
+            r0, c0 = max(0, row - padding), max(0, col - padding)
+            r1, c1 = min(height, row + mask.shape[0] + padding), min(width, col + mask.shape[1] + padding)
+            if r0 < r1 and c0 < c1:
+                image[r0:r1, c0:c1] = background
+        # 画像からはみ出す部分は切り取る
+        r0, c0 = max(0, row), max(0, col)
+        r1, c1 = min(height, row + mask.shape[0]), min(width, col + mask.shape[1])
+        if r0 >= r1 or c0 >= c1:
+            continue
+        alpha = mask[r0 - row:r1 - row, c0 - col:c1 - col, None]
+        region = image[r0:r1, c0:c1].astype(np.float32)
+        image[r0:r1, c0:c1] = np.rint(region * (1.0 - alpha) + color * alpha).astype(np.uint8)
+    return image
+
+
+def save_png(path, image):
+    """
+    BGR の画像を PNG で保存し、パスを返す（画面には表示しない）
+    """
+    import cv2
+
+    if not cv2.imwrite(path, image):
+        raise ValueError(f"画像を保存できません: {path}")
+    return path
+
+
+def save_result(path, image, title="Optimized Store Layout", show=None):
+    """
+    結果の画像を PNG で保存してパスを返す
+    show が True（省略時は環境変数 GA_SHOW=1 のとき）なら画面にも表示し、閉じるまで待つ
+    """
+    save_png(path, image)
+    print(f"結果の画像を保存しました: {path}")
+    if SHOW if show is None else show:
+        import cv2
+
+        cv2.imshow(title, image)
+        cv2.waitKey(0)
+        cv2.destroyAllWindows()
+    return path
@@ -0,0 +1,270 @@
+import importlib
+import os
+import time
+import tracemalloc
+import numpy as np
+
+# 境界線のピクセルのクラスタリング（店舗ごとの区間への分割）
+# KMeans の方法（店舗数に分ける）: kmeans / minibatch / weighted
+#   kmeans: 全ての点で KMeans（これまでと同じ）
+#   minibatch: MiniBatchKMeans に点をチャンクごとに流し込む（一度に持つのはチャンク分だけ）
+#   weighted: 点を DEDUP_CELL ピクセルのセルにまとめ、セルの点の数を重みにして KMeans
+# 密度による方法（DBSCAN と同じ意味のクラスタ）: dbscan / grid
+#   dbscan: sklearn の DBSCAN
+#   grid: 整数座標の点を行ごとに並べ、半径 eps の近傍を行ごとの列の範囲として数えて連結成分を取る
+#         （画像の大きさによらず、点の数にほぼ比例する時間とメモリ）
+# 方法は引数で指定するか、環境変数 GA_KMEANS_BACKEND / GA_DBSCAN_BACKEND で選ぶ
+# どの方法でも、かかった時間を表示する
+# memory=True か環境変数 GA_SEGMENTATION_MEMORY=1 のときは、メモリのピーク（tracemalloc で計測）も表示する
+# （tracemalloc は割り当てごとに記録して遅くなるので、時間は計測しない実行で測り、ピークは別にもう一度実行して測る）
+
+# minibatch で一度に流し込む点の数と、全ての点を流し込む回数
+CHUNK_SIZE = 4096
+EPOCHS = 3
+# weighted で点をまとめるセルの大きさ（ピクセル）
+DEDUP_CELL = 2
+
+
+def _measure(name, n_points, memory, func, *args, **kwargs):
+    # func を実行し、(結果, {"method", "points", "seconds", "peak_mb"}) を返す（memory が False なら peak_mb は None）
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    if memory is None:
+        memory = os.environ.get("GA_SEGMENTATION_MEMORY", "") == "1"
+    peak_mb = _peak_mb(func, *args, **kwargs) if memory else None
+    return result, {"method": name, "points": n_points, "seconds": seconds, "peak_mb": peak_mb}
+
+
+def _peak_mb(func, *args, **kwargs):
+    # tracemalloc で計測しながら func をもう一度実行し、メモリのピーク [MB] を返す
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        func(*args, **kwargs)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+    return peak / 2 ** 20
+
+
+def format_report(report):
+    """
+    計測結果を1行の文字列にする
+    """
+    line = f"クラスタリング ({report['method']}): {report['points']} 点, {report['seconds']:.3f} 秒"
+    if report["peak_mb"] is not None:
+        line += f", メモリのピーク {report['peak_mb']:.1f} MB"
+    return line
+
+
+def kmeans_full(points, n_clusters, random_state=42):
+    """
+    全ての点で KMeans を行い、(ラベル (n,), 重心 (n_clusters, d)) を返す
+    """
+    from sklearn.cluster import KMeans
+
+    kmeans = KMeans(n_clusters=n_clusters, random_state=random_state)
+    kmeans.fit(points)
+    return kmeans.labels_, kmeans.cluster_centers_
+
+
+def kmeans_minibatch(points, n_clusters, random_state=42, chunk_size=CHUNK_SIZE, epochs=EPOCHS):
+    """
+    MiniBatchKMeans に点をチャンクごとに partial_fit で流し込み、ラベルもチャンクごとに求める
+    """
+    from sklearn.cluster import MiniBatchKMeans
+
+    chunk_size = max(chunk_size, n_clusters)
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=random_state, batch_size=chunk_size)
+    rng = np.random.default_rng(random_state)
+    for _ in range(epochs):
+        order = rng.permutation(len(points))
+        for start in range(0, len(points), chunk_size):
+            kmeans.partial_fit(np.asarray(points[np.sort(order[start:start + chunk_size])], dtype=np.float64))
+    labels = np.empty(len(points), dtype=np.int32)
+    for start in range(0, len(points), chunk_size):
+        labels[start:start + chunk_size] = kmeans.predict(np.asarray(points[start:start + chunk_size],
+                                                                     dtype=np.float64))
+    return labels, kmeans.cluster_centers_
+
+
+def kmeans_weighted(points, n_clusters, random_state=42, cell=DEDUP_CELL):
+    """
+    点を cell ピクセルのセルにまとめ、セルの点の平均の位置・点の数の重みで KMeans を行う
+    セルの点は全てセルと同じラベルになる
+    """
+    from sklearn.cluster import KMeans
+
+    points = np.asarray(points)
+    cells, inverse, counts = np.unique(points // cell, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+    sums = np.zeros((len(cells), points.shape[1]))
+    np.add.at(sums, inverse, points)
+    kmeans = KMeans(n_clusters=n_clusters, random_state=random_state)
+    kmeans.fit(sums / counts[:, None], sample_weight=counts)
+    return kmeans.labels_[inverse], kmeans.cluster_centers_
+
+
+def dbscan_sklearn(points, eps, min_samples):
+    """
+    sklearn の DBSCAN のラベル (n,)（ノイズは -1）
+    """
+    from sklearn.cluster import DBSCAN
+
+    return DBSCAN(eps=eps, min_samples=min_samples).fit_predict(points)
+
+
+def _row_spans(eps):
+    # 行のずれ dr = 0〜radius ごとの、距離が eps 以下になる列のずれの最大値 (radius + 1,)
+    radius = int(np.floor(eps))
+    rows = np.arange(radius + 1)
+    spans = np.floor(np.sqrt(np.maximum(eps ** 2 - rows ** 2, 0))).astype(np.int64)
+    # 浮動小数点の誤差で1ずれたときに直す
+    spans = np.where((spans + 1) ** 2 + rows ** 2 <= eps ** 2, spans + 1, spans)
+    spans = np.where(spans ** 2 + rows ** 2 > eps ** 2, spans - 1, spans)
+    return radius, spans
+
+
+def dbscan_grid(points, eps, min_samples):
+    """
+    整数座標の点を DBSCAN と同じ意味でクラスタリングし、ラベル (n,)（ノイズは -1）を返す
+    コア点（距離 eps 以内に自分も含めて min_samples 点以上ある点）とノイズは DBSCAN と同じになる
+    コア点でない点は、距離 eps 以内で最も近いコア点のクラスタにする（DBSCAN では調べた順で決まる）
+    クラスタの番号は、クラスタの最も番号の小さいコア点の順（DBSCAN と同じ）
+    """
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    points = np.asarray(points)
+    if len(points) == 0:
+        return np.zeros(0, dtype=np.int64)
+    if not np.issubdtype(points.dtype, np.integer):
+        if not np.array_equal(points, np.round(points)):
+            raise ValueError("grid には整数座標（ピクセル）の点を渡してください")
+    radius, spans = _row_spans(eps)
+
+    # 点を 行 * width + 列 のキーにし、キーの順（行ごとに列の順）に並べる
+    # 近傍は行のずれごとに「その行の列の範囲」になるので、キーの二分探索で数えられる（格子の画像は作らない）
+    # 同じ座標の点は1つにまとめ、点の数を重みにする
+    rows = points[:, 0].astype(np.int64) - int(points[:, 0].min()) + radius
+    cols = points[:, 1].astype(np.int64) - int(points[:, 1].min()) + radius
+    width = int(cols.max()) + radius + 1
+    keys, inverse, weights = np.unique(rows * width + cols, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+    rows, cols = np.divmod(keys, width)
+    n = len(keys)
+
+    # 近傍の点の数（自分も含む）からコア点を決める
+    cumulative = np.concatenate([[0], np.cumsum(weights)])
+    counts = np.zeros(n, dtype=np.int64)
+    for dr in range(-radius, radius + 1):
+        base = (rows + dr) * width + cols
+        span = spans[abs(dr)]
+        counts += (cumulative[np.searchsorted(keys, base + span, side="right")]
+                   - cumulative[np.searchsorted(keys, base - span, side="left")])
+    core_ids = np.nonzero(counts >= min_samples)[0]
+    core_keys = keys[core_ids]
+    m = len(core_ids)
+
+    # コア点どうしを連結する（下の行と同じ行の右だけ見れば足りる）
+    # 範囲の中のコア点は全て同じクラスタなので、範囲の最初の点への辺と、範囲の中で隣り合うコア点どうしの辺にする
+    sources, targets = [], []
+    chain = np.zeros(m + 1, dtype=np.int64)
+    core_rows, core_cols = rows[core_ids], cols[core_ids]
+    for dr in range(radius + 1):
+        base = (core_rows + dr) * width + core_cols
+        low = np.searchsorted(core_keys, base + (1 if dr == 0 else -spans[dr]), side="left")
+        high = np.searchsorted(core_keys, base + spans[dr], side="right")
+        found = low < high
+        sources.append(np.nonzero(found)[0])
+        targets.append(low[found])
+        chain += np.bincount(low[found], minlength=m + 1) - np.bincount(high[found] - 1, minlength=m + 1)
+    joined = np.nonzero(np.cumsum(chain)[:m - 1] > 0)[0]
+    sources.append(joined)
+    targets.append(joined + 1)
+    sources, targets = np.concatenate(sources), np.concatenate(targets)
+    graph = coo_matrix((np.ones(len(sources), dtype=np.int8), (sources, targets)), shape=(m, m))
+    _, component = connected_components(graph, directed=False)
+
+    # コア点のラベルは連結成分の番号（最後に振り直す）
+    labels = np.full(n, -1, dtype=np.int64)
+    labels[core_ids] = component
+
+    # コア点でない点は、距離 eps 以内で最も近いコア点のクラスタにする
+    # 行のずれごとに、その行で列が最も近いコア点（左右の1点ずつ）を調べる
+    pending = np.setdiff1d(np.arange(n), core_ids, assume_unique=True)
+    if m and len(pending):
+        best = np.full(len(pending), np.inf)
+        for dr in range(-radius, radius + 1):
+            target_row = rows[pending] + dr
+            position = np.searchsorted(core_keys, target_row * width + cols[pending])
+            for candidate in (position - 1, position):
+                valid = (candidate >= 0) & (candidate < m)
+                candidate = np.clip(candidate, 0, m - 1)
+                column_gap = np.abs(core_cols[candidate] - cols[pending])
+                valid &= (core_rows[candidate] == target_row) & (column_gap <= spans[abs(dr)])
+                distance = np.where(valid, dr * dr + column_gap.astype(np.float64) ** 2, np.inf)
+                closer = distance < best
+                best[closer] = distance[closer]
+                labels[pending[closer]] = component[candidate[closer]]
+
+    # 元の点の順に戻し、クラスタの番号を元の点の番号で最も小さいコア点の順に振り直す
+    labels = labels[inverse]
+    is_core = np.zeros(n, dtype=bool)
+    is_core[core_ids] = True
+    core_points = np.nonzero(is_core[inverse])[0]
+    if len(core_points):
+        first_core = np.full(m, len(points), dtype=np.int64)
+        np.minimum.at(first_core, labels[core_points], core_points)
+        roots = np.nonzero(first_core < len(points))[0]
+        rank = np.full(m, -1, dtype=np.int64)
+        rank[roots[np.argsort(first_core[roots])]] = np.arange(len(roots))
+        clustered = labels >= 0
+        labels[clustered] = rank[labels[clustered]]
+    return labels
+
+
+KMEANS_BACKENDS = {"kmeans": kmeans_full, "minibatch": kmeans_minibatch, "weighted": kmeans_weighted}
+DBSCAN_BACKENDS = {"dbscan": dbscan_sklearn, "grid": dbscan_grid}
+# 方法ごとに使うライブラリ（計測に import の時間を含めないように先に読み込む）
+BACKEND_MODULES = {"kmeans": "sklearn.cluster", "minibatch": "sklearn.cluster", "weighted": "sklearn.cluster",
+                   "dbscan": "sklearn.cluster", "grid": "scipy.sparse.csgraph"}
+
+
+def _backend(backends, method, env, default):
+    method = method or os.environ.get(env, default)
+    if method not in backends:
+        raise ValueError(f"不明なクラスタリングの方法です: {method}（{' / '.join(backends)}）")
+    importlib.import_module(BACKEND_MODULES[method])
+    return method
+
+
+def cluster_kmeans(points, n_clusters, method=None, random_state=42, verbose=True, memory=None, **options):
+    """
+    点を n_clusters 個に分け、(ラベル (n,), 重心 (n_clusters, d), 計測結果) を返す
+    method: kmeans / minibatch / weighted（省略時は環境変数 GA_KMEANS_BACKEND、なければ kmeans）
+    memory: メモリのピークも測るか（省略時は環境変数 GA_SEGMENTATION_MEMORY=1 のとき）
+    """
+    method = _backend(KMEANS_BACKENDS, method, "GA_KMEANS_BACKEND", "kmeans")
+    (labels, centers), report = _measure(method, len(points), memory, KMEANS_BACKENDS[method], points, n_clusters,
+                                         random_state=random_state, **options)
+    if verbose:
+        print(format_report(report))
+    return labels, centers, report
+
+
+def cluster_dbscan(points, eps, min_samples, method=None, verbose=True, memory=None):
+    """
+    点を DBSCAN と同じ意味でクラスタリングし、(ラベル (n,)（ノイズは -1）, 計測結果) を返す
+    method: dbscan / grid（省略時は環境変数 GA_DBSCAN_BACKEND、なければ grid）
+    memory: メモリのピークも測るか（省略時は環境変数 GA_SEGMENTATION_MEMORY=1 のとき）
+    """
+    method = _backend(DBSCAN_BACKENDS, method, "GA_DBSCAN_BACKEND", "grid")
+    labels, report = _measure(method, len(points), memory, DBSCAN_BACKENDS[method], points, eps, min_samples)
+    if verbose:
+        print(format_report(report))
+    return labels, report
@@ -0,0 +1,168 @@
+import numpy as np
+
+# 空間インデックス
+# 店舗同士の近接（距離がしきい値未満の組）と重なり（長方形が重なる組）を、
+# 全ての組を調べずに近くの候補だけから求める
+# どのインデックスも、総当たりと同じ組（i < j）を返す
+
+
+def _pair_distance(xy, i, j):
+    # ga_main.eval_shop と同じ式で距離を計算する（しきい値の判定を総当たりと一致させるため）
+    return np.sqrt((xy[i, 0] - xy[j, 0]) ** 2 + (xy[i, 1] - xy[j, 1]) ** 2)
+
+
+def _ragged_ranges(starts, stops):
+    # 各 k について starts[k] から stops[k] までの連番をつなげた配列と、その k を返す
+    counts = np.maximum(stops - starts, 0)
+    owner = np.repeat(np.arange(len(starts)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owner, np.repeat(starts, counts) + offsets
+
+
+def _overlap_mask(coords, i, j):
+    # 長方形 i と j が重なっているか（ga_main.eval_shop と同じ条件）
+    x, y, width, height = coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3]
+    return ((x[i] < x[j] + width[j]) & (x[i] + width[i] > x[j])
+            & (y[i] < y[j] + height[j]) & (y[i] + height[i] > y[j]))
+
+
+def _ordered(i, j):
+    # 組を i < j の向きにそろえる
+    return np.minimum(i, j), np.maximum(i, j)
+
+
+class BruteForceIndex:
+    """
+    総当たりで組を求める（店舗数が少ないときはこれが最も速い）
+    メモリを抑えるため、行のブロックごとに調べる
+    """
+
+    BLOCK_ROWS = 1024
+
+    def _block_pairs(self, n):
+        # i < j の全ての組を、i のブロックごとに返す
+        for start in range(0, n, self.BLOCK_ROWS):
+            stop = min(n, start + self.BLOCK_ROWS)
+            i, j = np.nonzero(np.arange(start, stop)[:, None] < np.arange(n)[None, :])
+            yield i + start, j
+
+    def near_pairs(self, xy, radius):
+        """
+        距離が radius 未満の店舗の組 (i, j, 距離) を返す（i < j）
+        """
+        pairs_i, pairs_j, dists = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)], [np.empty(0)]
+        for i, j in self._block_pairs(len(xy)):
+            dist = _pair_distance(xy, i, j)
+            keep = dist < radius
+            pairs_i.append(i[keep])
+            pairs_j.append(j[keep])
+            dists.append(dist[keep])
+        return np.concatenate(pairs_i), np.concatenate(pairs_j), np.concatenate(dists)
+
+    def overlap_pairs(self, coords):
+        """
+        長方形が重なっている店舗の組 (i, j) を返す（i < j）
+        """
+        pairs_i, pairs_j = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+        for i, j in self._block_pairs(len(coords)):
+            keep = _overlap_mask(coords, i, j)
+            pairs_i.append(i[keep])
+            pairs_j.append(j[keep])
+        return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+
+class SweepIndex(BruteForceIndex):
+    """
+    x座標で並べ替え、x方向の区間が重なる組だけを調べる（sweep and prune）
+    """
+
+    def near_pairs(self, xy, radius):
+        order = np.argsort(xy[:, 0], kind="stable")
+        xs = xy[order, 0]
+        # 並べ替えた後で自分より後ろにあり、x の差が radius 未満の店舗が候補
+        stops = np.searchsorted(xs, xs + radius, side="left")
+        a, b = _ragged_ranges(np.arange(1, len(xs) + 1), stops)
+        i, j = _ordered(order[a], order[b])
+        dist = _pair_distance(xy, i, j)
+        keep = dist < radius
+        return i[keep], j[keep], dist[keep]
+
+    def overlap_pairs(self, coords):
+        order = np.argsort(coords[:, 0], kind="stable")
+        xs = coords[order, 0]
+        # 自分より後ろにあり、x が自分の右端より左にある長方形が候補
+        stops = np.searchsorted(xs, xs + coords[order, 2], side="left")
+        a, b = _ragged_ranges(np.arange(1, len(xs) + 1), stops)
+        i, j = _ordered(order[a], order[b])
+        keep = _overlap_mask(coords, i, j)
+        return i[keep], j[keep]
+
+
+class GridIndex(SweepIndex):
+    """
+    radius 四方の一様グリッドに店舗を振り分け、隣接するセルの店舗だけを調べる（grid hash）
+    重なりの判定は SweepIndex と同じ
+    """
+
+    # 自分のセルと、重複なく隣を調べるための半分の近傍
+    NEIGHBOR_OFFSETS = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+
+    def near_pairs(self, xy, radius):
+        if len(xy) < 2:
+            return super().near_pairs(xy, radius)
+        cells = np.floor((xy - xy.min(axis=0)) / radius).astype(np.int64) + 1
+        height = cells[:, 1].max() + 2
+        keys = cells[:, 0] * height + cells[:, 1]
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+
+        pairs_i, pairs_j = [], []
+        for dx, dy in self.NEIGHBOR_OFFSETS:
+            target = keys + dx * height + dy
+            starts = np.searchsorted(sorted_keys, target, side="left")
+            stops = np.searchsorted(sorted_keys, target, side="right")
+            a, b = _ragged_ranges(starts, stops)
+            b = order[b]
+            if dx == 0 and dy == 0:
+                keep = a < b  # 同じセルの中は1組を1回だけ数える
+                a, b = a[keep], b[keep]
+            pairs_i.append(a)
+            pairs_j.append(b)
+
+        i, j = _ordered(np.concatenate(pairs_i), np.concatenate(pairs_j))
+        dist = _pair_distance(xy, i, j)
+        keep = dist < radius
+        return i[keep], j[keep], dist[keep]
+
+
+class KDTreeIndex(SweepIndex):
+    """
+    scipy の cKDTree で半径内の組を求める
+    重なりの判定は SweepIndex と同じ
+    """
+
+    def near_pairs(self, xy, radius):
+        from scipy.spatial import cKDTree
+
+        pairs = cKDTree(xy).query_pairs(radius, output_type="ndarray")
+        i, j = _ordered(pairs[:, 0], pairs[:, 1])
+        dist = _pair_distance(xy, i, j)
+        keep = dist < radius  # query_pairs は距離が radius ちょうどの組も含む
+        return i[keep], j[keep], dist[keep]
+
+
+SPATIAL_INDEXES = {
+    "brute": BruteForceIndex,
+    "sweep": SweepIndex,
+    "grid": GridIndex,
+    "kdtree": KDTreeIndex,
+}
+
+
+def make_index(name):
+    """
+    名前（brute / sweep / grid / kdtree）から空間インデックスを作る
+    """
+    if name not in SPATIAL_INDEXES:
+        raise ValueError(f"空間インデックスは {list(SPATIAL_INDEXES)} のいずれかを指定してください: {name}")
+    return SPATIAL_INDEXES[name]()
@@ -0,0 +1,100 @@
+import csv
+import json
+import os
+import time
+import numpy as np
+from population import ArrayPopulation
+
+# 環境変数 GA_DEBUG を設定すると、評価の詳細などデバッグ用の出力をする
+DEBUG = bool(os.environ.get("GA_DEBUG"))
+# 書き込みのバッファの大きさ（バイト）
+BUFFER_SIZE = 1 << 16
+FIELDS = ["gen", "nevals", "evals", "avg", "std", "min", "max", "diversity", "seconds", "elapsed"]
+
+
+def genome_key(individual):
+    """
+    個体の内容のキー（ga_main のように入れ子のリストの個体にも使える）
+    """
+    return tuple(tuple(item) if isinstance(item, list) else item for item in individual)
+
+
+def _fitness_array(population):
+    if isinstance(population, ArrayPopulation):
+        return population.fitness
+    return np.fromiter((ind.fitness.values[0] for ind in population), dtype=np.float64, count=len(population))
+
+
+def _unique_count(population, key):
+    # 内容の異なる個体の数
+    if isinstance(population, ArrayPopulation):
+        # 遺伝子ごとに行を番号にし、全ての遺伝子の番号の組で数える
+        inverses = []
+        for array in population.genes.values():
+            rows = np.ascontiguousarray(array.reshape(len(array), -1))
+            rows = rows.view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[1]))).ravel()
+            inverses.append(np.unique(rows, return_inverse=True)[1].ravel())
+        return len(np.unique(np.stack(inverses, axis=1), axis=0))
+    return len({key(ind) for ind in population})
+
+
+class StatsLogger:
+    """
+    世代ごとの統計（評価値の平均・標準偏差・最小・最大、多様性、評価回数、時間）をファイルに書き出す
+    path の拡張子が .csv なら CSV、それ以外は JSON Lines で、バッファ付きで書き込む
+    多様性は内容の異なる個体の割合（1.0 なら全て異なる）、evals はそれまでの評価回数の合計
+    ロガーを渡さなければ世代ループは何もしないので、使わないときの負担はない
+    """
+
+    def __init__(self, path, key=genome_key, diversity=True, buffer_size=BUFFER_SIZE):
+        self.path = path
+        self.key = key
+        self.diversity = diversity
+        self.csv = path.endswith(".csv")
+        self._file = open(path, "w", buffering=buffer_size, newline="" if self.csv else None)
+        self._writer = csv.DictWriter(self._file, fieldnames=FIELDS) if self.csv else None
+        if self._writer is not None:
+            self._writer.writeheader()
+        self.start_time = time.perf_counter()
+        self.last_time = self.start_time
+        self.evals = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def record(self, gen, nevals, population):
+        """
+        1世代分の統計を計算して書き出し、その内容を返す
+        """
+        now = time.perf_counter()
+        fitness = _fitness_array(population)
+        self.evals += nevals
+        entry = {"gen": gen, "nevals": nevals, "evals": self.evals, "avg": float(fitness.mean()),
+                 "std": float(fitness.std()), "min": float(fitness.min()), "max": float(fitness.max()),
+                 "diversity": _unique_count(population, self.key) / len(fitness) if self.diversity else None,
+                 "seconds": now - self.last_time, "elapsed": now - self.start_time}
+        self.last_time = now
+        if self._writer is not None:
+            self._writer.writerow(entry)
+        else:
+            self._file.write(json.dumps(entry) + "\n")
+        return entry
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+def make_stats_logger(path=None, **kwargs):
+    """
+    path（指定がなければ環境変数 GA_STATS_LOG）に書き出す StatsLogger を返す
+    どちらも指定されていなければ None を返す
+    """
+    path = path or os.environ.get("GA_STATS_LOG")
+    if not path:
+        return None
+    return StatsLogger(path, **kwargs)
@@ -0,0 +1,238 @@
+import copy
+import glob
+import hashlib
+import importlib
+import itertools
+import json
+import os
+import random
+import tempfile
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+# 条件を変えて ga_floor / ga_main を何度も実行し、結果を列ごとの配列でディレクトリに追記していく
+# 条件（シナリオ）は {"stage": "floors" / "layout", パラメータ...} の辞書
+#   floors: mode（sequence / counts / exact）, pop, gens, floor_capacities, shop_types, shop_constraints,
+#           preferred_floor（辞書は ga_floor の既定値に上書きする）
+#   layout: pop, gens, num_shops
+#   共通: seed（省略時はシナリオの内容から決める）, stall, max_seconds（途中で止める条件）
+# 結果は part-00000.npz, part-00001.npz, ... に何件かずつまとめて書き出し、既にあるシナリオは実行しない
+# （途中で止めても、もう一度実行すれば続きから再開できる）
+
+STAGES = ("floors", "layout")
+# 結果の列
+COLUMNS = ("scenario_id", "name", "stage", "seed", "fitness", "seconds", "params", "result")
+# 何件ごとに結果を書き出すか
+FLUSH_EVERY = 10
+
+# ga_floor の既定の条件（プロセスごとに最初に読み込んだときの値）
+_floor_defaults = None
+
+
+def scenario_id(scenario):
+    """
+    シナリオの内容（name を除く）から決まる ID（seed だけが違うシナリオは別のシナリオになる）
+    """
+    params = {key: value for key, value in scenario.items() if key != "name"}
+    text = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def scenario_seed(scenario, base_seed=0):
+    """
+    シナリオの乱数のシード（seed を指定していればその値、なければ base_seed と ID から決める）
+    """
+    if scenario.get("seed") is not None:
+        return int(scenario["seed"])
+    digest = hashlib.sha1(f"{base_seed}:{scenario_id(scenario)}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "little")
+
+
+def expand_grid(base=None, grid=None):
+    """
+    base の条件に、grid の各パラメータの値の全ての組み合わせを加えたシナリオのリストを返す
+    例: expand_grid({"stage": "floors"}, {"pop": [50, 100], "gens": [50, 100]}) は4つのシナリオ
+    """
+    base = base or {}
+    grid = grid or {}
+    keys = list(grid)
+    return [dict(base, **dict(zip(keys, values))) for values in itertools.product(*(grid[key] for key in keys))]
+
+
+def load_spec(path):
+    """
+    シナリオの定義ファイル（JSON）を読み込んでシナリオのリストを返す
+    シナリオのリスト、または {"base": {...}, "grid": {...}, "scenarios": [...]}（どれも省略できる）
+    scenarios の各シナリオにも base の条件を加える
+    """
+    with open(path) as f:
+        spec = json.load(f)
+    if isinstance(spec, list):
+        return spec
+    base = spec.get("base", {})
+    scenarios = [dict(base, **scenario) for scenario in spec.get("scenarios", [])]
+    if "grid" in spec:
+        scenarios += expand_grid(base, spec["grid"])
+    return scenarios
+
+
+def _import_stage(name):
+    # ga_floor と ga_main は同じ名前の creator のクラスを作るので、同じプロセスで両方読み込むと警告が出る
+    # （それぞれの toolbox は読み込んだときのクラスを使うので、上書きされても結果は変わらない）
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return importlib.import_module(name)
+
+
+def _termination(scenario):
+    if scenario.get("stall") is None and scenario.get("max_seconds") is None:
+        return None
+    from termination import Termination
+    return Termination(stall_gens=scenario.get("stall"), max_seconds=scenario.get("max_seconds"), verbose=False)
+
+
+def _run_floors(scenario):
+    global _floor_defaults
+    ga_floor = _import_stage("ga_floor")
+
+    if _floor_defaults is None:
+        _floor_defaults = copy.deepcopy((ga_floor.floor_capacities, ga_floor.shop_types, ga_floor.shop_constraints,
+                                         ga_floor.preferred_floor))
+    capacities, types, constraints, preferred = copy.deepcopy(_floor_defaults)
+    types.update(scenario.get("shop_types", {}))
+    constraints.update(scenario.get("shop_constraints", {}))
+    preferred.update(scenario.get("preferred_floor", {}))
+    ga_floor.configure(scenario.get("floor_capacities", capacities), types, constraints, preferred)
+
+    pop_size = scenario.get("pop", ga_floor.POP_SIZE)
+    gens = scenario.get("gens", ga_floor.GENS)
+    mode = scenario.get("mode", "sequence")
+    if mode == "sequence":
+        best_individual, floor_assignments = ga_floor.run(pop_size=pop_size, gens=gens,
+                                                          termination=_termination(scenario))
+        fitness = best_individual.fitness.values[0]
+    elif mode == "counts":
+        fitness, floor_assignments = ga_floor.run_counts(pop_size=pop_size, gens=gens,
+                                                         termination=_termination(scenario))
+    elif mode == "exact":
+        fitness, floor_assignments = ga_floor.solve()
+    else:
+        raise ValueError(f"不明な mode です: {mode}")
+    return fitness, {"floors": floor_assignments}
+
+
+def _run_layout(scenario):
+    ga_main = _import_stage("ga_main")
+    ga_main.set_num_shops(scenario.get("num_shops", 10))
+    best_ind = ga_main.run(pop_size=scenario.get("pop", 300), ngen=scenario.get("gens", 60), json_path=None,
+                           verbose=False, termination=_termination(scenario))
+    return ga_main.eval_shop(best_ind)[0], {"layout": [list(store) for store in best_ind]}
+
+
+RUNNERS = {
+    "floors": _run_floors,
+    "layout": _run_layout,
+}
+
+
+def run_scenario(scenario, base_seed=0):
+    """
+    1つのシナリオを実行し、結果の1行（COLUMNS の辞書）を返す（プロセスプールの各プロセスで呼ばれる）
+    """
+    stage = scenario.get("stage", "floors")
+    if stage not in RUNNERS:
+        raise ValueError(f"不明な stage です: {stage}（{' / '.join(STAGES)}）")
+    seed = scenario_seed(scenario, base_seed)
+    random.seed(seed)
+    np.random.seed(seed)
+    start = time.perf_counter()
+    fitness, result = RUNNERS[stage](scenario)
+    return {
+        "scenario_id": scenario_id(scenario),
+        "name": scenario.get("name", ""),
+        "stage": stage,
+        "seed": seed,
+        "fitness": float(fitness),
+        "seconds": time.perf_counter() - start,
+        "params": json.dumps(scenario, sort_keys=True, ensure_ascii=False),
+        "result": json.dumps(result, ensure_ascii=False, default=float),
+    }
+
+
+def _part_paths(out_dir):
+    return sorted(glob.glob(os.path.join(out_dir, "part-*.npz")))
+
+
+def load_results(out_dir):
+    """
+    これまでの結果を全て読み込み、{列名: 配列} を返す
+    """
+    parts = []
+    for path in _part_paths(out_dir):
+        with np.load(path) as data:
+            parts.append({column: data[column] for column in COLUMNS})
+    if not parts:
+        return {column: np.array([]) for column in COLUMNS}
+    return {column: np.concatenate([part[column] for part in parts]) for column in COLUMNS}
+
+
+def _write_part(out_dir, rows):
+    # 結果の行を列ごとの配列にし、新しい part ファイルに書き出す（一時ファイルに書いてから置き換える）
+    paths = _part_paths(out_dir)
+    index = int(os.path.basename(paths[-1])[5:10]) + 1 if paths else 0
+    columns = {column: np.array([row[column] for row in rows]) for column in COLUMNS}
+    fd, tmp_path = tempfile.mkstemp(dir=out_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **columns)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(out_dir, f"part-{index:05d}.npz"))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def run_sweep(scenarios, out_dir, workers=None, base_seed=0, flush_every=FLUSH_EVERY, verbose=True):
+    """
+    シナリオをプロセスプールで実行し、終わったものから out_dir に追記する
+    out_dir に既に結果があるシナリオ（同じ ID）は実行しない
+    実行したシナリオの数を返す
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    done = set(load_results(out_dir)["scenario_id"].tolist())
+    pending = {}
+    for scenario in scenarios:
+        key = scenario_id(scenario)
+        if key not in done:
+            pending.setdefault(key, scenario)
+    if verbose:
+        print(f"sweep: {len(pending)} scenarios to run ({len(done)} already in {out_dir})")
+    if not pending:
+        return 0
+
+    rows = []
+    completed = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_scenario, scenario, base_seed) for scenario in pending.values()]
+        try:
+            for future in as_completed(futures):
+                row = future.result()
+                rows.append(row)
+                completed += 1
+                if verbose:
+                    print(f"[{completed}/{len(futures)}] {row['stage']} {row['name'] or row['scenario_id']}: "
+                          f"fitness={row['fitness']} ({row['seconds']:.2f}s)")
+                if len(rows) >= flush_every:
+                    _write_part(out_dir, rows)
+                    rows = []
+        finally:
+            # 止めたときや失敗したときも、終わった分は書き出しておく
+            if rows:
+                _write_part(out_dir, rows)
+            for future in futures:
+                future.cancel()
+    return completed
@@ -0,0 +1,80 @@
+import math
+import time
+from population import ArrayPopulation, clone_individual
+
+
+def _best_of(population):
+    # 集団の中で最も良い個体の (重み付きの評価値, 個体のコピー, 重み) を返す
+    if isinstance(population, ArrayPopulation):
+        best = population.best()
+        return population.fitness[best] * population.weight, lambda: population.take([best]), population.weight
+    best = max((ind for ind in population if ind.fitness.valid), key=lambda ind: ind.fitness.wvalues)
+    return best.fitness.wvalues[0], lambda: clone_individual(best), best.fitness.weights[0]
+
+
+class Termination:
+    """
+    GAの世代ループを途中で止める条件をまとめたもの（どれも指定しなければ止めない）
+    stall_gens: 最も良い評価値が stall_gens 世代の間に epsilon より大きく良くならなければ止める
+    max_seconds: 経過時間（秒）の上限
+    max_evals: 評価回数の上限
+    target: この評価値に達したら止める（評価値の大小は個体の重みに合わせて判断する）
+    止めたときに備えて、これまでで最も良い個体（best）を持っておく
+    """
+
+    def __init__(self, stall_gens=None, epsilon=0.0, max_seconds=None, max_evals=None, target=None, verbose=True):
+        self.stall_gens = stall_gens
+        self.epsilon = epsilon
+        self.max_seconds = max_seconds
+        self.max_evals = max_evals
+        self.target = target
+        self.verbose = verbose
+        self.reset()
+
+    def reset(self):
+        """
+        経過時間、評価回数、最も良い個体を初期化する
+        """
+        self.start_time = time.perf_counter()
+        self.evals = 0
+        self.best = None            # これまでで最も良い個体（ArrayPopulation なら1個体の集団）
+        self.best_value = -math.inf  # その重み付きの評価値
+        self.weight = 1.0
+        self.stall_value = -math.inf
+        self.last_improvement = 0
+        self.reason = None
+
+    @property
+    def best_fitness(self):
+        return self.best_value / self.weight
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def update(self, gen, nevals, population):
+        """
+        世代ごとに評価の後で呼び、止める理由（"stall" / "time" / "evals" / "target"）を返す
+        止めないときは None を返す
+        """
+        self.evals += nevals
+        value, copy_best, self.weight = _best_of(population)
+        if value > self.best_value:
+            self.best_value = value
+            self.best = copy_best()
+        if value > self.stall_value + self.epsilon:
+            self.stall_value = value
+            self.last_improvement = gen
+
+        if self.target is not None and self.best_value >= self.target * self.weight:
+            self.reason = "target"
+        elif self.stall_gens is not None and gen - self.last_improvement >= self.stall_gens:
+            self.reason = "stall"
+        elif self.max_evals is not None and self.evals >= self.max_evals:
+            self.reason = "evals"
+        elif self.max_seconds is not None and self.elapsed >= self.max_seconds:
+            self.reason = "time"
+        if self.reason is not None and self.verbose:
+            print(f"termination: {self.reason} at generation {gen} "
+                  f"(evals={self.evals}, {self.elapsed:.1f}s, best={self.best_fitness})")
+        return self.reason
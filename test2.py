@@ -1,102 +1,117 @@
-import cv2
+import os
 import numpy as np
 import random
 from deap import base, creator, tools, algorithms
-from sklearn.cluster import KMeans
+from fitness_cache import cached_map, sequence_key
+from population import sel_tournament, clone_individual
+from ga_backend import make_backend, get_shared
+from termination import Termination
+from stats_logger import DEBUG, make_stats_logger
+from floor_grid import load_plan_boundary, load_plan_image
+from cluster_index import ClusterIndex, entry_distances
+from segmentation import cluster_kmeans
+from render import paint_points, draw_markers, save_result
 
 # 画像を読み込む
-image_path = "./high_res_screenshot.jpg"  # アップロードした画像のパス
-image = cv2.imread(image_path)
+image_path = os.environ.get("GA_PLAN", "./high_res_screenshot.jpg")  # フロアの画像か、エディタで保存した図面（dbfiles/*.db）のパス
+output_path = os.environ.get("GA_OUTPUT", "./test2_result.png")  # 結果の画像を保存するパス（GA_SHOW=1 なら画面にも表示）
 
 # BGR色空間で指定された色範囲を定義
 target_color_bgr = np.array([183,66,67])  # BGR形式で指定
 threshold = 10  # 色の範囲の許容誤差
 
-# 指定色の周辺の範囲を定義
-lower_bound = target_color_bgr - threshold
-upper_bound = target_color_bgr + threshold
-
-# マスクを作成
-mask = cv2.inRange(image, lower_bound, upper_bound)
-
-# マスクから輪郭を検出
-contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-# 黒色の背景に輪郭を描画（デバッグ用）
-boundary_image = np.zeros_like(image)
-cv2.drawContours(boundary_image, contours, -1, (255, 255, 255), 2)
-
-# 境界線のピクセル座標を取得
-boundary_points = np.column_stack(np.where(boundary_image > 0))
-
 # 店の数
 NUM_SHOPS = 10
 
-# KMeansクラスタリングを使ってboundary_pointsをNUM_SHOPS個に分割
-kmeans = KMeans(n_clusters=NUM_SHOPS, random_state=42)
-kmeans.fit(boundary_points)
-labels = kmeans.labels_
-
-# 各クラスタに対して色をランダムに割り当て
-colors = np.random.randint(0, 255, size=(NUM_SHOPS, 3))
-
 # GAの設定
 POP_SIZE = 50     # 個体数
 GENS = 100        # 世代数
+# この世代数の間、最も良い評価値が良くならなければ止める（None なら GENS まで続ける）
+STALL_GENS = None
 
 # 評価関数（店舗の入口とクラスタの重心との距離が短いほど良い）
+# 個体の i 番目の値は店舗 i（クラスタ i）の入口にする境界線の点の番号
 def evaluate(individual):
-    distance_sum = 0
-    for shop_id, shop_entry in enumerate(individual):
-        # クラスタに属する全ての点の重心を計算
-        cluster_points = boundary_points[labels == shop_id]
-        cluster_center = np.mean(cluster_points, axis=0)
-
-        # 入口とクラスタの重心との距離を計算
-        distance_sum += np.sqrt(np.sum((shop_entry - cluster_center) ** 2))
-
-    print(f"Individual: {individual}, Fitness: {distance_sum}")  # 評価の詳細を表示
-    return distance_sum,
+    return evaluate_population([individual])[0]
+
+def evaluate_population(population):
+    """
+    集団をまとめて評価する（全ての入口の座標を一度に取り出し、重心との距離をまとめて計算する）
+    """
+    # boundary_points と各クラスタの重心（最初に一度だけ計算したもの）は共有メモリに置いたものを参照する
+    distances = entry_distances(get_shared("boundary_points"), get_shared("centroids"), population)
+    if DEBUG:
+        # 評価の詳細を表示（環境変数 GA_DEBUG を設定したときだけ）
+        for individual, distance_sum in zip(population, distances):
+            print(f"Individual: {individual}, Fitness: {distance_sum}")
+    return [(float(distance_sum),) for distance_sum in distances]
+
+# toolbox.map（batch_map や評価の backend）から集団ごとに呼ばれる
+evaluate.batch = evaluate_population
 
 # 遺伝子表現：各店舗の入口位置を選ぶ
 creator.create("FitnessMin", base.Fitness, weights=(-1.0,))
 creator.create("Individual", list, fitness=creator.FitnessMin)
 
 toolbox = base.Toolbox()
-toolbox.register("attr_int", random.randint, 0, len(boundary_points) - 1)
-toolbox.register("individual", tools.initRepeat, creator.Individual, toolbox.attr_int, n=NUM_SHOPS)
-toolbox.register("population", tools.initRepeat, list, toolbox.individual)
-
 toolbox.register("evaluate", evaluate)
 toolbox.register("mate", tools.cxTwoPoint)
-toolbox.register("mutate", tools.mutUniformInt, low=0, up=len(boundary_points) - 1, indpb=0.2)
-toolbox.register("select", tools.selTournament, tournsize=3)
-
-# GAの実行
-population = toolbox.population(n=POP_SIZE)
-for gen in range(GENS):
-    offspring = algorithms.varAnd(population, toolbox, cxpb=0.5, mutpb=0.2)
-    fits = map(toolbox.evaluate, offspring)
-    for fit, ind in zip(fits, offspring):
-        ind.fitness.values = fit
-    population = toolbox.select(offspring, k=len(population))
-
-# 最適な配置の取得
-best_individual = tools.selBest(population, k=1)[0]
-print(f"Generation {gen}, Best fitness: {best_individual.fitness.values[0]}")
-best_entries = [boundary_points[entry] for entry in best_individual]
-
-# 結果を画像に描画
-for shop_id, shop_entry in enumerate(best_entries):
-    cluster_points = boundary_points[labels == shop_id]
-    # クラスタのポイントをその店に対応する色で描画
-    for point in cluster_points:
-        cv2.circle(image, (point[1], point[0]), 1, colors[shop_id].tolist(), -1)
-
-    # 店の入口（GAで選ばれた位置）を赤で描画
-    cv2.circle(image, (shop_entry[1], shop_entry[0]), 5, (0, 0, 255), -1)
-
-# 結果を表示
-cv2.imshow("Optimized Store Layout", image)
-cv2.waitKey(0)
-cv2.destroyAllWindows()
+# トーナメントは評価値の配列上でまとめて行い、複製は deepcopy せずに要素だけコピーする
+toolbox.register("select", sel_tournament, tournsize=3)
+toolbox.register("clone", clone_individual)
+
+if __name__ == "__main__":
+    image = load_plan_image(image_path)
+
+    # 境界線の輪郭とピクセル座標を取得（画像なら boundary.py で画像ごとにキャッシュ、図面のデータベースなら道のセルから作る）
+    contours, boundary_points, _ = load_plan_boundary(image_path, target_color_bgr, threshold)
+
+    # KMeansクラスタリングを使ってboundary_pointsをNUM_SHOPS個に分割
+    # （環境変数 GA_KMEANS_BACKEND で kmeans / minibatch / weighted を選択、時間を表示）
+    labels, _, _ = cluster_kmeans(boundary_points, NUM_SHOPS)
+    # クラスタごとの点の番号と重心を一度だけ求めておく（ラベルはこの後変わらない）
+    cluster_index = ClusterIndex(boundary_points, labels, NUM_SHOPS)
+
+    # 各クラスタに対して色をランダムに割り当て
+    colors = np.random.randint(0, 255, size=(NUM_SHOPS, 3))
+
+    toolbox.register("attr_int", random.randint, 0, len(boundary_points) - 1)
+    toolbox.register("individual", tools.initRepeat, creator.Individual, toolbox.attr_int, n=NUM_SHOPS)
+    toolbox.register("population", tools.initRepeat, list, toolbox.individual)
+    toolbox.register("mutate", tools.mutUniformInt, low=0, up=len(boundary_points) - 1, indpb=0.2)
+
+    # 評価の実行方法（環境変数 GA_BACKEND で serial / thread / process を選択）
+    # boundary_points と重心は共有メモリに一度だけ置き、ワーカーはそれを参照する
+    with make_backend(shared={"boundary_points": boundary_points, "centroids": cluster_index.centroids}) as backend:
+        # 環境変数 GA_FITNESS_CACHE を設定すると、同じ内容の個体の評価を省く
+        toolbox.register("map", cached_map(backend.map, sequence_key))
+
+        # GAの実行
+        termination = Termination(stall_gens=STALL_GENS)
+        # 環境変数 GA_STATS_LOG にファイル名（.jsonl / .csv）を指定すると、世代ごとの統計を書き出す
+        stats_logger = make_stats_logger()
+        population = toolbox.population(n=POP_SIZE)
+        for gen in range(GENS):
+            offspring = algorithms.varAnd(population, toolbox, cxpb=0.5, mutpb=0.2)
+            fits = toolbox.map(toolbox.evaluate, offspring)
+            for fit, ind in zip(fits, offspring):
+                ind.fitness.values = fit
+            population = toolbox.select(offspring, k=len(population))
+            if stats_logger is not None:
+                stats_logger.record(gen + 1, len(offspring), population)
+            if termination.update(gen + 1, len(offspring), population):
+                break
+    if stats_logger is not None:
+        stats_logger.close()
+
+    # 最適な配置の取得（止めた世代までで最も良い個体）
+    best_individual = termination.best
+    print(f"Generation {gen}, Best fitness: {best_individual.fitness.values[0]}")
+    best_entries = [boundary_points[entry] for entry in best_individual]
+
+    # 結果を画像に描画（クラスタのポイントをその店に対応する色で、店の入口（GAで選ばれた位置）を赤で）
+    paint_points(image, boundary_points, labels, colors)
+    draw_markers(image, best_entries)
+
+    # 結果を保存
+    save_result(output_path, image)
@@ -0,0 +1,40 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from capacity_partition import TOLERANCE, target_counts, partition_mask
+from floor_grid import load_shop_area
+
+# 店舗エリアのマスクを分けたときに、各店舗の面積（ピクセル数）がキャパシティの比の TOLERANCE 以内になるか
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dbfiles", "test.db")
+
+
+def _assert_areas(mask, capacities):
+    labels, sites, weights, report = partition_mask(mask, capacities, verbose=False)
+    assert report["converged"]
+    assert np.all(labels[~mask] == -1)
+    areas = np.bincount(labels[mask], minlength=len(capacities))
+    targets = target_counts(capacities, mask.sum())
+    assert np.all(np.abs(areas - targets) <= TOLERANCE * targets)
+
+
+def test_small_mask():
+    # 間引かずに全てのピクセルで分ける大きさ（L字型の領域）
+    mask = np.zeros((120, 120), dtype=bool)
+    mask[10:110, 10:50] = True
+    mask[70:110, 10:110] = True
+    _assert_areas(mask, [3, 5, 2, 7])
+
+
+def test_large_mask_with_hole():
+    # 間引いたピクセルで分けてから全てのピクセルで続ける大きさ
+    mask = np.zeros((400, 500), dtype=bool)
+    mask[20:380, 20:480] = True
+    mask[150:250, 200:300] = False
+    _assert_areas(mask, [15, 2, 5, 3, 4, 6, 10, 4, 8])
+
+
+def test_shop_area_of_plan():
+    _assert_areas(load_shop_area(DB_PATH), [3, 3, 3, 3, 3, 4, 3, 5, 3])
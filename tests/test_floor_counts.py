@@ -0,0 +1,44 @@
+import itertools
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from floor_fitness import FloorTables
+from floor_counts import eval_counts_batch, solve_counts
+
+# 動的計画法の solve_counts が、店舗数の行列を全て調べたときの最適な評価値と一致するか
+# （キャパシティ0の店舗も含む小さな条件をランダムに作る）
+CASES = 30
+
+
+def _random_tables(rng):
+    n_floors = int(rng.integers(1, 4))
+    n_types = int(rng.integers(1, 4))
+    names = [f"shop{t}" for t in range(n_types)]
+    types = {name: int(rng.integers(0, 6)) for name in names}
+    constraints = {}
+    for name in names:
+        low = int(rng.integers(0, 3))
+        constraints[name] = (low, low + int(rng.integers(0, 3)))
+    preferred = {name: int(rng.integers(1, n_floors + 1)) for name in names}
+    floor_capacities = rng.integers(0, 12, size=n_floors).tolist()
+    return FloorTables(types, constraints, preferred, floor_capacities)
+
+
+def _all_counts(tables):
+    # 種類ごとに、合計が最大数以下になる全てのフロアへの分け方を組み合わせた行列 (個数, フロア数, 種類数)
+    n_floors = tables.num_floors
+    per_type = [[x for x in itertools.product(range(int(max_count) + 1), repeat=n_floors) if sum(x) <= max_count]
+                for max_count in tables.max_count]
+    return np.array([np.array(columns).T for columns in itertools.product(*per_type)], dtype=np.int64)
+
+
+def test_solve_counts_matches_exhaustive_search():
+    rng = np.random.default_rng(0)
+    for _ in range(CASES):
+        tables = _random_tables(rng)
+        counts, score = solve_counts(tables)
+        assert score == eval_counts_batch(counts[None], tables)[0]
+        assert score == eval_counts_batch(_all_counts(tables), tables).max()
@@ -0,0 +1,44 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import ga_floor
+from floor_fitness import FloorTables, eval_floor_batch
+
+# 集団をまとめて評価する eval_floor_batch が、1個体ずつの ga_floor.evaluate と同じ評価値になるか
+# （フロア数・キャパシティ・個体の長さを変えた条件をランダムに作る）
+CASES = 30
+POP_SIZE = 40
+
+
+def _random_settings(rng):
+    names = list(ga_floor.shop_types)
+    types = {name: rng.randint(1, 12) for name in names}
+    constraints = {}
+    for name in names:
+        low = rng.randint(0, 3)
+        constraints[name] = (low, low + rng.randint(0, 4))
+    n_floors = rng.randint(1, 4)
+    preferred = {name: rng.randint(1, n_floors) for name in names}
+    capacities = [rng.randint(0, 40) for _ in range(n_floors)]
+    return capacities, types, constraints, preferred
+
+
+def test_batch_matches_evaluate():
+    rng = random.Random(0)
+    original = (ga_floor.floor_capacities, ga_floor.shop_types, ga_floor.shop_constraints, ga_floor.preferred_floor)
+    try:
+        for _ in range(CASES):
+            capacities, types, constraints, preferred = _random_settings(rng)
+            ga_floor.configure(capacities, types, constraints, preferred)
+            tables = FloorTables(types, constraints, preferred, capacities)
+            # 空の個体や、店舗数の制約を外れる個体も含める
+            population = [[rng.choice(list(types)) for _ in range(rng.randint(0, 30))] for _ in range(POP_SIZE)]
+            codes, lengths = tables.encode(population)
+            expected = [ga_floor.evaluate(individual)[0] for individual in population]
+            assert np.array_equal(eval_floor_batch(codes, lengths, tables), expected)
+    finally:
+        ga_floor.configure(*original)
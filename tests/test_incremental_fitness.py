@@ -0,0 +1,62 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import ga_main
+from ga_backend import EvaluationBackend
+from layout_fitness import eval_shop_incremental
+
+# 差分評価（途中結果を個体に持たせる）が、突然変異・交叉・複製を繰り返しても全体を計算し直した評価と一致するか
+NUM_SHOPS = 30
+STEPS = 200
+
+
+def _population(n):
+    previous = ga_main.NUM_SHOPS
+    ga_main.set_num_shops(NUM_SHOPS)
+    try:
+        return ga_main.toolbox.population(n=n)
+    finally:
+        ga_main.set_num_shops(previous)
+
+
+def _assert_same(individual):
+    assert np.isclose(eval_shop_incremental(individual)[0], ga_main.eval_shop(individual)[0])
+
+
+def test_incremental_matches_full_evaluation():
+    random.seed(0)
+    population = _population(6)
+    for individual in population:
+        _assert_same(individual)
+    toolbox = ga_main.toolbox
+    for _ in range(STEPS):
+        operation = random.choice(("mutate", "mate", "clone"))
+        if operation == "mutate":
+            individual = random.choice(population)
+            toolbox.mutate(individual)
+            changed = [individual]
+        elif operation == "mate":
+            i, j = random.sample(range(len(population)), 2)
+            toolbox.mate(population[i], population[j])
+            changed = [population[i], population[j]]
+        else:
+            # 複製は元の個体と途中結果を共有するので、複製を変えても元の評価が変わらないことも確かめる
+            i, j = random.sample(range(len(population)), 2)
+            population[j] = toolbox.clone(population[i])
+            toolbox.mutate(population[j])
+            changed = [population[i], population[j]]
+        for individual in changed:
+            _assert_same(individual)
+
+
+def test_process_backend_keeps_terms_in_parent():
+    random.seed(1)
+    population = _population(20)
+    with EvaluationBackend("process", workers=2) as backend:
+        fitnesses = backend.map(eval_shop_incremental, population)
+    assert all(getattr(individual, "terms", None) is not None for individual in population)
+    assert np.allclose([f[0] for f in fitnesses], [ga_main.eval_shop(individual)[0] for individual in population])
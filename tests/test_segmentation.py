@@ -0,0 +1,45 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from sklearn.cluster import DBSCAN
+from segmentation import dbscan_grid, cluster_dbscan
+
+# 行ごとの列の範囲で近傍を数える dbscan_grid が、sklearn の DBSCAN とコア点・ノイズ・コア点のクラスタで一致するか
+# （境界点は複数のクラスタから届くとき、どちらに入るかが決まらないので比べない）
+CASES = 100
+
+
+def _random_points(rng):
+    # 点の密度とクラスタの半径を変えた整数座標の点（重なる点も含む）
+    n = int(rng.integers(1, 400))
+    size = int(rng.integers(5, 200))
+    points = rng.integers(0, size, size=(n, 2))
+    eps = float(rng.choice([1.0, 1.5, 2.0, np.sqrt(8), 3.7, 5.0, 10.0]))
+    min_samples = int(rng.integers(1, 12))
+    return points, eps, min_samples
+
+
+def test_dbscan_grid_matches_sklearn():
+    rng = np.random.default_rng(0)
+    for _ in range(CASES):
+        points, eps, min_samples = _random_points(rng)
+        expected = DBSCAN(eps=eps, min_samples=min_samples).fit(points)
+        labels = dbscan_grid(points, eps, min_samples)
+
+        core = np.zeros(len(points), dtype=bool)
+        core[expected.core_sample_indices_] = True
+        assert np.array_equal(labels == -1, expected.labels_ == -1)
+        # コア点どうしが同じクラスタかどうかが一致する（ラベルの番号は違ってよい）
+        pairs = np.unique(np.column_stack([labels[core], expected.labels_[core]]), axis=0)
+        assert len(np.unique(pairs[:, 0])) == len(pairs) == len(np.unique(pairs[:, 1]))
+
+
+def test_report_measures_memory_only_when_asked():
+    points = np.random.default_rng(1).integers(0, 50, size=(200, 2))
+    _, report = cluster_dbscan(points, 3, 4, method="grid", verbose=False, memory=False)
+    assert report["peak_mb"] is None
+    _, report = cluster_dbscan(points, 3, 4, method="grid", verbose=False, memory=True)
+    assert report["peak_mb"] > 0
@@ -1,9 +1,12 @@
+import os
 import random
 from deap import base, creator, tools, algorithms
 import numpy as np
 import cv2
 from scipy.spatial import Voronoi
-from PIL import Image, ImageDraw, ImageFont
+from floor_grid import load_plan_boundary, load_plan_image
+from nearest_site import nearest_sites
+from render import paint_points, save_result
 
 # 各フロアのキャパシティ
 floor_capacities = [30, 30, 30]  # 1階, 2階, 3階のキャパシティ
@@ -126,29 +129,16 @@ for floor, shops in enumerate(floor_assignments):
     print(f"Floor {floor + 1}: {shops}")
 
 # 画像の読み込み
-image_path = "./high_res_screenshot.jpg"  # アップロードした画像のパス
-image = cv2.imread(image_path)
+image_path = os.environ.get("GA_PLAN", "./high_res_screenshot.jpg")  # フロアの画像か、エディタで保存した図面（dbfiles/*.db）のパス
+output_path = os.environ.get("GA_OUTPUT", "./testtt_result.png")  # 結果の画像を保存するパス（GA_SHOW=1 なら画面にも表示）
+image = load_plan_image(image_path)
 
 # BGR色空間で指定された色範囲を定義
 target_color_bgr = np.array([183,66,67])  # BGR形式で指定
 threshold = 10  # 色の範囲の許容誤差
 
-# 指定色の周辺の範囲を定義
-lower_bound = target_color_bgr - threshold
-upper_bound = target_color_bgr + threshold
-
-# マスクを作成
-mask = cv2.inRange(image, lower_bound, upper_bound)
-
-# マスクから輪郭を検出
-contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-# 黒色の背景に輪郭を描画（デバッグ用）
-boundary_image = np.zeros_like(image)
-cv2.drawContours(boundary_image, contours, -1, (255, 255, 255), 2)
-
-# 境界線のピクセル座標を取得
-boundary_points = np.column_stack(np.where(boundary_image > 0))
+# 境界線の輪郭とピクセル座標を取得（画像なら boundary.py で画像ごとにキャッシュ、図面のデータベースなら道のセルから作る）
+contours, boundary_points, _ = load_plan_boundary(image_path, target_color_bgr, threshold)
 
 # 各フロアのレイアウトを描画
 for floor_index, floor_shops_list in enumerate(floor_assignments):
@@ -168,11 +158,8 @@ for floor_index, floor_shops_list in enumerate(floor_assignments):
     # 描画用に各クラスタに対して色をランダムに割り当て
     colors = np.random.randint(0, 255, size=(len(floor_shops_list), 3))
 
-    # Voronoi領域に基づき、boundary_pointsを色分けして描画
-    for i, point in enumerate(boundary_points):
-        distances = np.linalg.norm(expanded_centroids - point, axis=1)
-        closest_cluster = np.argmin(distances)
-        cv2.circle(image, (point[1], point[0]), 1, colors[closest_cluster].tolist(), -1)
+    # Voronoi領域に基づき、boundary_pointsを色分けして描画（最も近い重心はまとめて求める）
+    paint_points(image, boundary_points, nearest_sites(boundary_points, expanded_centroids), colors)
 
     # Voronoiの境界線を黄色に設定
     for ridge in vor.ridge_vertices:
@@ -181,6 +168,5 @@ for floor_index, floor_shops_list in enumerate(floor_assignments):
             pt2 = vor.vertices[ridge[1]]
             cv2.line(image, (int(pt1[0]), int(pt1[1])), (int(pt2[0]), int(pt2[1])), (0, 0, 0), 2)
 
-# 画像を表示
-image_pil = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-image_pil.show()
+# 画像を保存
+save_result(output_path, image)